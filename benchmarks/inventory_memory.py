@@ -0,0 +1,138 @@
+"""
+Memory held by an inventory of Route Tables as SDK models and as compact records.
+
+Run from the repository root:
+
+    python -m benchmarks.inventory_memory --route-rules 100000 --rules-per-table 100
+
+Route Tables are built from pages of API shaped JSON the way the SDK deserializes them, so every string is a separate
+object as it would be after a listing.
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+from collections.abc import Callable, Sequence
+from typing import Any
+
+from oci.core.models import RouteRule, RouteTable
+
+from peer_oracle_vcn import records
+
+
+def _route_table_pages(route_rules: int, rules_per_table: int, lpgs_per_vcn: int, page_size: int) -> list[bytes]:
+    tables = []
+    for i in range(-(-route_rules // rules_per_table)):
+        vcn = f'ocid1.vcn.oc1.iad.{i:060d}'
+        n_rules = min(rules_per_table, route_rules - i * rules_per_table)
+        tables.append(
+            {
+                'compartmentId': 'ocid1.tenancy.oc1..' + '0' * 60,
+                'displayName': f'Default Route Table for vcn{i}',
+                'id': f'ocid1.routetable.oc1.iad.{i:060d}',
+                'lifecycleState': 'AVAILABLE',
+                'vcnId': vcn,
+                'timeCreated': '2024-01-01T00:00:00.000Z',
+                'definedTags': {},
+                'freeformTags': {},
+                'routeRules': [
+                    {
+                        'cidrBlock': f'10.{j // 256 % 256}.{j % 256}.0/24',
+                        'destination': f'10.{j // 256 % 256}.{j % 256}.0/24',
+                        'destinationType': 'CIDR_BLOCK',
+                        'networkEntityId': f'ocid1.localpeeringgateway.oc1.iad.{i:040d}{j % lpgs_per_vcn:020d}',
+                        'routeType': 'STATIC',
+                        'description': None,
+                    }
+                    for j in range(n_rules)
+                ],
+            }
+        )
+    pages = []
+    for start in range(0, len(tables), page_size):
+        end = start + page_size
+        pages.append(json.dumps(tables[start:end]).encode())
+    return pages
+
+
+def _deserialize(page: bytes) -> list[RouteTable]:
+    # like `BaseClient` does with the body of a listing: parse JSON, then build a model of every object
+    return [
+        RouteTable(
+            compartment_id=table['compartmentId'],
+            display_name=table['displayName'],
+            id=table['id'],
+            lifecycle_state=table['lifecycleState'],
+            vcn_id=table['vcnId'],
+            time_created=table['timeCreated'],
+            defined_tags=table['definedTags'],
+            freeform_tags=table['freeformTags'],
+            route_rules=[
+                RouteRule(
+                    cidr_block=rule['cidrBlock'],
+                    destination=rule['destination'],
+                    destination_type=rule['destinationType'],
+                    network_entity_id=rule['networkEntityId'],
+                    route_type=rule['routeType'],
+                    description=rule['description'],
+                )
+                for rule in table['routeRules']
+            ],
+        )
+        for table in json.loads(page)
+    ]
+
+
+def _measure(build: Callable[[], Any]) -> tuple[Any, int, int, float]:
+    gc.collect()
+    tracemalloc.start()
+    started_at = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - started_at
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size, peak, elapsed
+
+
+def _mib(n: int) -> str:
+    return f'{n / 2**20:8.1f} MiB'
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.inventory_memory')
+    parser.add_argument('--route-rules', type=int, default=100_000)
+    parser.add_argument('--rules-per-table', type=int, default=100)
+    parser.add_argument('--lpgs-per-vcn', help='Distinct targets of the rules of a Route Table', type=int, default=10)
+    parser.add_argument('--page-size', help='Route Tables per page of the listing', type=int, default=50)
+    args = parser.parse_args()
+
+    pages = _route_table_pages(args.route_rules, args.rules_per_table, args.lpgs_per_vcn, args.page_size)
+
+    def build_models() -> Sequence[RouteTable]:
+        return [model for page in pages for model in _deserialize(page)]
+
+    def build_records() -> Sequence[records.RouteTableRecord]:
+        # page by page, as `OCIRepository` lists them
+        return [records.RouteTableRecord.from_model(model) for page in pages for model in _deserialize(page)]
+
+    models, models_size, models_peak, models_elapsed = _measure(build_models)
+    del models
+
+    route_tables, records_size, records_peak, records_elapsed = _measure(build_records)
+    assert sum(len(t.route_rules) for t in route_tables) == args.route_rules
+
+    print(f'route rules:  {args.route_rules} in {len(route_tables)} Route Tables')
+    for name, size, elapsed in (
+        ('SDK models', models_size, models_elapsed),
+        ('records', records_size, records_elapsed),
+    ):
+        print(f'{name + ":":13} {_mib(size)} held ({size / args.route_rules:4.0f} B/rule), built in {elapsed:.2f} s')
+    print(f'peak:         {_mib(models_peak)} SDK models, {_mib(records_peak)} records')
+    print(f'reduction:    {models_size / records_size:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
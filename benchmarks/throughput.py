@@ -0,0 +1,83 @@
+"""
+End-to-end throughput of `lpg_batch` through the genuine OCI SDK client stack, against the local stand-in server.
+
+Run from the repository root:
+
+    python -m benchmarks.throughput --pairs 50 --parallelism 8 --latency 0.05 --rate-limit 20
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from oci import config
+
+from peer_oracle_vcn import commands, usecases, values
+from tests import stand_in
+
+TENANCY = 'ocid1.tenancy.oc1..standinbenchmark'
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.throughput')
+    parser.add_argument('--pairs', help='Number of hub and spoke pairs to peer', type=int, default=9)
+    parser.add_argument('--parallelism', type=int, default=8)
+    parser.add_argument('--tenancy-parallelism', type=int, default=None)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--latency-jitter', type=float, default=0.01)
+    parser.add_argument('--rate-limit', type=float, default=None)
+    parser.add_argument('--burst', type=float, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    state = stand_in.StandInState()
+    # a LPG is created on both sides of each pair, so hubs are rotated to stay under the LPG limit of VCN
+    lpg_limit = state.limits[('vcn', 'lpg-count')]
+    n_hubs = -(-args.pairs // lpg_limit)
+    state.seed(tenancy_ocid=TENANCY, vcns=n_hubs + args.pairs)
+    vcns = tuple(state.vcns)
+    pairs = tuple(
+        values.PeeringPair(requestor_vcn=vcns[i % n_hubs], acceptor_vcn=vcns[n_hubs + i]) for i in range(args.pairs)
+    )
+
+    server = stand_in.StandInServer(
+        ('127.0.0.1', 0),
+        state=state,
+        latency=args.latency,
+        latency_jitter=args.latency_jitter,
+        rate_limit=args.rate_limit,
+        burst=args.burst,
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    with tempfile.TemporaryDirectory() as d:
+        config_path = Path(d) / 'config'
+        stand_in.write_oci_config(config_path, tenancies={'DEFAULT': TENANCY}, service_endpoint=server.endpoint)
+        oci_config = config.from_file(file_location=str(config_path))
+
+        started_at = time.perf_counter()
+        succeeded = usecases.create_lpg_batch(
+            commands.CreateLPGBatch(
+                oci_configs={'DEFAULT': oci_config},
+                pairs=pairs,
+                parallelism=args.parallelism,
+                tenancy_parallelism=args.tenancy_parallelism,
+                preflight_only=False,
+            )
+        )
+        elapsed = time.perf_counter() - started_at
+
+    server.shutdown()
+    print(f'succeeded:  {succeeded}')
+    print(f'pairs:      {args.pairs} ({args.pairs / elapsed:.2f} pairs/s)')
+    print(f'requests:   {server.request_count} ({server.request_count / elapsed:.2f} requests/s)')
+    print(f'elapsed:    {elapsed:.3f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import logging
+import sys
 
 from peer_oracle_vcn import commands, config, usecases
 
@@ -25,5 +26,21 @@ def main():
         usecases.list_groups(cmd)
     elif isinstance(cmd, commands.ListRouteTables):
         usecases.list_route_tables(cmd)
+    elif isinstance(cmd, commands.AnalyzePeering):
+        usecases.analyze_peering(cmd)
+    elif isinstance(cmd, commands.Unpeer):
+        if not usecases.unpeer(cmd):
+            sys.exit(1)
+    elif isinstance(cmd, commands.CreateDRGTransit):
+        usecases.create_drg_transit(cmd)
+    elif isinstance(cmd, commands.CheckStatus):
+        if not usecases.check_status(cmd):
+            sys.exit(1)
+    elif isinstance(cmd, commands.CreateLPGBatch):
+        if not usecases.create_lpg_batch(cmd):
+            sys.exit(1)
+    elif isinstance(cmd, commands.ReportBatch):
+        if not usecases.report_batch(cmd):
+            sys.exit(1)
     else:
         logger.error(f'Unknown command: {cmd}')
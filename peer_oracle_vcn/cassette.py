@@ -0,0 +1,239 @@
+"""
+Record and replay of the HTTP traffic of OCI SDK clients.
+
+A cassette is a gzipped JSON Lines file with one interaction per line: method, path with query, hash of the request
+body, status, a few response headers, response body and how long the response took. What is redacted:
+
+- request headers (signatures, keys) and request bodies are never written, only a hash of the body,
+- every OCID, in the path, headers and response body (e.g. in Policy statements), is replaced by a pseudonym made
+  from its hash, which keeps its resource type and realm.
+
+Display names, tenancy names, CIDRs and the rest of the response bodies are kept as they are.
+
+On replay, OCIDs of requests are replaced the same way, then requests are matched by method, path with query and body
+hash, in the order they were recorded, and each response is delayed by its recorded latency times `latency_scale`
+(`0` for no delay). The replayed run sees the pseudonyms, which stand for the same resources as the real OCIDs did.
+"""
+from __future__ import annotations
+
+import atexit
+import gzip
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from collections import defaultdict, deque
+from collections.abc import Mapping, MutableMapping
+from pathlib import Path
+from typing import Any, Optional
+from urllib.parse import urlsplit
+
+from oci._vendor.requests import PreparedRequest, Response, Session
+from oci._vendor.requests.adapters import BaseAdapter
+from oci._vendor.requests.structures import CaseInsensitiveDict
+
+_log = logging.getLogger(__name__)
+
+VERSION = 2
+# keys of the OCI config mapping
+RECORD_KEY = 'cassette_record'
+REPLAY_KEY = 'cassette_replay'
+LATENCY_SCALE_KEY = 'cassette_latency_scale'
+
+_RESPONSE_HEADERS = ('content-type', 'etag', 'opc-next-page', 'opc-request-id', 'retry-after', 'location')
+
+_Key = tuple[str, str, Optional[str]]
+
+# ocid1.<resource type>.<realm>.[region][.future use].<unique ID>
+_OCID = re.compile(r'ocid1\.([a-z0-9_-]+)\.([a-z0-9_-]+)\.[a-z0-9_.-]*[a-z0-9]')
+_PSEUDONYM = re.compile(r'ocid1\.[a-z0-9_-]+\.[a-z0-9_-]+\.\.redacted[0-9a-f]{24}')
+
+
+def _pseudonym(match: re.Match) -> str:
+    ocid = match.group(0)
+    if _PSEUDONYM.fullmatch(ocid):
+        return ocid
+    resource_type, realm = match.group(1), match.group(2)
+    return f'ocid1.{resource_type}.{realm}..redacted{hashlib.sha256(ocid.encode()).hexdigest()[:24]}'
+
+
+def _redact(text: str) -> str:
+    """`text` with every OCID replaced by its pseudonym. Pseudonyms are left as they are."""
+    return _OCID.sub(_pseudonym, text)
+
+
+def _key(request: PreparedRequest) -> _Key:
+    url = urlsplit(request.url)
+    path = url.path if not url.query else f'{url.path}?{url.query}'
+    body = request.body
+    if isinstance(body, bytes):
+        body = body.decode(errors='replace')
+    digest = None if not body else hashlib.sha1(_redact(body).encode()).hexdigest()[:16]
+    return request.method, _redact(path), digest
+
+
+class Recorder:
+    _lock: threading.Lock
+    _file: gzip.GzipFile
+    _started_at: float
+    count: int
+
+    def __init__(self, path: Path) -> None:
+        self._lock = threading.Lock()
+        self._file = gzip.open(path, 'wb')
+        self._file.write(json.dumps({'version': VERSION}).encode() + b'\n')
+        self._started_at = time.monotonic()
+        self.count = 0
+
+    def record(self, request: PreparedRequest, response: Response, started_at: float, elapsed: float) -> None:
+        method, path, body_hash = _key(request)
+        text = _redact(response.content.decode(errors='replace'))
+        try:
+            body = json.loads(text) if text else None
+        except ValueError:
+            body = text
+        line = {
+            't': round(started_at - self._started_at, 4),
+            'd': round(elapsed, 4),
+            'm': method,
+            'u': path,
+            'b': body_hash,
+            's': response.status_code,
+            'h': {k: _redact(response.headers[k]) for k in _RESPONSE_HEADERS if k in response.headers},
+            'r': body,
+        }
+        data = json.dumps(line, separators=(',', ':')).encode() + b'\n'
+        with self._lock:
+            self._file.write(data)
+            self.count += 1
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+class Player:
+    _lock: threading.Lock
+    _interactions: MutableMapping[_Key, deque[Mapping[str, Any]]]
+    _last: MutableMapping[_Key, Mapping[str, Any]]
+    latency_scale: float
+
+    def __init__(self, path: Path, latency_scale: float = 1) -> None:
+        self._lock = threading.Lock()
+        self._interactions = defaultdict(deque)
+        self._last = {}
+        self.latency_scale = latency_scale
+
+        with gzip.open(path, 'rb') as f:
+            header = json.loads(f.readline())
+            if header.get('version') != VERSION:
+                raise ValueError(f'Unsupported cassette version {header.get("version")} of {path}')
+            for line in f:
+                interaction = json.loads(line)
+                self._interactions[(interaction['m'], interaction['u'], interaction['b'])].append(interaction)
+
+    def next(self, request: PreparedRequest) -> Optional[Mapping[str, Any]]:
+        """
+        Next recorded interaction of `request`. Reads that ran out repeat their last response, because the number of
+        polls (e.g. waiting for a lifecycle state) depends on timing. `None` if it was never recorded.
+        """
+        key = _key(request)
+        with self._lock:
+            queue = self._interactions.get(key)
+            if queue:
+                self._last[key] = queue.popleft()
+                return self._last[key]
+            if request.method == 'GET':
+                return self._last.get(key)
+            return None
+
+
+class _RecordingAdapter(BaseAdapter):
+    def __init__(self, adapter: BaseAdapter, recorder: Recorder) -> None:
+        super().__init__()
+        self._adapter = adapter
+        self._recorder = recorder
+
+    def send(self, request: PreparedRequest, **kwargs: Any) -> Response:
+        started_at = time.monotonic()
+        response = self._adapter.send(request, **kwargs)
+        # reading the body here makes the recorded latency cover the whole response
+        _ = response.content
+        self._recorder.record(request, response, started_at=started_at, elapsed=time.monotonic() - started_at)
+        return response
+
+    def close(self) -> None:
+        self._adapter.close()
+
+
+class _ReplayingAdapter(BaseAdapter):
+    def __init__(self, player: Player) -> None:
+        super().__init__()
+        self._player = player
+
+    def send(self, request: PreparedRequest, **kwargs: Any) -> Response:
+        interaction = self._player.next(request)
+        if interaction is None:
+            # not 5xx, which the SDK would retry
+            status, headers = 404, {'content-type': 'application/json'}
+            body = {'code': 'NotRecorded', 'message': f'{request.method} {request.path_url} is not in the cassette'}
+        else:
+            status, headers, body = interaction['s'], interaction['h'], interaction['r']
+            time.sleep(interaction['d'] * self._player.latency_scale)
+
+        response = Response()
+        response.status_code = status
+        response.headers = CaseInsensitiveDict(headers)
+        response._content = b'' if body is None else (json.dumps(body) if not isinstance(body, str) else body).encode()
+        response.encoding = 'utf-8'
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self) -> None:
+        pass
+
+
+_lock = threading.Lock()
+_recorders: dict[Path, Recorder] = {}
+_players: dict[Path, Player] = {}
+
+
+def close_recorders() -> None:
+    """Finishes every cassette being recorded. Called at exit."""
+    with _lock:
+        recorders = tuple(_recorders.items())
+        _recorders.clear()
+    for path, recorder in recorders:
+        recorder.close()
+        _log.info(f'Recorded {recorder.count} requests to {path}')
+
+
+atexit.register(close_recorders)
+
+
+def install(session: Session, oci_config: Mapping[str, Any]) -> None:
+    """
+    Records or replays the traffic of `session` (of `BaseClient`) to the cassette of `oci_config`, if any.
+
+    Clients of the same cassette path share one file, so a run over several profiles makes a single cassette.
+    """
+    if oci_config.get(RECORD_KEY) is not None:
+        path = Path(oci_config[RECORD_KEY])
+        with _lock:
+            if path not in _recorders:
+                _recorders[path] = Recorder(path)
+            recorder = _recorders[path]
+        for prefix in ('https://', 'http://'):
+            session.mount(prefix, _RecordingAdapter(session.get_adapter(prefix), recorder))
+    elif oci_config.get(REPLAY_KEY) is not None:
+        path = Path(oci_config[REPLAY_KEY])
+        with _lock:
+            if path not in _players:
+                _players[path] = Player(path, latency_scale=oci_config.get(LATENCY_SCALE_KEY, 1))
+            player = _players[path]
+        for prefix in ('https://', 'http://'):
+            session.mount(prefix, _ReplayingAdapter(player))
@@ -1,11 +1,14 @@
 from __future__ import annotations
 
 from abc import ABCMeta
+from collections.abc import Mapping, Sequence
+from enum import Enum
+from pathlib import Path
 from typing import Optional
 
 from pydantic import BaseModel
 
-from peer_oracle_vcn import config
+from peer_oracle_vcn import config, values
 
 
 class Command(BaseModel, metaclass=ABCMeta):
@@ -22,6 +25,10 @@ class CreateLPGIntraTenant(Command):
     acceptor_route_table: str
     requestor_cidr: str
     acceptor_cidr: str
+    requestor_nsgs: Sequence[str] = ()
+    acceptor_nsgs: Sequence[str] = ()
+    requestor_security_lists: Sequence[str] = ()
+    acceptor_security_lists: Sequence[str] = ()
 
 
 class CreateLPGInterTenant(Command):
@@ -34,16 +41,76 @@ class CreateLPGInterTenant(Command):
     acceptor_route_table: Optional[str] = ...
     requestor_cidr: Optional[str] = ...
     acceptor_cidr: Optional[str] = ...
+    requestor_nsgs: Sequence[str] = ()
+    acceptor_nsgs: Sequence[str] = ()
+    requestor_security_lists: Sequence[str] = ()
+    acceptor_security_lists: Sequence[str] = ()
 
 
 class ListVCNs(Command):
-    oci_config: config.OCI_CONFIG
+    oci_configs: Mapping[str, config.OCI_CONFIG]
+    parallelism: int
 
 
 class ListGroups(Command):
-    oci_config: config.OCI_CONFIG
+    oci_configs: Mapping[str, config.OCI_CONFIG]
+    parallelism: int
 
 
 class ListRouteTables(Command):
-    oci_config: config.OCI_CONFIG
+    oci_configs: Mapping[str, config.OCI_CONFIG]
     vcn_ocid: Optional[str] = ...
+    parallelism: int
+
+
+class AnalyzePeering(Command):
+    oci_config: config.OCI_CONFIG
+
+
+class Unpeer(Command):
+    oci_configs: Mapping[str, config.OCI_CONFIG]
+    pairs: Sequence[values.PeeringPair]
+    parallelism: int
+
+
+class CreateDRGTransit(Command):
+    oci_config: config.OCI_CONFIG
+    drg: Optional[str] = ...
+    drg_name: str
+    vcns: Sequence[str]
+    destination_cidrs: Sequence[str]
+    parallelism: int
+
+
+class StatusOutput(str, Enum):
+    TEXT = 'text'
+    PROMETHEUS = 'prometheus'
+
+
+class CheckStatus(Command):
+    oci_configs: Mapping[str, config.OCI_CONFIG]
+    # profile -> compartments to check, the root of the tenancy if the profile has none
+    compartments: Mapping[str, Sequence[str]]
+    output: StatusOutput
+    parallelism: int
+
+
+class CreateLPGBatch(Command):
+    oci_configs: Mapping[str, config.OCI_CONFIG]
+    pairs: Sequence[values.PeeringPair]
+    parallelism: int
+    preflight_only: bool
+    # cap of concurrent API calls per profile, see `scheduler`
+    tenancy_parallelism: Optional[int] = None
+    # splitting the manifest across workers, see `sharding`
+    shard_index: Optional[int] = None
+    shard_count: Optional[int] = None
+    claim: bool = False
+    progress_db: Optional[Path] = None
+    lease_seconds: float = 600
+    batch_size: int = 50
+    worker: str = ''
+
+
+class ReportBatch(Command):
+    progress_db: Path
@@ -1,15 +1,19 @@
 from __future__ import annotations
 
 import argparse
-from collections.abc import Mapping
+import configparser
+import os
+import socket
+from collections.abc import Iterable, Mapping, Sequence
 from enum import Enum
 from os import PathLike
 from pathlib import Path
-from typing import Any
+from typing import Any, Optional
 
+import pydantic
 from oci import config
 
-from peer_oracle_vcn import commands
+from peer_oracle_vcn import cassette, commands, values
 
 OCI_CONFIG = Mapping[str, Any]
 
@@ -20,6 +24,13 @@ class SubCommand(str, Enum):
     LIST_GROUP = 'list_group'
     LIST_VCN = 'list_vcn'
     LIST_ROUTE_TABLE = 'list_route_table'
+    ANALYZE_PEERING = 'analyze_peering'
+    UNPEER = 'unpeer'
+    DRG_TRANSIT = 'drg_transit'
+    STATUS = 'status'
+    LPG_BATCH = 'lpg_batch'
+    PREFLIGHT = 'preflight'
+    BATCH_REPORT = 'batch_report'
 
 
 def _get_arg_parser() -> argparse.ArgumentParser:
@@ -30,38 +41,68 @@ def _get_arg_parser() -> argparse.ArgumentParser:
     lpg_intra_tenant = sub_cmd.add_parser(SubCommand.LPG_INTRA_TENANT.value)
     _add_common_arguments(lpg_intra_tenant)
     _add_args_to_intra_tenant_lpg(lpg_intra_tenant)
+    _add_security_rule_arguments(lpg_intra_tenant)
 
     lpg_inter_tenant = sub_cmd.add_parser(SubCommand.LPG_INTER_TENANCIES.value)
     _add_common_arguments(lpg_inter_tenant)
     _add_args_to_inter_tenant_lpg(lpg_inter_tenant)
+    _add_security_rule_arguments(lpg_inter_tenant)
 
     list_vcn = sub_cmd.add_parser(SubCommand.LIST_VCN.value)
     _add_common_arguments(list_vcn)
-    list_vcn.add_argument(
-        '--profile',
-        type=str,
-        default=config.DEFAULT_PROFILE,
-    )
+    _add_args_to_list(list_vcn)
 
     list_group = sub_cmd.add_parser(SubCommand.LIST_GROUP.value)
     _add_common_arguments(list_group)
-    list_group.add_argument(
-        '--profile',
-        type=str,
-        default=config.DEFAULT_PROFILE,
-    )
+    _add_args_to_list(list_group)
 
     list_route_table = sub_cmd.add_parser(SubCommand.LIST_ROUTE_TABLE.value)
     _add_common_arguments(list_route_table)
+    _add_args_to_list(list_route_table)
     list_route_table.add_argument(
+        '--vcn-ocid',
+        type=str,
+        default=None,
+    )
+
+    analyze_peering = sub_cmd.add_parser(SubCommand.ANALYZE_PEERING.value)
+    _add_common_arguments(analyze_peering)
+    analyze_peering.add_argument(
         '--profile',
         type=str,
         default=config.DEFAULT_PROFILE,
     )
-    list_route_table.add_argument(
-        '--vcn-ocid',
-        type=str,
-        default=None,
+
+    unpeer = sub_cmd.add_parser(SubCommand.UNPEER.value)
+    _add_common_arguments(unpeer)
+    _add_args_to_unpeer(unpeer)
+
+    drg_transit = sub_cmd.add_parser(SubCommand.DRG_TRANSIT.value)
+    _add_common_arguments(drg_transit)
+    _add_args_to_drg_transit(drg_transit)
+
+    status = sub_cmd.add_parser(SubCommand.STATUS.value)
+    _add_common_arguments(status)
+    _add_args_to_status(status)
+
+    lpg_batch = sub_cmd.add_parser(SubCommand.LPG_BATCH.value)
+    _add_common_arguments(lpg_batch)
+    _add_manifest_arguments(lpg_batch)
+    _add_scheduling_arguments(lpg_batch)
+    _add_sharding_arguments(lpg_batch)
+
+    preflight = sub_cmd.add_parser(SubCommand.PREFLIGHT.value)
+    _add_common_arguments(preflight)
+    _add_manifest_arguments(preflight)
+    _add_scheduling_arguments(preflight)
+    _add_sharding_arguments(preflight)
+
+    batch_report = sub_cmd.add_parser(SubCommand.BATCH_REPORT.value)
+    batch_report.add_argument(
+        '--progress-db',
+        help='SQLite progress database shared by workers of `lpg_batch`',
+        type=_validate_file_path,
+        required=True,
     )
 
     return parser
@@ -79,12 +120,95 @@ def _validate_file_path(p: PathLike) -> Path:
     return path
 
 
+def _validate_pair(p: str) -> tuple[str, str]:
+    requestor_vcn, sep, acceptor_vcn = p.partition(':')
+    if sep == '' or requestor_vcn == '' or acceptor_vcn == '':
+        raise argparse.ArgumentTypeError(f'{p} is not a form of `REQUESTOR_VCN_OCID:ACCEPTOR_VCN_OCID`')
+    return requestor_vcn, acceptor_vcn
+
+
+def _validate_compartment(v: str) -> tuple[Optional[str], str]:
+    profile, sep, compartment = v.rpartition(':')
+    if compartment == '' or (sep != '' and profile == ''):
+        raise argparse.ArgumentTypeError(f'{v} is not a form of `[PROFILE:]COMPARTMENT_OCID`')
+    return profile or None, compartment
+
+
+def _validate_profiles(v: str) -> tuple[str, ...]:
+    profiles = tuple(p.strip() for p in v.split(','))
+    if any(p == '' for p in profiles):
+        raise argparse.ArgumentTypeError(f'{v} is not a form of `PROFILE1,PROFILE2,...`')
+    return profiles
+
+
+def _validate_positive_int(v: str) -> int:
+    try:
+        i = int(v)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'{v} is not an integer')
+
+    if i <= 0:
+        raise argparse.ArgumentTypeError(f'{v} is not a positive integer')
+
+    return i
+
+
+def _validate_non_negative_int(v: str) -> int:
+    try:
+        i = int(v)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'{v} is not an integer')
+
+    if i < 0:
+        raise argparse.ArgumentTypeError(f'{v} is negative')
+
+    return i
+
+
+def _validate_non_negative_float(v: str) -> float:
+    try:
+        f = float(v)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'{v} is not a number')
+
+    if f < 0:
+        raise argparse.ArgumentTypeError(f'{v} is negative')
+
+    return f
+
+
 def _add_common_arguments(parser: argparse.ArgumentParser) -> None:
     parser.add_argument(
         '--api-config-file',
         help='OCI API config file path',
         type=_validate_file_path,
-        default=config.DEFAULT_LOCATION,
+        # not a str, so argparse doesn't check that it exists before the fallbacks of `_read_oci_config_file`
+        default=Path(config.DEFAULT_LOCATION),
+    )
+    parser.add_argument(
+        '--service-endpoint',
+        help='Send every OCI API request to this endpoint instead of Oracle Cloud, e.g. a local stand-in server',
+        type=str,
+        default=None,
+    )
+    cassette_group = parser.add_mutually_exclusive_group()
+    cassette_group.add_argument(
+        '--record',
+        help='Record every OCI API request and response with timings to this cassette file',
+        type=Path,
+        default=None,
+    )
+    cassette_group.add_argument(
+        '--replay',
+        help='Serve OCI API responses from this cassette file instead of calling OCI',
+        type=_validate_file_path,
+        default=None,
+    )
+    parser.add_argument(
+        '--replay-latency-scale',
+        help='Multiplier of recorded latencies on `--replay`. 0 replays without delay',
+        type=_validate_non_negative_float,
+        default=1.0,
     )
 
 
@@ -193,16 +317,320 @@ def _add_args_to_inter_tenant_lpg(parser: argparse.ArgumentParser) -> None:
     )
 
 
+def _add_security_rule_arguments(parser: argparse.ArgumentParser) -> None:
+    for side, peer in (('requestor', 'acceptor'), ('acceptor', 'requestor')):
+        parser.add_argument(
+            f'--{side}-nsg-ocid',
+            help=f'NSG OCID of {side} to allow ingress from {peer}\'s CIDR. Can be used multiple times',
+            type=str,
+            action='append',
+            default=[],
+        )
+        parser.add_argument(
+            f'--{side}-security-list-ocid',
+            help=f'Security List OCID of {side} to allow ingress from {peer}\'s CIDR. Can be used multiple times',
+            type=str,
+            action='append',
+            default=[],
+        )
+
+
+def _add_manifest_arguments(parser: argparse.ArgumentParser) -> None:
+    pairs = parser.add_mutually_exclusive_group(required=True)
+    pairs.add_argument(
+        '--manifest',
+        help='JSON file that contains list of VCN pairs',
+        type=_validate_file_path,
+        default=None,
+    )
+    pairs.add_argument(
+        '--pair',
+        help='VCN pair in a form of `REQUESTOR_VCN_OCID:ACCEPTOR_VCN_OCID`. Can be used multiple times',
+        type=_validate_pair,
+        action='append',
+        default=None,
+    )
+    parser.add_argument(
+        '--requestor-profile',
+        help='Profile of requestor of `--pair`',
+        type=str,
+        default=config.DEFAULT_PROFILE,
+    )
+    parser.add_argument(
+        '--acceptor-profile',
+        help='Profile of acceptor of `--pair`. Same as `--requestor-profile` if not specified',
+        type=str,
+        default=None,
+    )
+    parser.add_argument(
+        '--parallelism',
+        help='Maximum number of concurrent API calls',
+        type=_validate_positive_int,
+        default=8,
+    )
+
+
+def _add_scheduling_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        '--tenancy-parallelism',
+        help=(
+            'Maximum number of concurrent API calls per profile, so that a busy tenancy (e.g. the hub) can not take '
+            'every worker. Default: a fair share of `--parallelism` among profiles with pending calls'
+        ),
+        type=_validate_positive_int,
+        default=None,
+    )
+
+
+def _add_sharding_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        '--shard-index',
+        help='Index of this worker among `--shard-count` workers that split the manifest',
+        type=_validate_non_negative_int,
+        default=None,
+    )
+    parser.add_argument(
+        '--shard-count',
+        help='Number of workers that split the manifest by `--shard-index`',
+        type=_validate_positive_int,
+        default=None,
+    )
+    parser.add_argument(
+        '--claim',
+        help='Claim work from `--progress-db` until nothing is left, instead of a fixed shard',
+        action='store_true',
+    )
+    parser.add_argument(
+        '--progress-db',
+        help='SQLite database where workers record progress and claim work. See `batch_report`',
+        type=Path,
+        default=None,
+    )
+    parser.add_argument(
+        '--worker-id',
+        help='Name of this worker in `--progress-db`. Default: hostname and PID',
+        type=str,
+        default=f'{socket.gethostname()}:{os.getpid()}',
+    )
+    parser.add_argument(
+        '--lease-seconds',
+        help='Claimed work not renewed for this long is taken over by another worker',
+        type=_validate_positive_int,
+        default=600,
+    )
+    parser.add_argument(
+        '--batch-size',
+        help='Maximum number of pairs peered together. A failure rolls back only its batch',
+        type=_validate_positive_int,
+        default=50,
+    )
+
+
+def _add_args_to_unpeer(parser: argparse.ArgumentParser) -> None:
+    _add_manifest_arguments(parser)
+
+
+def _add_args_to_drg_transit(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        '--profile',
+        type=str,
+        default=config.DEFAULT_PROFILE,
+    )
+    parser.add_argument(
+        '--drg-ocid',
+        help='OCID of hub DRG. New DRG will be created if not specified',
+        type=str,
+        default=None,
+    )
+    parser.add_argument(
+        '--drg-name',
+        help='Name of DRG to create',
+        type=str,
+        default='peer_oracle_vcn_transit',
+    )
+    parser.add_argument(
+        '--vcn-ocid',
+        help='VCN OCID to attach to the DRG. Can be used multiple times',
+        type=str,
+        action='append',
+        required=True,
+    )
+    parser.add_argument(
+        '--destination-cidr',
+        help=(
+            'CIDR that covers all attached VCNs (e.g. 10.0.0.0/8). '
+            'Each VCN routes it to the DRG. Can be used multiple times'
+        ),
+        type=str,
+        action='append',
+        required=True,
+    )
+    parser.add_argument(
+        '--parallelism',
+        help='Maximum number of concurrent API calls',
+        type=_validate_positive_int,
+        default=8,
+    )
+
+
+def _add_multi_profile_arguments(group: argparse._MutuallyExclusiveGroup) -> None:
+    group.add_argument(
+        '--profiles',
+        help='Comma separated profiles to query concurrently, e.g. `profile1,profile2`',
+        type=_validate_profiles,
+        default=None,
+    )
+    group.add_argument(
+        '--all-profiles',
+        help='Query every profile of the OCI API config file concurrently',
+        action='store_true',
+    )
+
+
+def _add_args_to_list(parser: argparse.ArgumentParser) -> None:
+    profile_group = parser.add_mutually_exclusive_group()
+    profile_group.add_argument(
+        '--profile',
+        type=str,
+        default=config.DEFAULT_PROFILE,
+    )
+    _add_multi_profile_arguments(profile_group)
+    parser.add_argument(
+        '--parallelism',
+        help='Maximum number of concurrent API calls',
+        type=_validate_positive_int,
+        default=8,
+    )
+
+
+def _add_args_to_status(parser: argparse.ArgumentParser) -> None:
+    profile_group = parser.add_mutually_exclusive_group()
+    profile_group.add_argument(
+        '--profile',
+        help=f'Profile to check. Can be used multiple times. Default: {config.DEFAULT_PROFILE}',
+        type=str,
+        action='append',
+        default=None,
+    )
+    _add_multi_profile_arguments(profile_group)
+    parser.add_argument(
+        '--compartment-ocid',
+        help=(
+            'Compartment to check, as `PROFILE:COMPARTMENT_OCID`. The profile can be left out when only one is '
+            'checked. Can be used multiple times. Default: root of each tenancy'
+        ),
+        type=_validate_compartment,
+        action='append',
+        default=None,
+    )
+    parser.add_argument(
+        '--output',
+        type=commands.StatusOutput,
+        choices=tuple(o.value for o in commands.StatusOutput),
+        default=commands.StatusOutput.TEXT,
+    )
+    parser.add_argument(
+        '--parallelism',
+        help='Maximum number of concurrent API calls',
+        type=_validate_positive_int,
+        default=8,
+    )
+
+
+def _load_pairs(args: argparse.Namespace) -> Sequence[values.PeeringPair]:
+    if args.manifest is not None:
+        return tuple(pydantic.parse_file_as(list[values.PeeringPair], args.manifest))
+
+    return tuple(
+        values.PeeringPair(
+            requestor_profile=args.requestor_profile,
+            acceptor_profile=args.acceptor_profile,
+            requestor_vcn=requestor_vcn,
+            acceptor_vcn=acceptor_vcn,
+        )
+        for requestor_vcn, acceptor_vcn in args.pair
+    )
+
+
+def _read_oci_config_file(file_location: PathLike) -> configparser.ConfigParser:
+    # like `oci.config.from_file()`, a missing default file falls back to $OCI_CONFIG_FILE, then ~/.oraclebmc/config
+    file_location = config._get_config_path_with_fallback(str(file_location))
+    parser = configparser.ConfigParser(interpolation=None)
+    if not parser.read(file_location):
+        raise config.ConfigFileNotFound(f'Could not find config file at {file_location}')
+    return parser
+
+
+def _profiles_of(args: argparse.Namespace, parser: configparser.ConfigParser) -> Sequence[str]:
+    """Profiles selected by `--profile`, `--profiles` or `--all-profiles`."""
+    if args.all_profiles:
+        default = (config.DEFAULT_PROFILE,) if len(parser.defaults()) != 0 else ()
+        return (*default, *parser.sections())
+    if args.profiles is not None:
+        return args.profiles
+    if isinstance(args.profile, list):
+        return tuple(args.profile)
+    return (args.profile or config.DEFAULT_PROFILE,)
+
+
+def _load_oci_config(args: argparse.Namespace, profile: str) -> OCI_CONFIG:
+    return _load_oci_configs(args, profiles=(profile,))[profile]
+
+
+def _load_oci_configs(
+    args: argparse.Namespace,
+    profiles: Iterable[str],
+    parser: Optional[configparser.ConfigParser] = None,
+) -> Mapping[str, OCI_CONFIG]:
+    """
+    Same as `oci.config.from_file()` of each profile, but the file is parsed only once. Configs are validated later,
+    concurrently, when clients are built.
+
+    Profiles named by the command are all needed, so a missing key file fails here as it does in `from_file()`.
+    Profiles selected from `parser` (`--profiles`, `--all-profiles`) are checked by `helpers.build_repositories`, which
+    leaves a broken one out instead.
+    """
+    if parser is not None:
+        return {profile: _build_oci_config(args, parser, profile) for profile in dict.fromkeys(profiles)}
+
+    file_location = config._get_config_path_with_fallback(str(args.api_config_file))
+    parser = _read_oci_config_file(file_location)
+    oci_configs = {profile: _build_oci_config(args, parser, profile) for profile in dict.fromkeys(profiles)}
+    for profile, oci_config in oci_configs.items():
+        config.invalid_key_file_path_checker(oci_config, file_location, profile)
+    return oci_configs
+
+
+def _build_oci_config(args: argparse.Namespace, parser: configparser.ConfigParser, profile: str) -> OCI_CONFIG:
+    if profile not in parser:
+        raise config.ProfileNotFound(f'Profile {profile} not found in config file {args.api_config_file}')
+
+    oci_config = {**config.DEFAULT_CONFIG, **parser[profile]}
+    oci_config['log_requests'] = str(oci_config['log_requests']).lower() in ('1', 'yes', 'true', 'on')
+    for key in config.CONFIG_FILE_BLACKLISTED_KEYS:
+        if key in oci_config:
+            raise ValueError(f'{key} cannot be specified in a config file for security reasons')
+
+    if args.service_endpoint is not None:
+        oci_config = {**oci_config, 'service_endpoint': args.service_endpoint}
+    if args.record is not None:
+        oci_config = {**oci_config, cassette.RECORD_KEY: str(args.record)}
+    elif args.replay is not None:
+        oci_config = {
+            **oci_config,
+            cassette.REPLAY_KEY: str(args.replay),
+            cassette.LATENCY_SCALE_KEY: args.replay_latency_scale,
+        }
+    return oci_config
+
+
 def load_command() -> commands.Command:
     parser = _get_arg_parser()
     args = parser.parse_args()
 
     if args.cmd == SubCommand.LPG_INTRA_TENANT:
         return commands.CreateLPGIntraTenant(
-            oci_config=config.from_file(
-                file_location=args.api_config_file,
-                profile_name=args.profile,
-            ),
+            oci_config=_load_oci_config(args, profile=args.profile),
             requestor_vcn=args.requestor_vcn_ocid,
             acceptor_vcn=args.acceptor_vcn_ocid,
             requestor_group=args.requestor_group_ocid,
@@ -210,17 +638,16 @@ def load_command() -> commands.Command:
             acceptor_route_table=args.acceptor_route_table_ocid,
             requestor_cidr=args.requestor_cidr,
             acceptor_cidr=args.acceptor_cidr,
+            requestor_nsgs=tuple(args.requestor_nsg_ocid),
+            acceptor_nsgs=tuple(args.acceptor_nsg_ocid),
+            requestor_security_lists=tuple(args.requestor_security_list_ocid),
+            acceptor_security_lists=tuple(args.acceptor_security_list_ocid),
         )
     elif args.cmd == SubCommand.LPG_INTER_TENANCIES:
+        oci_configs = _load_oci_configs(args, profiles=(args.requestor_profile, args.acceptor_profile))
         return commands.CreateLPGInterTenant(
-            requestor_oci_config=config.from_file(
-                file_location=args.api_config_file,
-                profile_name=args.requestor_profile,
-            ),
-            acceptor_oci_config=config.from_file(
-                file_location=args.api_config_file,
-                profile_name=args.acceptor_profile,
-            ),
+            requestor_oci_config=oci_configs[args.requestor_profile],
+            acceptor_oci_config=oci_configs[args.acceptor_profile],
             requestor_vcn=args.requestor_vcn_ocid,
             acceptor_vcn=args.acceptor_vcn_ocid,
             requestor_group=args.requestor_group_ocid,
@@ -228,28 +655,100 @@ def load_command() -> commands.Command:
             acceptor_route_table=args.acceptor_route_table_ocid,
             requestor_cidr=args.requestor_cidr,
             acceptor_cidr=args.acceptor_cidr,
+            requestor_nsgs=tuple(args.requestor_nsg_ocid),
+            acceptor_nsgs=tuple(args.acceptor_nsg_ocid),
+            requestor_security_lists=tuple(args.requestor_security_list_ocid),
+            acceptor_security_lists=tuple(args.acceptor_security_list_ocid),
         )
     elif args.cmd == SubCommand.LIST_VCN:
+        parser = _read_oci_config_file(args.api_config_file)
         return commands.ListVCNs(
-            oci_config=config.from_file(
-                file_location=args.api_config_file,
-                profile_name=args.profile,
-            ),
+            oci_configs=_load_oci_configs(args, profiles=_profiles_of(args, parser), parser=parser),
+            parallelism=args.parallelism,
         )
     elif args.cmd == SubCommand.LIST_GROUP:
+        parser = _read_oci_config_file(args.api_config_file)
         return commands.ListGroups(
-            oci_config=config.from_file(
-                file_location=args.api_config_file,
-                profile_name=args.profile,
-            ),
+            oci_configs=_load_oci_configs(args, profiles=_profiles_of(args, parser), parser=parser),
+            parallelism=args.parallelism,
         )
     elif args.cmd == SubCommand.LIST_ROUTE_TABLE:
+        parser = _read_oci_config_file(args.api_config_file)
         return commands.ListRouteTables(
-            oci_config=config.from_file(
-                file_location=args.api_config_file,
-                profile_name=args.profile,
-            ),
+            oci_configs=_load_oci_configs(args, profiles=_profiles_of(args, parser), parser=parser),
             vcn_ocid=args.vcn_ocid,
+            parallelism=args.parallelism,
+        )
+    elif args.cmd == SubCommand.ANALYZE_PEERING:
+        return commands.AnalyzePeering(
+            oci_config=_load_oci_config(args, profile=args.profile),
+        )
+    elif args.cmd == SubCommand.UNPEER:
+        pairs = _load_pairs(args)
+        return commands.Unpeer(
+            oci_configs=_load_oci_configs(
+                args,
+                profiles=(p for pair in pairs for p in (pair.requestor_profile, pair.acceptor_profile)),
+            ),
+            pairs=pairs,
+            parallelism=args.parallelism,
+        )
+    elif args.cmd == SubCommand.DRG_TRANSIT:
+        return commands.CreateDRGTransit(
+            oci_config=_load_oci_config(args, profile=args.profile),
+            drg=args.drg_ocid,
+            drg_name=args.drg_name,
+            vcns=tuple(args.vcn_ocid),
+            destination_cidrs=tuple(args.destination_cidr),
+            parallelism=args.parallelism,
+        )
+    elif args.cmd == SubCommand.STATUS:
+        oci_config_parser = _read_oci_config_file(args.api_config_file)
+        profiles = tuple(dict.fromkeys(_profiles_of(args, oci_config_parser)))
+        # a compartment belongs to one tenancy, listing it with the other profiles would fail
+        compartments = {}
+        for profile, compartment in args.compartment_ocid or ():
+            if profile is None and len(profiles) != 1:
+                parser.error('`--compartment-ocid` must be a form of `PROFILE:COMPARTMENT_OCID` with several profiles')
+            profile = profile or profiles[0]
+            if profile not in profiles:
+                parser.error(f'`--compartment-ocid` of profile {profile}, which is not checked')
+            compartments.setdefault(profile, []).append(compartment)
+        return commands.CheckStatus(
+            oci_configs=_load_oci_configs(args, profiles=profiles, parser=oci_config_parser),
+            compartments={profile: tuple(c) for profile, c in compartments.items()},
+            output=args.output,
+            parallelism=args.parallelism,
+        )
+    elif args.cmd in (SubCommand.LPG_BATCH, SubCommand.PREFLIGHT):
+        if (args.shard_index is None) != (args.shard_count is None):
+            parser.error('`--shard-index` and `--shard-count` must be used together')
+        if args.shard_count is not None and args.shard_index >= args.shard_count:
+            parser.error('`--shard-index` must be less than `--shard-count`')
+        if args.claim and args.progress_db is None:
+            parser.error('`--claim` requires `--progress-db`')
+        if args.claim and args.shard_count is not None:
+            parser.error('`--claim` can not be used with `--shard-index`')
+
+        pairs = _load_pairs(args)
+        return commands.CreateLPGBatch(
+            oci_configs=_load_oci_configs(
+                args,
+                profiles=(p for pair in pairs for p in (pair.requestor_profile, pair.acceptor_profile)),
+            ),
+            pairs=pairs,
+            parallelism=args.parallelism,
+            tenancy_parallelism=args.tenancy_parallelism,
+            preflight_only=args.cmd == SubCommand.PREFLIGHT,
+            shard_index=args.shard_index,
+            shard_count=args.shard_count,
+            claim=args.claim,
+            progress_db=args.progress_db,
+            lease_seconds=args.lease_seconds,
+            batch_size=args.batch_size,
+            worker=args.worker_id,
         )
+    elif args.cmd == SubCommand.BATCH_REPORT:
+        return commands.ReportBatch(progress_db=args.progress_db)
     else:
         raise ValueError(f'Unknown command: {args.cmd}')
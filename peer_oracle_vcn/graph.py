@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import ipaddress
+from collections import defaultdict
+from collections.abc import Iterable, Iterator, Mapping, Sequence
+from enum import Enum
+from typing import Union
+
+from oci.core.models import LocalPeeringGateway, RouteRule, RouteTable, Vcn
+from pydantic import BaseModel
+
+from peer_oracle_vcn import records
+
+IPNetwork = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+
+class PathIssue(str, Enum):
+    MISSING_ROUTE = 'missing_route'
+    MISSING_RETURN_ROUTE = 'missing_return_route'
+    ASYMMETRIC_ROUTING = 'asymmetric_routing'
+
+
+class PathAnalysis(BaseModel):
+    source_vcn: str
+    target_vcn: str
+    reachable: bool
+    issues: frozenset[PathIssue]
+
+    class Config:
+        frozen = True
+
+
+class _LPGRoute(BaseModel):
+    route_table_id: str
+    destination: IPNetwork
+    lpg_id: str
+
+    class Config:
+        frozen = True
+
+
+def _parse_network(cidr: str) -> IPNetwork:
+    return ipaddress.ip_network(cidr, strict=False)
+
+
+class PeeringGraph:
+    """
+    In-memory view of the effective connectivity between VCNs.
+
+    Nodes are VCNs and edges are peered LPG pairs. Every edge also carries the route rules that steer traffic into
+    it, so reachability checks never go back to the API: the whole graph is built from three listings
+    (VCNs, LPGs and Route Tables) regardless of how many VCNs there are.
+    """
+
+    _vcn_cidrs: dict[str, tuple[IPNetwork, ...]]
+    _lpg_vcn: dict[str, str]
+    _lpg_peer: dict[str, str]
+    _adjacency: dict[str, dict[str, set[str]]]
+    _routes: dict[str, list[_LPGRoute]]
+
+    def __init__(
+        self,
+        vcns: Iterable[Union[Vcn, records.VcnRecord]],
+        lpgs: Iterable[Union[LocalPeeringGateway, records.LpgRecord]],
+        route_tables: Iterable[Union[RouteTable, records.RouteTableRecord]],
+    ) -> None:
+        self._vcn_cidrs = {}
+        self._lpg_vcn = {}
+        self._lpg_peer = {}
+        self._adjacency = defaultdict(lambda: defaultdict(set))
+        self._routes = defaultdict(list)
+
+        for vcn in vcns:
+            cidrs = vcn.cidr_blocks or ((vcn.cidr_block,) if vcn.cidr_block else ())
+            self._vcn_cidrs[vcn.id] = tuple(_parse_network(cidr) for cidr in cidrs)
+
+        peered_lpgs = []
+        for lpg in lpgs:
+            self._lpg_vcn[lpg.id] = lpg.vcn_id
+            if lpg.peering_status == LocalPeeringGateway.PEERING_STATUS_PEERED and lpg.peer_id is not None:
+                peered_lpgs.append(lpg)
+
+        for lpg in peered_lpgs:
+            peer_vcn = self._lpg_vcn.get(lpg.peer_id)
+            # the peer lives in a VCN outside of the inventory (e.g. other tenancy that was not loaded)
+            if peer_vcn is None or peer_vcn not in self._vcn_cidrs:
+                continue
+            self._lpg_peer[lpg.id] = lpg.peer_id
+            self._adjacency[lpg.vcn_id][peer_vcn].add(lpg.id)
+
+        for route_table in route_tables:
+            for rule in route_table.route_rules or ():
+                route = self._to_lpg_route(route_table, rule)
+                if route is not None:
+                    self._routes[route_table.vcn_id].append(route)
+
+    def _to_lpg_route(
+        self,
+        route_table: Union[RouteTable, records.RouteTableRecord],
+        rule: Union[RouteRule, records.RouteRuleRecord],
+    ) -> _LPGRoute | None:
+        if rule.network_entity_id not in self._lpg_vcn:
+            return None
+        if rule.destination_type not in (None, RouteRule.DESTINATION_TYPE_CIDR_BLOCK):
+            return None
+        destination = rule.destination or rule.cidr_block
+        if destination is None:
+            return None
+        return _LPGRoute(
+            route_table_id=route_table.id,
+            destination=_parse_network(destination),
+            lpg_id=rule.network_entity_id,
+        )
+
+    @property
+    def vcns(self) -> Sequence[str]:
+        return tuple(self._vcn_cidrs)
+
+    def peers_of(self, vcn_ocid: str) -> Mapping[str, frozenset[str]]:
+        """Peer VCN OCID to the local LPG OCIDs that are peered with it."""
+        return {peer: frozenset(lpgs) for peer, lpgs in self._adjacency.get(vcn_ocid, {}).items()}
+
+    def routes_of_lpg(self, lpg_ocid: str) -> Sequence[str]:
+        """Route Table OCIDs that have at least one rule targeting given LPG."""
+        vcn_ocid = self._lpg_vcn.get(lpg_ocid)
+        if vcn_ocid is None:
+            return ()
+        return tuple(dict.fromkeys(r.route_table_id for r in self._routes.get(vcn_ocid, ()) if r.lpg_id == lpg_ocid))
+
+    def forwarding_lpgs(self, source_vcn: str, target_vcn: str) -> frozenset[str]:
+        """
+        LPGs of `source_vcn` that carry traffic to `target_vcn`.
+
+        An LPG counts only when a route rule sends (part of) the target's CIDRs to it and it is actually peered with
+        the target VCN. Local peering is not transitive, so non adjacent VCNs are never reachable.
+        """
+        candidates = self._adjacency.get(source_vcn, {}).get(target_vcn)
+        if not candidates:
+            return frozenset()
+
+        target_cidrs = self._vcn_cidrs.get(target_vcn, ())
+        return frozenset(
+            route.lpg_id
+            for route in self._routes.get(source_vcn, ())
+            if route.lpg_id in candidates and any(route.destination.overlaps(cidr) for cidr in target_cidrs)
+        )
+
+    def is_reachable(self, source_vcn: str, target_vcn: str) -> bool:
+        return len(self.forwarding_lpgs(source_vcn, target_vcn)) != 0
+
+    def analyze_path(self, source_vcn: str, target_vcn: str) -> PathAnalysis:
+        forward = self.forwarding_lpgs(source_vcn, target_vcn)
+        backward = self.forwarding_lpgs(target_vcn, source_vcn)
+
+        issues = set()
+        if not forward:
+            issues.add(PathIssue.MISSING_ROUTE)
+        elif not backward:
+            issues.add(PathIssue.MISSING_RETURN_ROUTE)
+        elif {self._lpg_peer[lpg] for lpg in forward} != backward:
+            issues.add(PathIssue.ASYMMETRIC_ROUTING)
+
+        return PathAnalysis(
+            source_vcn=source_vcn,
+            target_vcn=target_vcn,
+            reachable=len(forward) != 0,
+            issues=frozenset(issues),
+        )
+
+    def analyze(self) -> Iterator[PathAnalysis]:
+        """
+        Analyze every peered VCN pair in both directions.
+
+        Only VCNs connected by an LPG edge can reach each other, so it walks the edges instead of all n² pairs.
+        """
+        for source_vcn, peers in self._adjacency.items():
+            for target_vcn in peers:
+                yield self.analyze_path(source_vcn, target_vcn)
@@ -1,14 +1,19 @@
 from __future__ import annotations
 
 import logging
-from collections.abc import Sequence
+import time
+from collections import defaultdict
+from collections.abc import Mapping, Sequence
+from concurrent.futures import Executor
 from contextlib import contextmanager
 from typing import Optional
 
 import oci
 import pydantic
+from oci.core.models import LocalPeeringGateway
+from oci.identity.models import Policy
 
-from peer_oracle_vcn import repository, values
+from peer_oracle_vcn import config, graph, records, repository, values
 
 _log = logging.getLogger(__name__)
 
@@ -24,6 +29,39 @@ def wrap_with_log(msg: str) -> None:
         raise e
 
 
+def wait_until_lpg_is_accessible(repo: repository.OCIRepository, lpg_ocid: str) -> None:
+    while True:
+        try:
+            repo.get_lpg(lpg_ocid=lpg_ocid)
+        except oci.exceptions.ServiceError as e:
+            if e.code != 'NotAuthorizedOrNotFound':
+                _log.error(f'Requestor failed to fetch acceptor\'s LPG info. {e.args[0]}')
+                raise e
+        else:
+            time.sleep(1)
+            break
+
+
+def build_intra_tenant_policy_names(requestor_vcn_name: str, acceptor_vcn_name: str) -> tuple[str, str]:
+    return f'request_lpg_to_vcn_{acceptor_vcn_name}', f'accept_lpg_of_vcn_{requestor_vcn_name}'
+
+
+def build_inter_tenant_policy_names(requestor_tenancy_name: str, acceptor_tenancy_name: str) -> tuple[str, str]:
+    return f'request_lpg_to_{acceptor_tenancy_name}', f'accept_lpg_of_{requestor_tenancy_name}'
+
+
+def build_intra_tenant_requestor_policy_statements(compartment_id: str, requestor_group: str) -> Sequence[str]:
+    return (f'Allow group id {requestor_group} to manage local-peering-from in compartment id {compartment_id}',)
+
+
+def build_intra_tenant_acceptor_policy_statements(compartment_id: str, requestor_group: str) -> Sequence[str]:
+    return (
+        f'Allow group id {requestor_group} to manage local-peering-to in compartment id {compartment_id}',
+        f'Allow group id {requestor_group} to inspect vcns in compartment id {compartment_id}',
+        f'Allow group id {requestor_group} to inspect local-peering-gateways in compartment id {compartment_id}',
+    )
+
+
 def build_requestor_policy_statements(
     requestor_compartment_id: str,
     acceptor_compartment_id: str,
@@ -162,3 +200,261 @@ def build_lpg_materials(
         )
     except pydantic.ValidationError:
         return None
+
+
+class Inventory:
+    """Every resource of a tenancy that peering cares about, fetched with a handful of listings."""
+
+    tenancy_name: str
+    vcns: Mapping[str, records.VcnRecord]
+    lpgs: Mapping[str, records.LpgRecord]
+    route_tables: Sequence[records.RouteTableRecord]
+    policies: Mapping[str, Policy]
+
+    def __init__(
+        self,
+        tenancy_name: str,
+        vcns: Sequence[records.VcnRecord],
+        lpgs: Sequence[records.LpgRecord],
+        route_tables: Sequence[records.RouteTableRecord],
+        policies: Sequence[Policy],
+    ) -> None:
+        self.tenancy_name = tenancy_name
+        self.vcns = {vcn.id: vcn for vcn in vcns}
+        self.lpgs = {
+            lpg.id: lpg
+            for lpg in lpgs
+            if lpg.lifecycle_state
+            not in (LocalPeeringGateway.LIFECYCLE_STATE_TERMINATING, LocalPeeringGateway.LIFECYCLE_STATE_TERMINATED)
+        }
+        self.route_tables = route_tables
+        self.policies = {policy.name: policy for policy in policies}
+
+    def lpgs_of(self, vcn_ocid: str) -> Sequence[records.LpgRecord]:
+        return tuple(lpg for lpg in self.lpgs.values() if lpg.vcn_id == vcn_ocid)
+
+    def route_rules_to(self, lpg_ocids: frozenset[str]) -> Mapping[str, frozenset[str]]:
+        """Route Table OCID -> OCIDs of LPGs in `lpg_ocids` that the Route Table has rules for."""
+        ret = defaultdict(set)
+        for route_table in self.route_tables:
+            for rule in route_table.route_rules or ():
+                if rule.network_entity_id in lpg_ocids:
+                    ret[route_table.id].add(rule.network_entity_id)
+        return {table_id: frozenset(lpgs) for table_id, lpgs in ret.items()}
+
+
+def build_repositories(
+    oci_configs: Mapping[str, config.OCI_CONFIG],
+    executor: Executor,
+) -> Mapping[str, repository.OCIRepository]:
+    """
+    Builds repositories of all profiles concurrently, which validates each config and loads its signing key.
+    Profiles that fail are logged and left out, so one broken profile doesn't stop the others.
+    """
+    futures = {
+        profile: executor.submit(repository.OCIRepository, oci_config=oci_config)
+        for profile, oci_config in oci_configs.items()
+    }
+    ret = {}
+    for profile, future in futures.items():
+        try:
+            ret[profile] = future.result()
+        except (oci.exceptions.ClientError, OSError) as e:
+            _log.error(f'Failed to load profile {profile}. {e}')
+    return ret
+
+
+def load_inventories(
+    repos: Mapping[str, repository.OCIRepository],
+    executor: Executor,
+) -> Mapping[str, Inventory]:
+    """Fetches inventories of all tenancies concurrently. Every listing of every tenancy is in flight together."""
+    futures = {
+        key: (
+            executor.submit(repo.get_tenancy_name),
+            executor.submit(repo.list_vcns),
+            executor.submit(repo.list_lpgs),
+            executor.submit(repo.list_route_tables),
+            executor.submit(repo.list_policies),
+        )
+        for key, repo in repos.items()
+    }
+    return {
+        key: Inventory(
+            tenancy_name=tenancy_name.result(),
+            vcns=vcns.result(),
+            lpgs=lpgs.result(),
+            route_tables=route_tables.result(),
+            policies=policies.result(),
+        )
+        for key, (tenancy_name, vcns, lpgs, route_tables, policies) in futures.items()
+    }
+
+
+def discover_peering_resources(
+    pair: values.PeeringPair,
+    requestor_inventory: Inventory,
+    acceptor_inventory: Inventory,
+) -> values.PeeringResources:
+    requestor_vcn = requestor_inventory.vcns.get(pair.requestor_vcn)
+    acceptor_vcn = acceptor_inventory.vcns.get(pair.acceptor_vcn)
+    # names peering gives each side's LPG, see `_create_and_connect_lpgs` and `create_lpg_inter_tenant`
+    requestor_lpg_names = set()
+    acceptor_lpg_names = set()
+    if requestor_vcn is not None and acceptor_vcn is not None:
+        requestor_lpg_names.add(f'{requestor_vcn.display_name}_to_{acceptor_vcn.display_name}')
+        acceptor_lpg_names.add(f'{acceptor_vcn.display_name}_to_{requestor_vcn.display_name}')
+    if not pair.is_intra_tenant:
+        requestor_lpg_names.add(f'{requestor_inventory.tenancy_name}_to_{acceptor_inventory.tenancy_name}')
+        acceptor_lpg_names.add(f'{acceptor_inventory.tenancy_name}_to_{requestor_inventory.tenancy_name}')
+
+    requestor_lpgs = set()
+    acceptor_lpgs = set()
+    acceptor_candidates = {lpg.id: lpg for lpg in acceptor_inventory.lpgs_of(pair.acceptor_vcn)}
+    for lpg in requestor_inventory.lpgs_of(pair.requestor_vcn):
+        if lpg.peer_id in acceptor_candidates:
+            requestor_lpgs.add(lpg.id)
+            acceptor_lpgs.add(lpg.peer_id)
+        # one half could be deleted already (e.g. by an interrupted or partly failed `unpeer`), leaving the other
+        # without a live peer. Such an LPG is only recognized by its name.
+        elif lpg.peer_id not in acceptor_inventory.lpgs and lpg.display_name in requestor_lpg_names:
+            requestor_lpgs.add(lpg.id)
+    for lpg in acceptor_candidates.values():
+        if lpg.peer_id not in requestor_inventory.lpgs and lpg.display_name in acceptor_lpg_names:
+            acceptor_lpgs.add(lpg.id)
+
+    if pair.is_intra_tenant:
+        if requestor_vcn is None or acceptor_vcn is None:
+            requestor_policy = acceptor_policy = None
+        else:
+            requestor_policy, acceptor_policy = build_intra_tenant_policy_names(
+                requestor_vcn.display_name,
+                acceptor_vcn.display_name,
+            )
+    else:
+        requestor_policy, acceptor_policy = build_inter_tenant_policy_names(
+            requestor_inventory.tenancy_name,
+            acceptor_inventory.tenancy_name,
+        )
+
+    requestor_policies = tuple(
+        requestor_inventory.policies[name].id for name in (requestor_policy,) if name in requestor_inventory.policies
+    )
+    acceptor_policies = tuple(
+        acceptor_inventory.policies[name].id for name in (acceptor_policy,) if name in acceptor_inventory.policies
+    )
+
+    return values.PeeringResources(
+        pair=pair,
+        requestor_lpgs=frozenset(requestor_lpgs),
+        acceptor_lpgs=frozenset(acceptor_lpgs),
+        requestor_route_rules=requestor_inventory.route_rules_to(frozenset(requestor_lpgs)),
+        acceptor_route_rules=acceptor_inventory.route_rules_to(frozenset(acceptor_lpgs)),
+        requestor_policies=requestor_policies,
+        acceptor_policies=acceptor_policies,
+    )
+
+
+def build_lpg_statuses(
+    lpgs: Mapping[str, Sequence[records.LpgRecord]],
+    peering_graph: graph.PeeringGraph,
+) -> Sequence[values.LPGStatus]:
+    """
+    Checks health of every LPG. `lpgs` is grouped by profile, and `peering_graph` must be built from the inventory of
+    all profiles so that a peer on other tenancy can be cross-checked.
+    """
+    visible_lpgs = {lpg.id for profile_lpgs in lpgs.values() for lpg in profile_lpgs}
+
+    ret = []
+    for profile, profile_lpgs in lpgs.items():
+        for lpg in profile_lpgs:
+            # being deleted, e.g. by `unpeer`
+            if lpg.lifecycle_state in (
+                LocalPeeringGateway.LIFECYCLE_STATE_TERMINATING,
+                LocalPeeringGateway.LIFECYCLE_STATE_TERMINATED,
+            ):
+                continue
+            problems = []
+            if lpg.lifecycle_state != LocalPeeringGateway.LIFECYCLE_STATE_AVAILABLE:
+                problems.append(f'lifecycle state is {lpg.lifecycle_state}')
+            if lpg.peering_status != LocalPeeringGateway.PEERING_STATUS_PEERED:
+                problems.append(f'peering status is {lpg.peering_status}')
+
+            route_tables = len(peering_graph.routes_of_lpg(lpg.id))
+            if route_tables == 0:
+                problems.append('no Route Rule targets this LPG')
+
+            if lpg.peer_id is not None and lpg.peer_id in visible_lpgs:
+                peer_route_tables = len(peering_graph.routes_of_lpg(lpg.peer_id))
+                if peer_route_tables == 0:
+                    problems.append('no Route Rule targets the peer LPG')
+            else:
+                peer_route_tables = None
+
+            ret.append(
+                values.LPGStatus(
+                    profile=profile,
+                    lpg=lpg.id,
+                    display_name=lpg.display_name,
+                    vcn=lpg.vcn_id,
+                    lifecycle_state=lpg.lifecycle_state,
+                    peering_status=lpg.peering_status,
+                    route_tables=route_tables,
+                    peer_route_tables=peer_route_tables,
+                    problems=tuple(problems),
+                )
+            )
+    return ret
+
+
+def _escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_prometheus(statuses: Sequence[values.LPGStatus]) -> str:
+    """Renders statuses in Prometheus text exposition format (e.g. for node exporter's textfile collector)."""
+    lines = []
+
+    def metric(name: str, description: str, samples: Sequence[tuple[Mapping[str, str], int]]) -> None:
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} gauge')
+        for labels, value in samples:
+            label_str = ','.join(f'{k}="{_escape_label(v)}"' for k, v in labels.items())
+            lines.append(f'{name}{{{label_str}}} {value}')
+
+    def labels_of(status: values.LPGStatus) -> dict[str, str]:
+        return {'profile': status.profile, 'lpg': status.lpg, 'name': status.display_name, 'vcn': status.vcn}
+
+    metric(
+        'peer_oracle_vcn_lpg_info',
+        'LPG with its lifecycle state and peering status.',
+        tuple(
+            (
+                {**labels_of(s), 'lifecycle_state': s.lifecycle_state, 'peering_status': s.peering_status},
+                1,
+            )
+            for s in statuses
+        ),
+    )
+    metric(
+        'peer_oracle_vcn_lpg_peered',
+        'Whether the LPG is peered.',
+        tuple((labels_of(s), int(s.peering_status == LocalPeeringGateway.PEERING_STATUS_PEERED)) for s in statuses),
+    )
+    metric(
+        'peer_oracle_vcn_lpg_route_tables',
+        'Number of Route Tables that have Route Rule targeting the LPG.',
+        tuple((labels_of(s), s.route_tables) for s in statuses),
+    )
+    metric(
+        'peer_oracle_vcn_lpg_peer_route_tables',
+        'Number of Route Tables that have Route Rule targeting the peer LPG. Absent if the peer is not visible.',
+        tuple((labels_of(s), s.peer_route_tables) for s in statuses if s.peer_route_tables is not None),
+    )
+    metric(
+        'peer_oracle_vcn_lpg_healthy',
+        'Whether the LPG passes every check.',
+        tuple((labels_of(s), int(s.is_healthy)) for s in statuses),
+    )
+
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import logging
+from collections import Counter, defaultdict
+from collections.abc import Mapping, Sequence
+from concurrent.futures import Executor, Future
+
+import oci.exceptions
+from oci.core.models import LocalPeeringGateway
+
+from peer_oracle_vcn import helpers, repository, values
+
+_log = logging.getLogger(__name__)
+
+# documented in https://docs.oracle.com/en-us/iaas/Content/General/Concepts/servicelimits.htm
+MAX_ROUTE_RULES_PER_TABLE = 200
+DEFAULT_LPGS_PER_VCN = 10
+DEFAULT_POLICIES_PER_TENANCY = 100
+
+
+def _result_or_none(future: Future):
+    try:
+        return future.result()
+    except oci.exceptions.ServiceError as e:
+        _log.debug(f'Preflight lookup failed. {e.args[0]}')
+        return None
+
+
+def check(
+    peerings: Sequence[tuple[values.PeeringPair, values.LPGMaterial]],
+    repos: Mapping[str, repository.OCIRepository],
+    executor: Executor,
+    reuse_existing_policies: bool = False,
+) -> Mapping[values.PeeringPair, Sequence[str]]:
+    """
+    Finds problems that would make peering fail halfway, without mutating anything.
+
+    Every limit, usage and permission that any of `peerings` depends on is fetched concurrently and only once, then
+    the pairs are checked in order against capacity that the previous feasible pairs already claimed. Returns problems
+    of each pair; pairs with empty problems are feasible all together.
+
+    With `reuse_existing_policies`, a Policy that already exists is treated as one to reuse rather than a conflict.
+    Peering adds the statements it lacks, e.g. for another Group.
+    """
+    profiles = {p for pair, _ in peerings for p in (pair.requestor_profile, pair.acceptor_profile)}
+    tenancy_names = {p: executor.submit(repos[p].get_tenancy_name) for p in profiles}
+    lpgs = {p: executor.submit(repos[p].list_lpgs) for p in profiles}
+    policies = {p: executor.submit(repos[p].list_policies) for p in profiles}
+    lpg_limits = {p: executor.submit(repos[p].get_limit, 'vcn', 'lpg-count') for p in profiles}
+    policy_limits = {p: executor.submit(repos[p].get_limit, 'identity', 'policies-count') for p in profiles}
+
+    route_tables = {}
+    vcns = {}
+    groups = {}
+    memberships = {}
+    for pair, material in peerings:
+        req_repo, act_repo = repos[pair.requestor_profile], repos[pair.acceptor_profile]
+        for repo, table_id in (
+            (req_repo, material.requestor_route_table),
+            (act_repo, material.acceptor_route_table),
+        ):
+            if table_id not in route_tables:
+                route_tables[table_id] = executor.submit(repo.get_route_table, route_table_ocid=table_id)
+        for repo, vcn_id in ((req_repo, material.requestor_vcn), (act_repo, material.acceptor_vcn)):
+            if vcn_id not in vcns:
+                vcns[vcn_id] = executor.submit(repo.get_vcn, vcn_ocid=vcn_id)
+        if pair.is_intra_tenant:
+            key = (pair.requestor_profile, material.requestor_group)
+            if key not in groups:
+                groups[key] = executor.submit(req_repo.get_group, group_ocid=material.requestor_group)
+        else:
+            key = (pair.requestor_profile, material.requestor_group)
+            if key not in memberships:
+                memberships[key] = executor.submit(req_repo.is_member_of, group_ocid=material.requestor_group)
+
+    lpg_count = Counter(
+        lpg.vcn_id
+        for p in profiles
+        for lpg in lpgs[p].result()
+        if lpg.lifecycle_state
+        not in (LocalPeeringGateway.LIFECYCLE_STATE_TERMINATING, LocalPeeringGateway.LIFECYCLE_STATE_TERMINATED)
+    )
+    lpg_limit = {p: _result_or_none(lpg_limits[p]) or DEFAULT_LPGS_PER_VCN for p in profiles}
+    policy_names = {p: {policy.name for policy in policies[p].result()} for p in profiles}
+    policy_count = {p: len(names) for p, names in policy_names.items()}
+    policy_limit = {p: _result_or_none(policy_limits[p]) or DEFAULT_POLICIES_PER_TENANCY for p in profiles}
+    rule_count = {}
+    for table_id, future in route_tables.items():
+        table = _result_or_none(future)
+        rule_count[table_id] = None if table is None else len(table.route_rules)
+
+    planned_policies = set()
+    ret = {}
+    for pair, material in peerings:
+        problems = []
+
+        vcn_names = {}
+        for profile, vcn_id in (
+            (pair.requestor_profile, material.requestor_vcn),
+            (pair.acceptor_profile, material.acceptor_vcn),
+        ):
+            vcn = _result_or_none(vcns[vcn_id])
+            if vcn is None:
+                problems.append(f'VCN {vcn_id} is not found')
+            else:
+                vcn_names[vcn_id] = vcn.display_name
+            if lpg_count[vcn_id] + 1 > lpg_limit[profile]:
+                problems.append(f'VCN {vcn_id} reached limit of LPGs ({lpg_limit[profile]})')
+
+        for table_id in (material.requestor_route_table, material.acceptor_route_table):
+            if rule_count[table_id] is None:
+                problems.append(f'Route Table {table_id} is not found')
+            elif rule_count[table_id] + 1 > MAX_ROUTE_RULES_PER_TABLE:
+                problems.append(f'Route Table {table_id} reached limit of Route Rules ({MAX_ROUTE_RULES_PER_TABLE})')
+
+        group_key = (pair.requestor_profile, material.requestor_group)
+        if pair.is_intra_tenant:
+            if _result_or_none(groups[group_key]) is None:
+                problems.append(f'Group {material.requestor_group} is not found')
+        elif not _result_or_none(memberships[group_key]):
+            problems.append(
+                f'User of profile {pair.requestor_profile} is not a member of Group {material.requestor_group}, '
+                'so it can not connect LPG across tenancies'
+            )
+
+        new_policies = ()
+        if len(vcn_names) == 2:
+            if pair.is_intra_tenant:
+                req_policy, act_policy = helpers.build_intra_tenant_policy_names(
+                    vcn_names[material.requestor_vcn],
+                    vcn_names[material.acceptor_vcn],
+                )
+            else:
+                req_policy, act_policy = helpers.build_inter_tenant_policy_names(
+                    tenancy_names[pair.requestor_profile].result(),
+                    tenancy_names[pair.acceptor_profile].result(),
+                )
+            new_policies = tuple(
+                (profile, name)
+                for profile, name in ((pair.requestor_profile, req_policy), (pair.acceptor_profile, act_policy))
+                if (profile, name) not in planned_policies
+                and not (reuse_existing_policies and name in policy_names[profile])
+            )
+            demand = Counter(profile for profile, _ in new_policies)
+            for profile, name in new_policies:
+                if name in policy_names[profile]:
+                    problems.append(f'Policy {name} already exists on profile {profile}')
+            for profile, n in demand.items():
+                if policy_count[profile] + n > policy_limit[profile]:
+                    problems.append(f'Profile {profile} reached limit of Policies ({policy_limit[profile]})')
+
+        ret[pair] = tuple(problems)
+        if len(problems) != 0:
+            continue
+
+        # claim capacity for the following pairs
+        lpg_count[material.requestor_vcn] += 1
+        lpg_count[material.acceptor_vcn] += 1
+        rule_count[material.requestor_route_table] += 1
+        rule_count[material.acceptor_route_table] += 1
+        for profile, _ in new_policies:
+            policy_count[profile] += 1
+        planned_policies.update(new_policies)
+
+    return ret
+
+
+def log_problems(problems: Mapping[values.PeeringPair, Sequence[str]]) -> bool:
+    """Logs problems of each pair and returns `True` if every pair is feasible."""
+    rejected = defaultdict(list)
+    for pair, pair_problems in problems.items():
+        if len(pair_problems) != 0:
+            rejected[(pair.requestor_vcn, pair.acceptor_vcn)].extend(pair_problems)
+
+    for (requestor_vcn, acceptor_vcn), pair_problems in rejected.items():
+        _log.error(f'Preflight rejected {requestor_vcn} -> {acceptor_vcn}. ' + ' '.join(f'{p}.' for p in pair_problems))
+
+    _log.info(f'Preflight passed {len(problems) - len(rejected)} of {len(problems)} pairs')
+    return len(rejected) == 0
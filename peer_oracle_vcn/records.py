@@ -0,0 +1,256 @@
+"""
+Compact records of listed resources.
+
+Every SDK model carries two dicts of its own (`swagger_types` and `attribute_map`) besides its attributes, so a
+tenancy-wide inventory of them costs far more memory than the few fields that peering reads. Listings convert each
+page into these records as soon as it arrives:
+
+- records are slotted and keep only the fields that are read,
+- OCIDs and enum values are interned, so e.g. the LPG OCID of every rule that targets it is a single string,
+- Route Rules of a table are stored column-wise, with IPv4 CIDR destinations packed into an `array`.
+
+Records have the same attribute names as the SDK models, so both can be passed to e.g. `graph.PeeringGraph`.
+"""
+from __future__ import annotations
+
+import functools
+import ipaddress
+import sys
+from array import array
+from collections.abc import Iterable, Iterator, Sequence
+from typing import Optional, Union, overload
+
+from oci.core.models import LocalPeeringGateway, RouteRule, RouteTable, Vcn
+
+# a packed destination is IPv4 address << 8 | prefix length; others refer to `RouteRules._others` with this bit set
+_NOT_PACKED = 1 << 63
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return None if value is None else sys.intern(value)
+
+
+def _is_canonical_int(s: str, maximum: int) -> bool:
+    return s.isdigit() and s.isascii() and int(s) <= maximum and (s == '0' or s[0] != '0')
+
+
+# the same peer CIDRs show up in the Route Tables of every VCN that routes to them
+@functools.lru_cache(maxsize=4096)
+def _pack_cidr(cidr: Optional[str]) -> Optional[int]:
+    """
+    `cidr` packed into an int, or `None` if it is not an IPv4 CIDR that unpacks to the same string. Parsed by hand,
+    because `ipaddress` would dominate the time of a listing.
+    """
+    if cidr is None:
+        return None
+    address, _, prefix = cidr.partition('/')
+    octets = address.split('.')
+    if len(octets) != 4 or not _is_canonical_int(prefix, 32) or not all(_is_canonical_int(o, 255) for o in octets):
+        return None
+    a, b, c, d = (int(o) for o in octets)
+    return (a << 32 | b << 24 | c << 16 | d << 8) | int(prefix)
+
+
+def _unpack_cidr(packed: int) -> str:
+    return f'{ipaddress.IPv4Address(packed >> 8)}/{packed & 0xFF}'
+
+
+class _Record:
+    __slots__ = ()
+
+    def __repr__(self) -> str:
+        fields = ', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__)
+        return f'{type(self).__name__}({fields})'
+
+
+class VcnRecord(_Record):
+    __slots__ = ('id', 'compartment_id', 'display_name', 'lifecycle_state', 'cidr_blocks', 'default_route_table_id')
+
+    def __init__(
+        self,
+        id: str,
+        compartment_id: Optional[str],
+        display_name: Optional[str],
+        lifecycle_state: Optional[str],
+        cidr_blocks: Sequence[str],
+        default_route_table_id: Optional[str],
+    ) -> None:
+        self.id = _intern(id)
+        self.compartment_id = _intern(compartment_id)
+        self.display_name = display_name
+        self.lifecycle_state = _intern(lifecycle_state)
+        self.cidr_blocks = tuple(cidr_blocks)
+        self.default_route_table_id = _intern(default_route_table_id)
+
+    @classmethod
+    def from_model(cls, vcn: Vcn) -> VcnRecord:
+        return cls(
+            id=vcn.id,
+            compartment_id=vcn.compartment_id,
+            display_name=vcn.display_name,
+            lifecycle_state=vcn.lifecycle_state,
+            cidr_blocks=vcn.cidr_blocks or ((vcn.cidr_block,) if vcn.cidr_block else ()),
+            default_route_table_id=vcn.default_route_table_id,
+        )
+
+    @property
+    def cidr_block(self) -> Optional[str]:
+        return self.cidr_blocks[0] if self.cidr_blocks else None
+
+
+class LpgRecord(_Record):
+    __slots__ = ('id', 'compartment_id', 'vcn_id', 'display_name', 'lifecycle_state', 'peering_status', 'peer_id')
+
+    def __init__(
+        self,
+        id: str,
+        compartment_id: Optional[str],
+        vcn_id: str,
+        display_name: Optional[str],
+        lifecycle_state: Optional[str],
+        peering_status: Optional[str],
+        peer_id: Optional[str],
+    ) -> None:
+        self.id = _intern(id)
+        self.compartment_id = _intern(compartment_id)
+        self.vcn_id = _intern(vcn_id)
+        self.display_name = display_name
+        self.lifecycle_state = _intern(lifecycle_state)
+        self.peering_status = _intern(peering_status)
+        self.peer_id = _intern(peer_id)
+
+    @classmethod
+    def from_model(cls, lpg: LocalPeeringGateway) -> LpgRecord:
+        return cls(
+            id=lpg.id,
+            compartment_id=lpg.compartment_id,
+            vcn_id=lpg.vcn_id,
+            display_name=lpg.display_name,
+            lifecycle_state=lpg.lifecycle_state,
+            peering_status=lpg.peering_status,
+            peer_id=lpg.peer_id,
+        )
+
+
+class RouteRuleRecord(_Record):
+    """A Route Rule read out of `RouteRules`. Rules are not kept as these, they are made on access."""
+
+    __slots__ = ('_destination', 'destination_type', 'network_entity_id')
+
+    # packed CIDR, unpacked only when `destination` is read
+    _destination: Union[int, str]
+
+    def __init__(self, destination: Union[int, str], destination_type: Optional[str], network_entity_id: str) -> None:
+        self._destination = destination
+        self.destination_type = destination_type
+        self.network_entity_id = network_entity_id
+
+    def __repr__(self) -> str:
+        return (
+            f'RouteRuleRecord(destination={self.destination!r}, destination_type={self.destination_type!r}, '
+            f'network_entity_id={self.network_entity_id!r})'
+        )
+
+    @property
+    def destination(self) -> str:
+        if isinstance(self._destination, int):
+            return _unpack_cidr(self._destination)
+        return self._destination
+
+    @property
+    def cidr_block(self) -> Optional[str]:
+        # deprecated field of the API, set to the destination of CIDR block rules
+        if self.destination_type in (None, RouteRule.DESTINATION_TYPE_CIDR_BLOCK):
+            return self.destination
+        return None
+
+
+class RouteRules(Sequence[RouteRuleRecord]):
+    """Route Rules of a Route Table, stored column-wise."""
+
+    __slots__ = ('_destinations', '_destination_types', '_network_entity_ids', '_others')
+
+    _destinations: array
+    _destination_types: tuple[Optional[str], ...]
+    _network_entity_ids: tuple[str, ...]
+    # destinations that can't be packed, e.g. IPv6 CIDRs and Oracle Services Network names
+    _others: tuple[str, ...]
+
+    def __init__(self, rules: Iterable[Union[RouteRule, RouteRuleRecord]]) -> None:
+        destinations = array('Q')
+        destination_types = []
+        network_entity_ids = []
+        others = []
+        for rule in rules:
+            # rules created before `destination` was introduced only have `cidr_block`
+            destination = rule.destination or rule.cidr_block
+            packed = _pack_cidr(destination)
+            if packed is None:
+                packed = _NOT_PACKED | len(others)
+                others.append(_intern(destination))
+            destinations.append(packed)
+            destination_types.append(_intern(rule.destination_type))
+            network_entity_ids.append(_intern(rule.network_entity_id))
+        self._destinations = destinations
+        self._destination_types = tuple(destination_types)
+        self._network_entity_ids = tuple(network_entity_ids)
+        self._others = tuple(others)
+
+    def __len__(self) -> int:
+        return len(self._destinations)
+
+    @overload
+    def __getitem__(self, index: int) -> RouteRuleRecord:
+        ...
+
+    @overload
+    def __getitem__(self, index: slice) -> Sequence[RouteRuleRecord]:
+        ...
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[RouteRuleRecord, Sequence[RouteRuleRecord]]:
+        if isinstance(index, slice):
+            return tuple(self[i] for i in range(*index.indices(len(self))))
+        packed = self._destinations[index]
+        return RouteRuleRecord(
+            destination=self._others[packed & ~_NOT_PACKED] if packed & _NOT_PACKED else packed,
+            destination_type=self._destination_types[index],
+            network_entity_id=self._network_entity_ids[index],
+        )
+
+    def __iter__(self) -> Iterator[RouteRuleRecord]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def __repr__(self) -> str:
+        return f'RouteRules({list(self)!r})'
+
+
+class RouteTableRecord(_Record):
+    __slots__ = ('id', 'compartment_id', 'vcn_id', 'display_name', 'lifecycle_state', 'route_rules')
+
+    def __init__(
+        self,
+        id: str,
+        compartment_id: Optional[str],
+        vcn_id: str,
+        display_name: Optional[str],
+        lifecycle_state: Optional[str],
+        route_rules: RouteRules,
+    ) -> None:
+        self.id = _intern(id)
+        self.compartment_id = _intern(compartment_id)
+        self.vcn_id = _intern(vcn_id)
+        self.display_name = display_name
+        self.lifecycle_state = _intern(lifecycle_state)
+        self.route_rules = route_rules
+
+    @classmethod
+    def from_model(cls, route_table: RouteTable) -> RouteTableRecord:
+        return cls(
+            id=route_table.id,
+            compartment_id=route_table.compartment_id,
+            vcn_id=route_table.vcn_id,
+            display_name=route_table.display_name,
+            lifecycle_state=route_table.lifecycle_state,
+            route_rules=RouteRules(route_table.route_rules or ()),
+        )
@@ -1,48 +1,131 @@
 from __future__ import annotations
 
+import itertools
 import logging
 from collections import defaultdict
-from collections.abc import MutableSequence, Sequence
-from functools import cached_property
+from collections.abc import Callable, Collection, Iterable, Iterator, Mapping, MutableSequence, Sequence
+from functools import cached_property, partial
 from types import TracebackType
-from typing import ContextManager, Optional, Type
+from typing import Any, ContextManager, Optional, Type, TypeVar
 
 import oci.exceptions
+import oci.pagination
+import oci.retry
+import oci.waiter
 from oci.core import VirtualNetworkClient
 from oci.core.models import (
+    AddDrgRouteDistributionStatementDetails,
+    AddDrgRouteDistributionStatementsDetails,
+    AddNetworkSecurityGroupSecurityRulesDetails,
+    AddSecurityRuleDetails,
     ConnectLocalPeeringGatewaysDetails,
+    CreateDrgAttachmentDetails,
+    CreateDrgDetails,
+    CreateDrgRouteDistributionDetails,
+    CreateDrgRouteTableDetails,
     CreateLocalPeeringGatewayDetails,
+    Drg,
+    DrgAttachment,
+    DrgAttachmentTypeDrgRouteDistributionMatchCriteria,
+    DrgRouteDistribution,
+    DrgRouteTable,
+    IngressSecurityRule,
     LocalPeeringGateway,
+    RemoveNetworkSecurityGroupSecurityRulesDetails,
     RouteRule,
     RouteTable,
+    UpdateDrgAttachmentDetails,
     UpdateRouteTableDetails,
+    UpdateSecurityListDetails,
     Vcn,
+    VcnDrgAttachmentNetworkCreateDetails,
 )
 from oci.identity import IdentityClient
-from oci.identity.models import CreatePolicyDetails, Group, Policy
+from oci.identity.models import CreatePolicyDetails, Group, Policy, UpdatePolicyDetails
+from oci.limits import LimitsClient
+from oci.signer import Signer
 
-from peer_oracle_vcn import config
+from peer_oracle_vcn import cassette, config, records
+from peer_oracle_vcn.singleflight import SingleFlight
 
 _log = logging.getLogger(__name__)
 
+# documented limit of AddNetworkSecurityGroupSecurityRules
+MAX_NSG_RULES_PER_REQUEST = 25
+# attempts of read-modify-write of a Security List that loses the race of ETag
+MAX_SECURITY_LIST_UPDATE_ATTEMPTS = 5
+# attempts of read-modify-write of a Route Table that loses the race of ETag
+MAX_ROUTE_TABLE_UPDATE_ATTEMPTS = 5
+# attempts of read-modify-write of a Policy that loses the race of ETag
+MAX_POLICY_UPDATE_ATTEMPTS = 5
+# longest wait of a DRG or DRG Attachment for its lifecycle state, in seconds
+MAX_LIFECYCLE_WAIT_SECONDS = 600
+
+T = TypeVar('T')
+
+
+def _chunked(items: Iterable[T], size: int) -> Iterator[list[T]]:
+    it = iter(items)
+    while chunk := list(itertools.islice(it, size)):
+        yield chunk
+
+
+def _without_route_rules(removed: Iterable[RouteRule], rules: Sequence[RouteRule]) -> list[RouteRule]:
+    """
+    `rules` without one of each of `removed`. Matched by destination and target only, since the rules read back also
+    have the fields the API filled in, e.g. `route_type`.
+    """
+    remaining = list(rules)
+    for rule in removed:
+        key = (rule.destination, rule.network_entity_id)
+        index = next((i for i, r in enumerate(remaining) if (r.destination, r.network_entity_id) == key), None)
+        if index is not None:
+            del remaining[index]
+    return remaining
+
 
 class OCIRepository(ContextManager):
     _cfg: config.OCI_CONFIG
+    _signer: Signer
     _identity_client: IdentityClient
     _network_client: VirtualNetworkClient
     _created_lpgs: set[str]
     _created_policies: set[str]
+    _created_drgs: set[str]
+    _created_drg_attachments: set[str]
+    _created_drg_route_tables: set[str]
+    _created_drg_route_distributions: set[str]
+    # DRG Attachment -> DRG Route Table it was bound to before `update_drg_attachment`
+    _rebound_drg_attachments: dict[str, Optional[str]]
     _added_route_rules: dict[str, MutableSequence[RouteRule]]
+    _added_nsg_rules: dict[str, MutableSequence[str]]
+    _added_security_list_rules: dict[str, MutableSequence[str]]
+    _added_policy_statements: dict[str, MutableSequence[str]]
+    # results of reads are shared between concurrent callers, so they must not be mutated
+    _reads: SingleFlight
 
     def __init__(self, oci_config: config.OCI_CONFIG) -> None:
         super().__init__()
 
         self._cfg = oci_config
-        self._identity_client = IdentityClient(oci_config)
-        self._network_client = VirtualNetworkClient(oci_config)
+        # the private key is loaded once and shared by every client of the profile
+        self._signer = Signer.from_config(oci_config)
+        self._identity_client = IdentityClient(oci_config, **self._client_kwargs)
+        self._network_client = VirtualNetworkClient(oci_config, **self._client_kwargs)
+        cassette.install(self._identity_client.base_client.session, oci_config)
+        cassette.install(self._network_client.base_client.session, oci_config)
         self._created_lpgs = set()
         self._created_policies = set()
+        self._created_drgs = set()
+        self._created_drg_attachments = set()
+        self._created_drg_route_tables = set()
+        self._created_drg_route_distributions = set()
+        self._rebound_drg_attachments = {}
         self._added_route_rules = defaultdict(list)
+        self._added_nsg_rules = defaultdict(list)
+        self._added_security_list_rules = defaultdict(list)
+        self._added_policy_statements = defaultdict(list)
+        self._reads = SingleFlight()
 
     def __enter__(self) -> OCIRepository:
         return self
@@ -61,8 +144,37 @@ class OCIRepository(ContextManager):
     def compartment_id(self) -> str:
         return self._cfg['tenancy']
 
+    @property
+    def _client_kwargs(self) -> Mapping[str, Any]:
+        # throttled (429) and transient errors are retried with backoff instead of failing the whole run
+        kwargs = {'signer': self._signer, 'retry_strategy': oci.retry.DEFAULT_RETRY_STRATEGY}
+        # `service_endpoint` of the OCI config points every client at e.g. the local stand-in server
+        service_endpoint = self._cfg.get('service_endpoint')
+        if service_endpoint is not None:
+            kwargs['service_endpoint'] = service_endpoint
+        return kwargs
+
+    @cached_property
+    def _limits_client(self) -> LimitsClient:
+        client = LimitsClient(self._cfg, **self._client_kwargs)
+        cassette.install(client.base_client.session, self._cfg)
+        return client
+
+    def get_limit(self, service_name: str, limit_name: str) -> Optional[int]:
+        """Largest value of the service limit over all scopes. `None` if the limit is unknown to the Limits service."""
+        limit_values = oci.pagination.list_call_get_all_results(
+            self._limits_client.list_limit_values,
+            compartment_id=self.compartment_id,
+            service_name=service_name,
+            name=limit_name,
+        ).data
+        return max((v.value for v in limit_values if v.value is not None), default=None)
+
     def get_tenancy_name(self) -> str:
-        res = self._identity_client.get_tenancy(self.compartment_id)
+        res = self._reads.do(
+            ('get_tenancy', self.compartment_id),
+            lambda: self._identity_client.get_tenancy(self.compartment_id),
+        )
         return res.data.name
 
     def create_lpg(self, vcn_ocid: str, lpg_name: str) -> LocalPeeringGateway:
@@ -85,6 +197,162 @@ class OCIRepository(ContextManager):
         res = self._network_client.get_local_peering_gateway(local_peering_gateway_id=lpg_ocid)
         return res.data
 
+    def list_lpgs(
+        self,
+        vcn_ocid: Optional[str] = None,
+        compartment_ocid: Optional[str] = None,
+    ) -> Sequence[records.LpgRecord]:
+        return self._list_records(
+            self._network_client.list_local_peering_gateways,
+            records.LpgRecord.from_model,
+            compartment_id=compartment_ocid or self.compartment_id,
+            vcn_id=vcn_ocid,
+        )
+
+    def create_drg(self, drg_name: str) -> Drg:
+        res = self._network_client.create_drg(
+            create_drg_details=CreateDrgDetails(
+                compartment_id=self.compartment_id,
+                display_name=drg_name,
+            ),
+        )
+        self._created_drgs.add(res.data.id)
+        return res.data
+
+    def get_drg(self, drg_ocid: str) -> Drg:
+        return self._network_client.get_drg(drg_id=drg_ocid).data
+
+    def wait_until_drg_is_available(self, drg_ocid: str) -> Drg:
+        return self._wait_for_lifecycle_state(
+            lambda: self._network_client.get_drg(drg_id=drg_ocid),
+            kind='DRG',
+            state=Drg.LIFECYCLE_STATE_AVAILABLE,
+            failed_states=(Drg.LIFECYCLE_STATE_TERMINATING, Drg.LIFECYCLE_STATE_TERMINATED),
+        )
+
+    def delete_drg(self, drg_ocid: str) -> None:
+        self._network_client.delete_drg(drg_id=drg_ocid)
+        if drg_ocid in self._created_drgs:
+            self._created_drgs.remove(drg_ocid)
+
+    def create_vcn_import_distribution(self, drg_ocid: str, name: str) -> DrgRouteDistribution:
+        """Creates import Route Distribution of DRG that accepts routes of every VCN attachment."""
+        res = self._network_client.create_drg_route_distribution(
+            create_drg_route_distribution_details=CreateDrgRouteDistributionDetails(
+                drg_id=drg_ocid,
+                display_name=name,
+                distribution_type=CreateDrgRouteDistributionDetails.DISTRIBUTION_TYPE_IMPORT,
+            ),
+        )
+        self._created_drg_route_distributions.add(res.data.id)
+
+        self._network_client.add_drg_route_distribution_statements(
+            drg_route_distribution_id=res.data.id,
+            add_drg_route_distribution_statements_details=AddDrgRouteDistributionStatementsDetails(
+                statements=[
+                    AddDrgRouteDistributionStatementDetails(
+                        match_criteria=[
+                            DrgAttachmentTypeDrgRouteDistributionMatchCriteria(
+                                attachment_type=DrgAttachmentTypeDrgRouteDistributionMatchCriteria.ATTACHMENT_TYPE_VCN,
+                            ),
+                        ],
+                        action=AddDrgRouteDistributionStatementDetails.ACTION_ACCEPT,
+                        priority=1,
+                    ),
+                ],
+            ),
+        )
+        return res.data
+
+    def delete_drg_route_distribution(self, distribution_ocid: str) -> None:
+        self._network_client.delete_drg_route_distribution(drg_route_distribution_id=distribution_ocid)
+        if distribution_ocid in self._created_drg_route_distributions:
+            self._created_drg_route_distributions.remove(distribution_ocid)
+
+    def create_drg_route_table(self, drg_ocid: str, name: str, import_distribution_ocid: str) -> DrgRouteTable:
+        res = self._network_client.create_drg_route_table(
+            create_drg_route_table_details=CreateDrgRouteTableDetails(
+                drg_id=drg_ocid,
+                display_name=name,
+                import_drg_route_distribution_id=import_distribution_ocid,
+            ),
+        )
+        self._created_drg_route_tables.add(res.data.id)
+        return res.data
+
+    def list_drg_route_tables(self, drg_ocid: str) -> Sequence[DrgRouteTable]:
+        return oci.pagination.list_call_get_all_results(
+            self._network_client.list_drg_route_tables,
+            drg_id=drg_ocid,
+        ).data
+
+    def delete_drg_route_table(self, drg_route_table_ocid: str) -> None:
+        self._network_client.delete_drg_route_table(drg_route_table_id=drg_route_table_ocid)
+        if drg_route_table_ocid in self._created_drg_route_tables:
+            self._created_drg_route_tables.remove(drg_route_table_ocid)
+
+    def create_drg_attachment(
+        self,
+        drg_ocid: str,
+        vcn_ocid: str,
+        attachment_name: str,
+        drg_route_table_ocid: Optional[str] = None,
+    ) -> DrgAttachment:
+        res = self._network_client.create_drg_attachment(
+            create_drg_attachment_details=CreateDrgAttachmentDetails(
+                drg_id=drg_ocid,
+                display_name=attachment_name,
+                drg_route_table_id=drg_route_table_ocid,
+                network_details=VcnDrgAttachmentNetworkCreateDetails(id=vcn_ocid),
+            ),
+        )
+        self._created_drg_attachments.add(res.data.id)
+        return res.data
+
+    def get_drg_attachment(self, drg_attachment_ocid: str) -> DrgAttachment:
+        return self._network_client.get_drg_attachment(drg_attachment_id=drg_attachment_ocid).data
+
+    def wait_until_drg_attachment_is_attached(self, drg_attachment_ocid: str) -> DrgAttachment:
+        return self._wait_for_lifecycle_state(
+            lambda: self._network_client.get_drg_attachment(drg_attachment_id=drg_attachment_ocid),
+            kind='DRG Attachment',
+            state=DrgAttachment.LIFECYCLE_STATE_ATTACHED,
+            failed_states=(DrgAttachment.LIFECYCLE_STATE_DETACHING, DrgAttachment.LIFECYCLE_STATE_DETACHED),
+        )
+
+    def wait_until_drg_attachment_is_detached(self, drg_attachment_ocid: str) -> None:
+        """Waits until the attachment is detached or gone, after which its DRG Route Table and DRG can be deleted."""
+        self._wait_for_lifecycle_state(
+            lambda: self._network_client.get_drg_attachment(drg_attachment_id=drg_attachment_ocid),
+            kind='DRG Attachment',
+            state=DrgAttachment.LIFECYCLE_STATE_DETACHED,
+            failed_states=(),
+            succeed_on_not_found=True,
+        )
+
+    def update_drg_attachment(self, drg_attachment_ocid: str, drg_route_table_ocid: str) -> DrgAttachment:
+        """Binds the attachment to a DRG Route Table. The previous one is bound back on cleanup."""
+        previous = self.get_drg_attachment(drg_attachment_ocid=drg_attachment_ocid).drg_route_table_id
+        res = self._network_client.update_drg_attachment(
+            drg_attachment_id=drg_attachment_ocid,
+            update_drg_attachment_details=UpdateDrgAttachmentDetails(drg_route_table_id=drg_route_table_ocid),
+        )
+        self._rebound_drg_attachments.setdefault(drg_attachment_ocid, previous)
+        return res.data
+
+    def list_drg_attachments(self, drg_ocid: str) -> Sequence[DrgAttachment]:
+        return oci.pagination.list_call_get_all_results(
+            self._network_client.list_drg_attachments,
+            compartment_id=self.compartment_id,
+            drg_id=drg_ocid,
+            attachment_type='VCN',
+        ).data
+
+    def delete_drg_attachment(self, drg_attachment_ocid: str) -> None:
+        self._network_client.delete_drg_attachment(drg_attachment_id=drg_attachment_ocid)
+        if drg_attachment_ocid in self._created_drg_attachments:
+            self._created_drg_attachments.remove(drg_attachment_ocid)
+
     def create_policy(self, name: str, description: str, statements: Sequence[str]) -> Policy:
         res = self._identity_client.create_policy(
             create_policy_details=CreatePolicyDetails(
@@ -102,6 +370,53 @@ class OCIRepository(ContextManager):
         if policy_ocid in self._created_policies:
             self._created_policies.remove(policy_ocid)
 
+    def add_policy_statements(self, policy_ocid: str, statements: Sequence[str]) -> None:
+        """Adds `statements` to an existing Policy with single update. Skips statements it already has."""
+        added = []
+
+        def add(current: Sequence[str]) -> list[str]:
+            added[:] = [statement for statement in dict.fromkeys(statements) if statement not in current]
+            return [*current, *added]
+
+        self._update_policy_statements(policy_ocid, add)
+        self._added_policy_statements[policy_ocid].extend(added)
+
+    def remove_policy_statements(self, policy_ocid: str, statements: Collection[str]) -> None:
+        self._update_policy_statements(
+            policy_ocid,
+            lambda current: [statement for statement in current if statement not in statements],
+        )
+
+    def _update_policy_statements(
+        self,
+        policy_ocid: str,
+        update: Callable[[Sequence[str]], Sequence[str]],
+    ) -> None:
+        """Read-modify-write of statements guarded by ETag, like `_update_security_list_ingress_rules`."""
+        for attempt in range(1, MAX_POLICY_UPDATE_ATTEMPTS + 1):
+            res = self._identity_client.get_policy(policy_id=policy_ocid)
+            statements = res.data.statements or []
+            new_statements = list(update(statements))
+            if new_statements == statements:
+                return
+            try:
+                self._identity_client.update_policy(
+                    policy_id=policy_ocid,
+                    update_policy_details=UpdatePolicyDetails(statements=new_statements),
+                    if_match=res.headers['etag'],
+                )
+                return
+            except oci.exceptions.ServiceError as e:
+                if e.status != 412 or attempt == MAX_POLICY_UPDATE_ATTEMPTS:
+                    raise
+                _log.debug(f'Policy {policy_ocid} was updated concurrently. Retrying.')
+
+    def list_policies(self) -> Sequence[Policy]:
+        return oci.pagination.list_call_get_all_results(
+            self._identity_client.list_policies,
+            compartment_id=self.compartment_id,
+        ).data
+
     def connect_lpg_to(self, requestor_lpg_ocid: str, acceptor_lpg_ocid: str) -> None:
         self._network_client.connect_local_peering_gateways(
             local_peering_gateway_id=requestor_lpg_ocid,
@@ -109,65 +424,320 @@ class OCIRepository(ContextManager):
         )
 
     def get_vcn(self, vcn_ocid: str) -> Vcn:
-        return self._network_client.get_vcn(vcn_id=vcn_ocid).data
+        res = self._reads.do(('get_vcn', vcn_ocid), lambda: self._network_client.get_vcn(vcn_id=vcn_ocid))
+        return res.data
+
+    def list_vcns(self, compartment_ocid: Optional[str] = None) -> Sequence[records.VcnRecord]:
+        return self._list_records(
+            self._network_client.list_vcns,
+            records.VcnRecord.from_model,
+            compartment_id=compartment_ocid or self.compartment_id,
+        )
+
+    def get_group(self, group_ocid: str) -> Group:
+        return self._identity_client.get_group(group_id=group_ocid).data
 
-    def list_vcns(self) -> Sequence[Vcn]:
-        return self._network_client.list_vcns(compartment_id=self.compartment_id).data
+    def is_member_of(self, group_ocid: str) -> bool:
+        """Whether the user of this API key belongs to the group."""
+        memberships = self._identity_client.list_user_group_memberships(
+            compartment_id=self.compartment_id,
+            user_id=self._cfg['user'],
+            group_id=group_ocid,
+        ).data
+        return len(memberships) != 0
 
     def list_groups(self) -> Sequence[Group]:
-        return self._identity_client.list_groups(compartment_id=self.compartment_id).data
+        return oci.pagination.list_call_get_all_results(
+            self._identity_client.list_groups,
+            compartment_id=self.compartment_id,
+        ).data
 
     def get_route_table(self, route_table_ocid: str) -> RouteTable:
-        res = self._network_client.get_route_table(rt_id=route_table_ocid)
+        res = self._reads.do(
+            ('get_route_table', route_table_ocid),
+            lambda: self._network_client.get_route_table(rt_id=route_table_ocid),
+        )
         return res.data
 
     def add_lpg_to_route_table(self, route_table_ocid: str, lpg_ocid: str, peer_cidr: str) -> None:
-        route_table = self.get_route_table(route_table_ocid=route_table_ocid)
-        lpg_route_rule = RouteRule(
-            destination_type=RouteRule.DESTINATION_TYPE_CIDR_BLOCK,
-            destination=peer_cidr,
-            network_entity_id=lpg_ocid,
-        )
-        route_table.route_rules.append(lpg_route_rule)
-
-        self._update_route_table(route_table)
-        self._added_route_rules[route_table.id].append(lpg_route_rule)
-
-    def _update_route_table(self, route_table: RouteTable) -> None:
-        self._network_client.update_route_table(
-            rt_id=route_table.id,
-            update_route_table_details=UpdateRouteTableDetails(
-                defined_tags=route_table.defined_tags,
-                display_name=route_table.display_name,
-                freeform_tags=route_table.freeform_tags,
-                route_rules=route_table.route_rules,
-            ),
+        self.add_route_rule(route_table_ocid=route_table_ocid, network_entity_id=lpg_ocid, destination=peer_cidr)
+
+    def add_route_rule(self, route_table_ocid: str, network_entity_id: str, destination: str) -> None:
+        self.add_route_rules(route_table_ocid=route_table_ocid, rules=((network_entity_id, destination),))
+
+    def add_route_rules(self, route_table_ocid: str, rules: Sequence[tuple[str, str]]) -> None:
+        """Adds Route Rules of (network entity OCID, destination CIDR) with single update."""
+        route_rules = tuple(
+            RouteRule(
+                destination_type=RouteRule.DESTINATION_TYPE_CIDR_BLOCK,
+                destination=destination,
+                network_entity_id=network_entity_id,
+            )
+            for network_entity_id, destination in rules
+        )
+        self._update_route_rules(route_table_ocid, lambda current: [*current, *route_rules])
+        self._added_route_rules[route_table_ocid].extend(route_rules)
+
+    def remove_route_rules(self, route_table_ocid: str, network_entity_ids: Collection[str]) -> None:
+        """Removes every Route Rule that targets one of `network_entity_ids` with single update."""
+        self._update_route_rules(
+            route_table_ocid,
+            lambda current: [rule for rule in current if rule.network_entity_id not in network_entity_ids],
+        )
+
+    def _update_route_rules(
+        self,
+        route_table_ocid: str,
+        update: Callable[[Sequence[RouteRule]], Sequence[RouteRule]],
+    ) -> None:
+        """
+        Read-modify-write of Route Rules guarded by ETag, like `_update_security_list_ingress_rules`. The read goes
+        around `get_route_table`, whose coalesced result may predate the write of another thread.
+        """
+        for attempt in range(1, MAX_ROUTE_TABLE_UPDATE_ATTEMPTS + 1):
+            res = self._network_client.get_route_table(rt_id=route_table_ocid)
+            rules = res.data.route_rules or []
+            new_rules = list(update(rules))
+            if new_rules == rules:
+                return
+            try:
+                self._network_client.update_route_table(
+                    rt_id=route_table_ocid,
+                    update_route_table_details=UpdateRouteTableDetails(route_rules=new_rules),
+                    if_match=res.headers['etag'],
+                )
+                return
+            except oci.exceptions.ServiceError as e:
+                if e.status != 412 or attempt == MAX_ROUTE_TABLE_UPDATE_ATTEMPTS:
+                    raise
+                _log.debug(f'Route Table {route_table_ocid} was updated concurrently. Retrying.')
+
+    def add_nsg_ingress_rules(self, nsg_ocid: str, source_cidrs: Sequence[str]) -> None:
+        """
+        Allows stateful ingress of every protocol from `source_cidrs`, adding up to `MAX_NSG_RULES_PER_REQUEST` rules
+        per call. CIDRs that are already allowed are skipped.
+        """
+        existing = oci.pagination.list_call_get_all_results(
+            self._network_client.list_network_security_group_security_rules,
+            network_security_group_id=nsg_ocid,
+            direction=AddSecurityRuleDetails.DIRECTION_INGRESS,
+        ).data
+        allowed = {rule.source for rule in existing if rule.protocol == 'all'}
+        new_cidrs = [cidr for cidr in dict.fromkeys(source_cidrs) if cidr not in allowed]
+
+        for chunk in _chunked(new_cidrs, MAX_NSG_RULES_PER_REQUEST):
+            res = self._network_client.add_network_security_group_security_rules(
+                network_security_group_id=nsg_ocid,
+                add_network_security_group_security_rules_details=AddNetworkSecurityGroupSecurityRulesDetails(
+                    security_rules=[
+                        AddSecurityRuleDetails(
+                            direction=AddSecurityRuleDetails.DIRECTION_INGRESS,
+                            protocol='all',
+                            source=cidr,
+                            source_type=AddSecurityRuleDetails.SOURCE_TYPE_CIDR_BLOCK,
+                            is_stateless=False,
+                            description=f'peer_oracle_vcn: {cidr}',
+                        )
+                        for cidr in chunk
+                    ]
+                ),
+            )
+            self._added_nsg_rules[nsg_ocid].extend(rule.id for rule in res.data.security_rules)
+
+    def remove_nsg_rules(self, nsg_ocid: str, rule_ids: Sequence[str]) -> None:
+        for chunk in _chunked(rule_ids, MAX_NSG_RULES_PER_REQUEST):
+            self._network_client.remove_network_security_group_security_rules(
+                network_security_group_id=nsg_ocid,
+                remove_network_security_group_security_rules_details=RemoveNetworkSecurityGroupSecurityRulesDetails(
+                    security_rule_ids=chunk,
+                ),
+            )
+
+    def add_security_list_ingress_rules(self, security_list_ocid: str, source_cidrs: Sequence[str]) -> None:
+        """Allows stateful ingress of every protocol from `source_cidrs` with single update. Skips allowed CIDRs."""
+        added = []
+
+        def add(rules: Sequence[IngressSecurityRule]) -> list[IngressSecurityRule]:
+            allowed = {rule.source for rule in rules if rule.protocol == 'all'}
+            added[:] = [cidr for cidr in dict.fromkeys(source_cidrs) if cidr not in allowed]
+            return [
+                *rules,
+                *(
+                    IngressSecurityRule(
+                        protocol='all',
+                        source=cidr,
+                        source_type=IngressSecurityRule.SOURCE_TYPE_CIDR_BLOCK,
+                        is_stateless=False,
+                        description=f'peer_oracle_vcn: {cidr}',
+                    )
+                    for cidr in added
+                ),
+            ]
+
+        self._update_security_list_ingress_rules(security_list_ocid, add)
+        self._added_security_list_rules[security_list_ocid].extend(added)
+
+    def remove_security_list_ingress_rules(self, security_list_ocid: str, source_cidrs: Collection[str]) -> None:
+        """Removes ingress rules of every protocol from `source_cidrs` with single update."""
+        self._update_security_list_ingress_rules(
+            security_list_ocid,
+            lambda rules: [rule for rule in rules if not (rule.protocol == 'all' and rule.source in source_cidrs)],
         )
 
-    def list_route_tables(self, vcn_ocid: Optional[str] = None) -> Sequence[RouteTable]:
-        return self._network_client.list_route_tables(compartment_id=self.compartment_id, vcn_id=vcn_ocid).data
+    def _update_security_list_ingress_rules(
+        self,
+        security_list_ocid: str,
+        update: Callable[[Sequence[IngressSecurityRule]], Sequence[IngressSecurityRule]],
+    ) -> None:
+        """
+        Read-modify-write of ingress rules guarded by ETag, so a concurrent update of the Security List is never
+        overwritten. On conflict (412), it is read again and `update` is reapplied.
+        """
+        for attempt in range(1, MAX_SECURITY_LIST_UPDATE_ATTEMPTS + 1):
+            res = self._network_client.get_security_list(security_list_id=security_list_ocid)
+            rules = res.data.ingress_security_rules or []
+            new_rules = list(update(rules))
+            if new_rules == rules:
+                return
+            try:
+                self._network_client.update_security_list(
+                    security_list_id=security_list_ocid,
+                    update_security_list_details=UpdateSecurityListDetails(ingress_security_rules=new_rules),
+                    if_match=res.headers['etag'],
+                )
+                return
+            except oci.exceptions.ServiceError as e:
+                if e.status != 412 or attempt == MAX_SECURITY_LIST_UPDATE_ATTEMPTS:
+                    raise
+                _log.debug(f'Security List {security_list_ocid} was updated concurrently. Retrying.')
+
+    def list_route_tables(
+        self,
+        vcn_ocid: Optional[str] = None,
+        compartment_ocid: Optional[str] = None,
+    ) -> Sequence[records.RouteTableRecord]:
+        return self._list_records(
+            self._network_client.list_route_tables,
+            records.RouteTableRecord.from_model,
+            compartment_id=compartment_ocid or self.compartment_id,
+            vcn_id=vcn_ocid,
+        )
+
+    @staticmethod
+    def _list_records(list_fn: Callable[..., Any], to_record: Callable[[Any], T], **kwargs: Any) -> list[T]:
+        """
+        Lists every page and converts each page to compact records as soon as it arrives, so that the SDK models of
+        only one page are alive at a time.
+        """
+        ret = []
+        for response in oci.pagination.list_call_get_all_results_generator(list_fn, 'response', **kwargs):
+            ret.extend(to_record(model) for model in response.data)
+        return ret
+
+    def _wait_for_lifecycle_state(
+        self,
+        get: Callable[[], oci.response.Response],
+        kind: str,
+        state: str,
+        failed_states: Collection[str],
+        succeed_on_not_found: bool = False,
+    ) -> Any:
+        """
+        Polls with `oci.wait_until` until the resource is in `state` and returns it, or `None` if it is gone and
+        `succeed_on_not_found`. Raises `RuntimeError` as soon as it is in one of `failed_states`, and
+        `oci.exceptions.MaximumWaitTimeExceeded` after `MAX_LIFECYCLE_WAIT_SECONDS`.
+        """
+        try:
+            response = oci.wait_until(
+                self._network_client,
+                get(),
+                evaluate_response=lambda r: r.data.lifecycle_state in (state, *failed_states),
+                max_wait_seconds=MAX_LIFECYCLE_WAIT_SECONDS,
+                succeed_on_not_found=succeed_on_not_found,
+            )
+        except oci.exceptions.ServiceError as e:
+            # gone before the first poll
+            if e.status == 404 and succeed_on_not_found:
+                return None
+            raise
+        if response is oci.waiter.WAIT_RESOURCE_NOT_FOUND:
+            return None
+        if response.data.lifecycle_state != state:
+            raise RuntimeError(f'{kind} {response.data.id} is {response.data.lifecycle_state}, not {state}')
+        return response.data
 
     def cleanup_all_resources(self) -> None:
+        self.cleanup_security_rules()
         self.cleanup_route_rules()
+        self.cleanup_drgs()
         self.cleanup_lpgs()
         self.cleanup_policies()
 
     def cleanup_route_rules(self):
         if len(self._added_route_rules) != 0:
             for table_id, rules in tuple(self._added_route_rules.items()):
-                route_table = self.get_route_table(route_table_ocid=table_id)
-                for rule in rules:
-                    try:
-                        route_table.route_rules.remove(rule)
-                    except ValueError:
-                        pass
                 try:
-                    self._update_route_table(route_table)
+                    self._update_route_rules(table_id, partial(_without_route_rules, rules))
                 except oci.exceptions.ServiceError as e:
                     _log.warning(f'Failed to Route Rules. {e.args[0]}')
                 else:
                     del self._added_route_rules[table_id]
 
+    def cleanup_security_rules(self) -> None:
+        for nsg_id, rule_ids in tuple(self._added_nsg_rules.items()):
+            try:
+                self.remove_nsg_rules(nsg_id, rule_ids=rule_ids)
+            except oci.exceptions.ServiceError as e:
+                _log.warning(f'Failed to remove NSG Security Rules. {e.args[0]}')
+            else:
+                del self._added_nsg_rules[nsg_id]
+        for security_list_id, cidrs in tuple(self._added_security_list_rules.items()):
+            try:
+                self.remove_security_list_ingress_rules(security_list_id, source_cidrs=frozenset(cidrs))
+            except oci.exceptions.ServiceError as e:
+                _log.warning(f'Failed to remove Security List rules. {e.args[0]}')
+            else:
+                del self._added_security_list_rules[security_list_id]
+
+    def cleanup_drgs(self) -> None:
+        for attachment_id, route_table_id in tuple(self._rebound_drg_attachments.items()):
+            try:
+                self._network_client.update_drg_attachment(
+                    drg_attachment_id=attachment_id,
+                    update_drg_attachment_details=UpdateDrgAttachmentDetails(drg_route_table_id=route_table_id),
+                )
+                del self._rebound_drg_attachments[attachment_id]
+            except oci.exceptions.ServiceError as e:
+                _log.warning(f'Failed to bind DRG Attachment back to its DRG Route Table. {e.args[0]}')
+        detaching = []
+        for attachment_id in tuple(self._created_drg_attachments):
+            try:
+                self.delete_drg_attachment(attachment_id)
+                detaching.append(attachment_id)
+            except oci.exceptions.ServiceError as e:
+                _log.warning(f'Failed to delete DRG Attachment. {e.args[0]}')
+        # a DRG Route Table or DRG can't be deleted while an attachment still uses it
+        for attachment_id in detaching:
+            try:
+                self.wait_until_drg_attachment_is_detached(attachment_id)
+            except (oci.exceptions.ServiceError, oci.exceptions.MaximumWaitTimeExceeded) as e:
+                _log.warning(f'Failed to wait for DRG Attachment to be detached. {e.args[0]}')
+        for route_table_id in tuple(self._created_drg_route_tables):
+            try:
+                self.delete_drg_route_table(route_table_id)
+            except oci.exceptions.ServiceError as e:
+                _log.warning(f'Failed to delete DRG Route Table. {e.args[0]}')
+        for distribution_id in tuple(self._created_drg_route_distributions):
+            try:
+                self.delete_drg_route_distribution(distribution_id)
+            except oci.exceptions.ServiceError as e:
+                _log.warning(f'Failed to delete DRG Route Distribution. {e.args[0]}')
+        for drg_id in tuple(self._created_drgs):
+            try:
+                self.delete_drg(drg_id)
+            except oci.exceptions.ServiceError as e:
+                _log.warning(f'Failed to delete DRG. {e.args[0]}')
+
     def cleanup_lpgs(self) -> None:
         for lpg_id in tuple(self._created_lpgs):
             try:
@@ -176,6 +746,13 @@ class OCIRepository(ContextManager):
                 _log.warning(f'Failed to delete LPG. {e.args[0]}')
 
     def cleanup_policies(self):
+        for policy_id, statements in tuple(self._added_policy_statements.items()):
+            try:
+                self.remove_policy_statements(policy_id, statements=frozenset(statements))
+            except oci.exceptions.ServiceError as e:
+                _log.warning(f'Failed to remove Policy statements. {e.args[0]}')
+            else:
+                del self._added_policy_statements[policy_id]
         for policy_id in tuple(self._created_policies):
             try:
                 self.delete_policy(policy_id)
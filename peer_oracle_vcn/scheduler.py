@@ -0,0 +1,354 @@
+"""
+Fair scheduling of the API calls of batch peering.
+
+In an inter tenant batch one busy tenancy (e.g. the hub of a hub-and-spoke manifest) has far more work than the
+others. Submitted to a plain thread pool in order, its calls take every worker while the other tenancies wait, and
+the writes that must follow them (e.g. the single update of the hub's Route Table) start last.
+
+`FairScheduler` keeps its own queue in front of the thread pool and starts a call only when:
+
+- every call it depends on (`after`) has succeeded,
+- each of its tenancies is under `tenancy_parallelism` calls, and under its fair share of `parallelism` among the
+  tenancies that have work, unless nothing else could use an idle worker,
+- each of its shared resources (Route Table, NSG, Security List, Policy) is under `resource_parallelism` writers.
+
+Among the calls that may start, the one with the longest chain of work behind it goes first: the number of calls
+that wait for it, plus how many rounds the most backlogged of its tenancies and resources still needs at its cap.
+"""
+from __future__ import annotations
+
+import logging
+import math
+import threading
+import time
+import weakref
+from collections import Counter
+from collections.abc import Callable, Collection, Hashable, Iterator, Mapping
+from concurrent.futures import CancelledError, Executor, Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from typing import Any, Optional
+
+from pydantic import BaseModel
+
+_log = logging.getLogger(__name__)
+
+
+class TenancyQueueStats(BaseModel):
+    """Queueing of the calls of one tenancy (profile). Wait is from when a call could run to when it started."""
+
+    calls: int
+    queue_depth: int
+    max_queue_depth: int
+    total_wait: float
+    max_wait: float
+
+    class Config:
+        frozen = True
+
+    @property
+    def mean_wait(self) -> float:
+        return self.total_wait / self.calls if self.calls != 0 else 0.0
+
+
+class _Task:
+    __slots__ = (
+        'call',
+        'future',
+        'tenancies',
+        'keys',
+        'pending',
+        'parents',
+        'dependents',
+        'depth',
+        'seq',
+        'ready_at',
+        'failure',
+    )
+
+    def __init__(self, call: Callable[[], Any], tenancies: tuple[str, ...], keys: tuple[Hashable, ...], seq: int):
+        self.call = call
+        self.future = Future()
+        self.tenancies = tenancies
+        # tenancies and resources, each counted against its cap
+        self.keys = keys
+        # calls of `after` that are not done yet
+        self.pending = 0
+        self.parents: list[_Task] = []
+        self.dependents: list[_Task] = []
+        # longest chain of calls that wait for this one
+        self.depth = 0
+        self.seq = seq
+        self.ready_at: Optional[float] = None
+        # why the call fails without being run, decided with the lock held before its future is resolved
+        self.failure: Optional[BaseException] = None
+
+
+class FairScheduler(Executor):
+    """
+    Runs calls on `parallelism` threads, see the module. `submit` of `Executor` runs an unlabelled call, which only
+    counts against `parallelism`, so the scheduler can be passed wherever an executor is expected.
+    """
+
+    parallelism: int
+    tenancy_parallelism: Optional[int]
+    resource_parallelism: int
+
+    def __init__(
+        self,
+        parallelism: int,
+        tenancy_parallelism: Optional[int] = None,
+        resource_parallelism: int = 1,
+    ) -> None:
+        self.parallelism = parallelism
+        self.tenancy_parallelism = tenancy_parallelism
+        self.resource_parallelism = resource_parallelism
+        self._pool = ThreadPoolExecutor(max_workers=parallelism)
+        self._lock = threading.Lock()
+        # notified when nothing is queued or running
+        self._idle = threading.Condition(self._lock)
+        self._tasks: weakref.WeakKeyDictionary[Future, _Task] = weakref.WeakKeyDictionary()
+        self._seq = 0
+        self._held = 0
+        # calls that may start, and ones that wait for `after`
+        self._ready: list[_Task] = []
+        self._waiting: set[_Task] = set()
+        self._running = 0
+        self._running_by_key: Counter[Hashable] = Counter()
+        # calls that have not started yet, including ones waiting for `after`
+        self._queued_by_key: Counter[Hashable] = Counter()
+        self._calls: Counter[str] = Counter()
+        self._max_queue_depth: Counter[str] = Counter()
+        self._total_wait: Counter[str] = Counter()
+        self._max_wait: dict[str, float] = {}
+        self._shutdown = False
+
+    def submit(self, fn: Callable[..., Any], /, *args: Any, **kwargs: Any) -> Future:
+        return self.submit_to(fn, *args, **kwargs)
+
+    def submit_to(
+        self,
+        fn: Callable[..., Any],
+        /,
+        *args: Any,
+        tenancies: Collection[str] = (),
+        resources: Collection[Hashable] = (),
+        after: Collection[Future] = (),
+        **kwargs: Any,
+    ) -> Future:
+        """
+        Queues `fn(*args, **kwargs)` as a call of `tenancies` that writes `resources`, to be run once every future of
+        `after` has succeeded. If one of them fails, the call fails with its exception without being run.
+        """
+        tenancies = tuple(dict.fromkeys(tenancies))
+        keys = (*(('tenancy', t) for t in tenancies), *(('resource', r) for r in dict.fromkeys(resources)))
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError('cannot schedule new calls after shutdown')
+            if any(dependency not in self._tasks and not dependency.done() for dependency in after):
+                raise ValueError('`after` must be futures of this scheduler')
+            self._seq += 1
+            task = _Task(partial(fn, *args, **kwargs), tenancies=tenancies, keys=keys, seq=self._seq)
+            self._tasks[task.future] = task
+            self._queued_by_key.update(keys)
+            for tenancy in tenancies:
+                self._calls[tenancy] += 1
+                depth = self._queued_by_key[('tenancy', tenancy)]
+                self._max_queue_depth[tenancy] = max(self._max_queue_depth[tenancy], depth)
+
+            failure, failed = None, []
+            for dependency in after:
+                parent = self._tasks.get(dependency)
+                if dependency.done():
+                    if dependency.cancelled() or dependency.exception() is not None:
+                        failure = dependency.exception() if not dependency.cancelled() else CancelledError()
+                elif parent.failure is not None:
+                    failure = parent.failure
+                else:
+                    task.pending += 1
+                    task.parents.append(parent)
+                    parent.dependents.append(task)
+            for parent in task.parents:
+                self._deepen(parent, 1)
+
+            if failure is not None:
+                self._fail(task, failure, failed)
+            elif task.pending == 0:
+                self._make_ready(task)
+            else:
+                self._waiting.add(task)
+            self._dispatch()
+        self._resolve_failed(failed)
+        return task.future
+
+    @contextmanager
+    def holding(self) -> Iterator[None]:
+        """Starts nothing until the end of the block, so that the whole graph of calls is known before ordering it."""
+        with self._lock:
+            self._held += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._held -= 1
+                self._dispatch()
+
+    def cancel_pending(self) -> None:
+        """Cancels every call that has not started, e.g. after one failed and the batch is going to be rolled back."""
+        with self._lock:
+            cancelled = (*self._ready, *self._waiting)
+            for task in cancelled:
+                self._queued_by_key.subtract(task.keys)
+                task.failure = CancelledError()
+            self._ready.clear()
+            self._waiting.clear()
+            self._notify_if_idle()
+        for task in cancelled:
+            task.future.cancel()
+            # `concurrent.futures.wait()` counts a cancelled future as done only once waiters are notified
+            task.future.set_running_or_notify_cancel()
+
+    def stats(self) -> Mapping[str, TenancyQueueStats]:
+        with self._lock:
+            return {
+                tenancy: TenancyQueueStats(
+                    calls=calls,
+                    queue_depth=self._queued_by_key[('tenancy', tenancy)],
+                    max_queue_depth=self._max_queue_depth[tenancy],
+                    total_wait=self._total_wait[tenancy],
+                    max_wait=self._max_wait.get(tenancy, 0.0),
+                )
+                for tenancy, calls in sorted(self._calls.items())
+            }
+
+    def log_stats(self) -> None:
+        for tenancy, stats in self.stats().items():
+            _log.info(
+                f'Tenancy {tenancy}: {stats.calls} calls, queue depth {stats.queue_depth} '
+                f'(max {stats.max_queue_depth}), waited {stats.mean_wait:.2f}s on average (max {stats.max_wait:.2f}s)'
+            )
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        """
+        Stops taking calls. With `wait` (and not `cancel_futures`), returns once every queued call is done, otherwise
+        cancels the calls that have not started.
+        """
+        with self._lock:
+            self._shutdown = True
+        if cancel_futures or not wait:
+            self.cancel_pending()
+        if wait:
+            with self._idle:
+                while self._ready or self._waiting or self._running:
+                    self._idle.wait()
+        self._pool.shutdown(wait=wait)
+
+    def _deepen(self, task: _Task, depth: int) -> None:
+        if depth <= task.depth:
+            return
+        task.depth = depth
+        for parent in task.parents:
+            if not parent.future.done():
+                self._deepen(parent, depth + 1)
+
+    def _make_ready(self, task: _Task) -> None:
+        self._waiting.discard(task)
+        task.ready_at = time.monotonic()
+        self._ready.append(task)
+
+    def _fail(self, task: _Task, exception: BaseException, failed: list[_Task]) -> None:
+        """
+        Fails `task` and its dependents without running them. Called with the lock held, so their futures are only
+        added to `failed`, to be resolved by `_resolve_failed` once the lock is released: done callbacks may submit.
+        """
+        if task.failure is not None or task.future.done():
+            return
+        task.failure = exception
+        self._waiting.discard(task)
+        self._queued_by_key.subtract(task.keys)
+        failed.append(task)
+        for dependent in task.dependents:
+            self._fail(dependent, exception, failed)
+
+    @staticmethod
+    def _resolve_failed(failed: Collection[_Task]) -> None:
+        for task in failed:
+            if task.future.set_running_or_notify_cancel():
+                task.future.set_exception(task.failure)
+
+    def _cap(self, key: Hashable) -> int:
+        if key[0] == 'resource':
+            return self.resource_parallelism
+        return self.tenancy_parallelism or self.parallelism
+
+    def _chain(self, task: _Task) -> int:
+        backlog = max((math.ceil(self._queued_by_key[key] / self._cap(key)) for key in task.keys), default=0)
+        return task.depth + backlog
+
+    def _dispatch(self) -> None:
+        """Starts calls while there are idle workers. Called with the lock held."""
+        while not self._held and self._running < self.parallelism and self._ready:
+            runnable = [t for t in self._ready if all(self._running_by_key[k] < self._cap(k) for k in t.keys)]
+            if not runnable:
+                return
+
+            busy_tenancies = {
+                key
+                for counter in (self._queued_by_key, self._running_by_key)
+                for key, n in counter.items()
+                if key[0] == 'tenancy' and n > 0
+            }
+            fair_share = math.ceil(self.parallelism / max(len(busy_tenancies), 1))
+            # work conserving: a tenancy goes over its fair share only when nothing under it could use the worker
+            preferred = [
+                t for t in runnable if all(self._running_by_key[('tenancy', x)] < fair_share for x in t.tenancies)
+            ]
+            task = max(preferred or runnable, key=lambda t: (self._chain(t), -t.seq))
+
+            self._ready.remove(task)
+            self._queued_by_key.subtract(task.keys)
+            self._running_by_key.update(task.keys)
+            self._running += 1
+            wait = time.monotonic() - task.ready_at
+            for tenancy in task.tenancies:
+                self._total_wait[tenancy] += wait
+                self._max_wait[tenancy] = max(self._max_wait.get(tenancy, 0.0), wait)
+            self._pool.submit(self._run, task)
+
+    def _run(self, task: _Task) -> None:
+        exception = None
+        started = task.future.set_running_or_notify_cancel()
+        if started:
+            # resolved before taking the lock, since done callbacks may submit. A call submitted after this future
+            # is done doesn't wait for it, one submitted before is a dependent handled below.
+            try:
+                result = task.call()
+            except BaseException as e:
+                exception = e
+                task.future.set_exception(e)
+            else:
+                task.future.set_result(result)
+
+        failed = []
+        with self._lock:
+            self._running -= 1
+            self._running_by_key.subtract(task.keys)
+            if exception is not None:
+                for dependent in task.dependents:
+                    self._fail(dependent, exception, failed)
+            elif started:
+                for dependent in task.dependents:
+                    dependent.pending -= 1
+                    if dependent.pending == 0 and dependent.failure is None and not dependent.future.done():
+                        self._make_ready(dependent)
+            else:
+                for dependent in task.dependents:
+                    self._fail(dependent, CancelledError(), failed)
+            task.dependents.clear()
+            self._dispatch()
+            self._notify_if_idle()
+        self._resolve_failed(failed)
+
+    def _notify_if_idle(self) -> None:
+        if not (self._ready or self._waiting or self._running):
+            self._idle.notify_all()
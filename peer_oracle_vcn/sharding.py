@@ -0,0 +1,318 @@
+"""
+Splitting one manifest across several workers.
+
+Pairs are grouped into components so that every shared resource (VCN with its Route Tables, NSGs and Security Lists,
+and Policies between two tenancies) belongs to exactly one component. A component is the unit of work, so each shared
+resource is written by only one worker. Components are either assigned statically by shard index, or claimed one by
+one from a SQLite progress database with a lease that a live worker keeps renewing.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from collections.abc import Hashable, Iterable, Iterator, Mapping, Sequence
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+from peer_oracle_vcn import values
+
+_log = logging.getLogger(__name__)
+
+
+# only a pending component, one running by the same worker or one whose lease expired is taken
+_RUNNING = (
+    "UPDATE components SET state = 'running', worker = ?, lease_expires_at = ?, updated_at = ? "
+    "WHERE id = ? AND (state = 'pending' OR (state = 'running' AND (worker = ? OR lease_expires_at < ?)))"
+)
+_RENEW = "UPDATE components SET lease_expires_at = ?, updated_at = ? WHERE id = ? AND worker = ? AND state = 'running'"
+_DONE = (
+    "UPDATE components SET state = 'done', lease_expires_at = NULL, updated_at = ? "
+    "WHERE id = ? AND worker = ? AND state = 'running'"
+)
+
+
+class LeaseLost(Exception):
+    """Another worker took over components whose lease expired, e.g. while this worker was paused."""
+
+
+class Component:
+    """Pairs that share at least one resource with another pair of the component, transitively."""
+
+    id: str
+    pairs: Sequence[values.PeeringPair]
+
+    def __init__(self, pairs: Sequence[values.PeeringPair]) -> None:
+        self.pairs = tuple(sorted(pairs, key=pair_key))
+        self.id = hashlib.sha1('\n'.join(pair_key(pair) for pair in self.pairs).encode()).hexdigest()[:16]
+
+    def __len__(self) -> int:
+        return len(self.pairs)
+
+
+def pair_key(pair: values.PeeringPair) -> str:
+    return f'{pair.requestor_profile}:{pair.requestor_vcn}>{pair.acceptor_profile}:{pair.acceptor_vcn}'
+
+
+def _shared_resources(pair: values.PeeringPair) -> Iterator[Hashable]:
+    yield 'vcn', pair.requestor_vcn
+    yield 'vcn', pair.acceptor_vcn
+    if not pair.is_intra_tenant:
+        # inter tenant Policies are named after both tenancies, so every pair between them shares them
+        yield 'policy', pair.requestor_profile, pair.acceptor_profile
+    for resource in (
+        pair.requestor_route_table,
+        pair.acceptor_route_table,
+        *pair.requestor_nsgs,
+        *pair.acceptor_nsgs,
+        *pair.requestor_security_lists,
+        *pair.acceptor_security_lists,
+    ):
+        if resource is not None:
+            yield 'ocid', resource
+
+
+def group_pairs(pairs: Iterable[values.PeeringPair]) -> Sequence[Component]:
+    """Connected components of pairs over shared resources, largest first."""
+    parents: dict[Hashable, Hashable] = {}
+
+    def find(x: Hashable) -> Hashable:
+        parents.setdefault(x, x)
+        while parents[x] != x:
+            parents[x] = parents[parents[x]]
+            x = parents[x]
+        return x
+
+    pairs = tuple(dict.fromkeys(pairs))
+    for pair in pairs:
+        first, *rest = _shared_resources(pair)
+        for resource in rest:
+            parents[find(resource)] = find(first)
+
+    groups: dict[Hashable, list[values.PeeringPair]] = {}
+    for pair in pairs:
+        groups.setdefault(find(next(_shared_resources(pair))), []).append(pair)
+
+    return tuple(sorted((Component(g) for g in groups.values()), key=lambda c: (-len(c), c.id)))
+
+
+def shard(components: Sequence[Component], shard_index: int, shard_count: int) -> Sequence[Component]:
+    """
+    Components of the shard. Every worker computes the same assignment from the same manifest: the largest component
+    goes to the least loaded shard first.
+    """
+    loads = [0] * shard_count
+    ret = []
+    for component in sorted(components, key=lambda c: (-len(c), c.id)):
+        target = min(range(shard_count), key=lambda i: (loads[i], i))
+        loads[target] += len(component)
+        if target == shard_index:
+            ret.append(component)
+    return tuple(ret)
+
+
+def _fill(components: Iterable[Component], max_pairs: int) -> list[Component]:
+    ret = []
+    size = 0
+    for component in components:
+        if len(ret) == 0 or size + len(component) <= max_pairs:
+            ret.append(component)
+            size += len(component)
+    return ret
+
+
+def batches(components: Sequence[Component], max_pairs: int) -> Iterator[Sequence[Component]]:
+    """Groups components into batches of up to `max_pairs` pairs, so that small components are peered together."""
+    remaining = list(components)
+    while len(remaining) != 0:
+        batch = _fill(remaining, max_pairs)
+        yield batch
+        remaining = [c for c in remaining if c not in batch]
+
+
+class Progress:
+    """
+    Progress of a manifest shared by workers through a SQLite database.
+
+    SQLite locking relies on the file system, so the database must be on a local disk or a volume shared by containers
+    of the same host; network file systems often break it.
+    """
+
+    _path: Path
+    _conn: sqlite3.Connection
+    lease_seconds: float
+
+    def __init__(self, path: Path, lease_seconds: float = 600) -> None:
+        self._path = path
+        self.lease_seconds = lease_seconds
+        self._conn = self._connect()
+        self._conn.executescript(
+            '''
+            CREATE TABLE IF NOT EXISTS components (
+                id TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                state TEXT NOT NULL,
+                worker TEXT,
+                lease_expires_at REAL,
+                updated_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS pairs (
+                key TEXT PRIMARY KEY,
+                component TEXT NOT NULL,
+                requestor_vcn TEXT NOT NULL,
+                acceptor_vcn TEXT NOT NULL,
+                state TEXT NOT NULL,
+                worker TEXT,
+                updated_at REAL
+            );
+            '''
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        # autocommit, transactions are explicit
+        return sqlite3.connect(self._path, timeout=60, isolation_level=None, check_same_thread=False)
+
+    @contextmanager
+    def _transaction(self, conn: Optional[sqlite3.Connection] = None) -> Iterator[sqlite3.Connection]:
+        conn = conn or self._conn
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def register(self, components: Sequence[Component]) -> None:
+        """Adds components and their pairs as pending. Already registered ones are kept as they are."""
+        with self._transaction() as conn:
+            conn.executemany(
+                'INSERT OR IGNORE INTO components (id, size, state) VALUES (?, ?, ?)',
+                ((c.id, len(c), 'pending') for c in components),
+            )
+            conn.executemany(
+                'INSERT OR IGNORE INTO pairs (key, component, requestor_vcn, acceptor_vcn, state) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (
+                    (pair_key(pair), c.id, pair.requestor_vcn, pair.acceptor_vcn, values.PairState.PENDING.value)
+                    for c in components
+                    for pair in c.pairs
+                ),
+            )
+
+    def is_done(self, component: Component) -> bool:
+        row = self._conn.execute('SELECT state FROM components WHERE id = ?', (component.id,)).fetchone()
+        return row is not None and row[0] == 'done'
+
+    def claim(self, worker: str, components: Sequence[Component], max_pairs: int) -> Sequence[Component]:
+        """
+        Claims pending components, or ones whose lease has expired, largest first, up to `max_pairs` pairs (but at least
+        one component). Empty if nothing is left.
+        """
+        by_id = {c.id: c for c in components}
+        now = time.time()
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT id FROM components WHERE state = 'pending' OR (state = 'running' AND lease_expires_at < ?) "
+                'ORDER BY size DESC, id',
+                (now,),
+            ).fetchall()
+            claimed = _fill((by_id[component_id] for component_id, in rows if component_id in by_id), max_pairs)
+            conn.executemany(
+                _RUNNING,
+                ((worker, now + self.lease_seconds, now, c.id, worker, now) for c in claimed),
+            )
+        return claimed
+
+    @contextmanager
+    def lease(
+        self,
+        worker: str,
+        components: Sequence[Component],
+    ) -> Iterator[tuple[Sequence[Component], threading.Event]]:
+        """
+        Marks components as running by `worker`, renewing their lease in the background until done. Yields the
+        components it acquired, leaving out ones that are done or running by another worker with a live lease, and an
+        event that is set once another worker has taken any of them over, after which the batch must stop.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            acquired = tuple(
+                c
+                for c in components
+                if conn.execute(_RUNNING, (worker, now + self.lease_seconds, now, c.id, worker, now)).rowcount == 1
+            )
+        stopped = threading.Event()
+        lost = threading.Event()
+        if len(acquired) == 0:
+            yield acquired, lost
+            return
+
+        def renew() -> None:
+            conn = self._connect()
+            try:
+                while not stopped.wait(self.lease_seconds / 3):
+                    if not self._renew(conn, worker, acquired):
+                        _log.error(f'Worker {worker} lost the lease of a batch of {len(acquired)} components')
+                        lost.set()
+                        return
+            finally:
+                conn.close()
+
+        renewer = threading.Thread(target=renew, name=f'lease-{acquired[0].id}', daemon=True)
+        renewer.start()
+        try:
+            yield acquired, lost
+        finally:
+            stopped.set()
+            renewer.join()
+
+    def _renew(self, conn: sqlite3.Connection, worker: str, components: Sequence[Component]) -> bool:
+        """Renews the lease of components still running by `worker`. `False` if any of them is not anymore."""
+        now = time.time()
+        with self._transaction(conn):
+            cursor = conn.executemany(_RENEW, ((now + self.lease_seconds, now, c.id, worker) for c in components))
+        return cursor.rowcount == len(components)
+
+    def finish(
+        self,
+        worker: str,
+        components: Sequence[Component],
+        states: Mapping[values.PeeringPair, values.PairState],
+    ) -> None:
+        """
+        Records states of the pairs and marks components as done. Raises `LeaseLost`, recording nothing, if any of
+        them is not running by `worker` anymore.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.executemany(_DONE, ((now, c.id, worker) for c in components))
+            if cursor.rowcount != len(components):
+                raise LeaseLost(f'Worker {worker} lost the lease of a batch of {len(components)} components')
+            conn.executemany(
+                'UPDATE pairs SET state = ?, worker = ?, updated_at = ? WHERE key = ?',
+                ((state.value, worker, now, pair_key(pair)) for pair, state in states.items()),
+            )
+
+    def report(self) -> Mapping[str, Sequence[tuple[str, str, Optional[str]]]]:
+        """State -> (requestor VCN, acceptor VCN, worker) of every registered pair."""
+        ret = {}
+        for requestor_vcn, acceptor_vcn, state, worker in self._conn.execute(
+            'SELECT requestor_vcn, acceptor_vcn, state, worker FROM pairs ORDER BY key'
+        ):
+            ret.setdefault(state, []).append((requestor_vcn, acceptor_vcn, worker))
+        return ret
+
+    def running(self) -> Sequence[tuple[str, int, str, float]]:
+        """(component, size, worker, lease expiry) of components being peered."""
+        return tuple(
+            self._conn.execute(
+                "SELECT id, size, worker, lease_expires_at FROM components WHERE state = 'running' ORDER BY id"
+            )
+        )
+
+    def close(self) -> None:
+        self._conn.close()
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import threading
+from collections.abc import Callable, Hashable
+from concurrent.futures import Future
+from typing import TypeVar
+
+_T = TypeVar('_T')
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that have the same key.
+
+    While a call for a key is in flight, other callers of the same key wait for it and get its result (or its
+    exception) instead of calling again. Nothing is cached: a call that starts after the previous one finished goes to
+    the API again.
+    """
+
+    _lock: threading.Lock
+    _in_flight: dict[Hashable, Future]
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._in_flight = {}
+
+    def do(self, key: Hashable, fn: Callable[[], _T]) -> _T:
+        with self._lock:
+            future = self._in_flight.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self._in_flight[key] = future
+
+        if not is_leader:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._in_flight[key]
@@ -1,40 +1,83 @@
 from __future__ import annotations
 
 import logging
+import sys
+import threading
 import time
+from collections import defaultdict
+from collections.abc import Callable, Hashable, Iterator, Mapping, Sequence
+from concurrent.futures import FIRST_EXCEPTION, Executor, Future, ThreadPoolExecutor, wait
+from contextlib import ExitStack, nullcontext
+from functools import partial
+from typing import Optional, TypeVar
 
 import oci.exceptions
+from oci.core.models import Drg, DrgAttachment, DrgRouteTable
 
-from peer_oracle_vcn import commands, helpers
+from peer_oracle_vcn import commands, config, graph, helpers, preflight, scheduler, sharding, values
 from peer_oracle_vcn.repository import OCIRepository
 
 _log = logging.getLogger(__name__)
 
+T = TypeVar('T')
+
+
+def _preflight_single_pair(
+    requestor_repo: OCIRepository,
+    acceptor_repo: OCIRepository,
+    material: values.LPGMaterial,
+) -> bool:
+    if requestor_repo is acceptor_repo:
+        repos = {'tenancy': requestor_repo}
+        pair = values.PeeringPair(requestor_profile='tenancy', **material.dict())
+    else:
+        repos = {'requestor': requestor_repo, 'acceptor': acceptor_repo}
+        pair = values.PeeringPair(requestor_profile='requestor', acceptor_profile='acceptor', **material.dict())
+
+    with ThreadPoolExecutor() as executor:
+        problems = preflight.check(peerings=((pair, material),), repos=repos, executor=executor)
+    return preflight.log_problems(problems)
+
 
 def create_lpg_intra_tenant(cmd: commands.CreateLPGIntraTenant) -> None:
     with OCIRepository(oci_config=cmd.oci_config) as repo:
+        material = values.LPGMaterial(
+            requestor_vcn=cmd.requestor_vcn,
+            acceptor_vcn=cmd.acceptor_vcn,
+            requestor_group=cmd.requestor_group,
+            requestor_route_table=cmd.requestor_route_table,
+            acceptor_route_table=cmd.acceptor_route_table,
+            requestor_cidr=cmd.requestor_cidr,
+            acceptor_cidr=cmd.acceptor_cidr,
+        )
+        if not _preflight_single_pair(requestor_repo=repo, acceptor_repo=repo, material=material):
+            return
+
         req_vcn = repo.get_vcn(vcn_ocid=cmd.requestor_vcn)
         act_vcn = repo.get_vcn(vcn_ocid=cmd.acceptor_vcn)
+        req_policy_name, act_policy_name = helpers.build_intra_tenant_policy_names(
+            requestor_vcn_name=req_vcn.display_name,
+            acceptor_vcn_name=act_vcn.display_name,
+        )
 
         # create policies to peer
         with helpers.wrap_with_log(f'creating Policy on requestor ({req_vcn.display_name})'):
             _ = repo.create_policy(
-                name=f'request_lpg_to_vcn_{act_vcn.display_name}',
-                description=f'request_lpg_to_vcn_{act_vcn.display_name}',
-                statements=(
-                    f'Allow group id {cmd.requestor_group} to manage local-peering-from '
-                    f'in compartment id {repo.compartment_id}'
+                name=req_policy_name,
+                description=req_policy_name,
+                statements=helpers.build_intra_tenant_requestor_policy_statements(
+                    compartment_id=repo.compartment_id,
+                    requestor_group=cmd.requestor_group,
                 ),
             )
 
         with helpers.wrap_with_log(f'creating Policy on acceptor ({act_vcn.display_name})'):
             _ = repo.create_policy(
-                name=f'accept_lpg_of_vcn_{req_vcn.display_name}',
-                description=f'accept_lpg_of_vcn_{req_vcn.display_name}',
-                statements=(
-                    f'Allow group id {cmd.requestor_group} to manage local-peering-to in compartment id {repo.compartment_id}',
-                    f'Allow group id {cmd.requestor_group} to inspect vcns in compartment id {repo.compartment_id}',
-                    f'Allow group id {cmd.requestor_group} to inspect local-peering-gateways in compartment id {repo.compartment_id}',
+                name=act_policy_name,
+                description=act_policy_name,
+                statements=helpers.build_intra_tenant_acceptor_policy_statements(
+                    compartment_id=repo.compartment_id,
+                    requestor_group=cmd.requestor_group,
                 ),
             )
 
@@ -51,16 +94,7 @@ def create_lpg_intra_tenant(cmd: commands.CreateLPGIntraTenant) -> None:
             )
 
         _log.info('Waiting to acceptor\' LPG is accessible from requestor...')
-        while True:
-            try:
-                repo.get_lpg(lpg_ocid=acceptor_lpg.id)
-            except oci.exceptions.ServiceError as e:
-                if e.code != 'NotAuthorizedOrNotFound':
-                    _log.error(f'Requestor failed to fetch acceptor\'s LPG info. {e.args[0]}')
-                    raise e
-            else:
-                time.sleep(1)
-                break
+        helpers.wait_until_lpg_is_accessible(repo=repo, lpg_ocid=acceptor_lpg.id)
 
         with helpers.wrap_with_log('connecting two LPGs'):
             repo.connect_lpg_to(
@@ -82,6 +116,21 @@ def create_lpg_intra_tenant(cmd: commands.CreateLPGIntraTenant) -> None:
                 peer_cidr=cmd.requestor_cidr,
             )
 
+        _allow_peer_cidr(
+            repo=repo,
+            side='requestor',
+            nsgs=cmd.requestor_nsgs,
+            security_lists=cmd.requestor_security_lists,
+            peer_cidr=cmd.acceptor_cidr,
+        )
+        _allow_peer_cidr(
+            repo=repo,
+            side='acceptor',
+            nsgs=cmd.acceptor_nsgs,
+            security_lists=cmd.acceptor_security_lists,
+            peer_cidr=cmd.requestor_cidr,
+        )
+
 
 def create_lpg_inter_tenant(cmd: commands.CreateLPGInterTenant) -> None:
     req_config = cmd.requestor_oci_config
@@ -102,15 +151,22 @@ def create_lpg_inter_tenant(cmd: commands.CreateLPGInterTenant) -> None:
         if lpg_material is None:
             return
 
+        if not _preflight_single_pair(requestor_repo=req_repo, acceptor_repo=act_repo, material=lpg_material):
+            return
+
         # get tenancy names
         requestor_tenancy_name = req_repo.get_tenancy_name()
         acceptor_tenancy_name = act_repo.get_tenancy_name()
+        req_policy_name, act_policy_name = helpers.build_inter_tenant_policy_names(
+            requestor_tenancy_name=requestor_tenancy_name,
+            acceptor_tenancy_name=acceptor_tenancy_name,
+        )
 
         # create policies to peer
         with helpers.wrap_with_log(f'creating Policy on requestor ({requestor_tenancy_name})'):
             _ = req_repo.create_policy(
-                name=f'request_lpg_to_{acceptor_tenancy_name}',
-                description=f'request_lpg_to_{acceptor_tenancy_name}',
+                name=req_policy_name,
+                description=req_policy_name,
                 statements=helpers.build_requestor_policy_statements(
                     requestor_compartment_id=req_repo.compartment_id,
                     acceptor_compartment_id=act_repo.compartment_id,
@@ -120,8 +176,8 @@ def create_lpg_inter_tenant(cmd: commands.CreateLPGInterTenant) -> None:
 
         with helpers.wrap_with_log(f'creating Policy on acceptor ({acceptor_tenancy_name})'):
             _ = act_repo.create_policy(
-                name=f'accept_lpg_of_{requestor_tenancy_name}',
-                description=f'accept_lpg_of_{requestor_tenancy_name}',
+                name=act_policy_name,
+                description=act_policy_name,
                 statements=helpers.build_acceptor_policy_statements(
                     requestor_compartment_id=req_repo.compartment_id,
                     acceptor_compartment_id=act_repo.compartment_id,
@@ -142,16 +198,7 @@ def create_lpg_inter_tenant(cmd: commands.CreateLPGInterTenant) -> None:
             )
 
         _log.info('Waiting to acceptor\' LPG is accessible from requestor...')
-        while True:
-            try:
-                req_repo.get_lpg(lpg_ocid=acceptor_lpg.id)
-            except oci.exceptions.ServiceError as e:
-                if e.code != 'NotAuthorizedOrNotFound':
-                    _log.error(f'Requestor failed to fetch acceptor\'s LPG info. {e.args[0]}')
-                    raise e
-            else:
-                time.sleep(1)
-                break
+        helpers.wait_until_lpg_is_accessible(repo=req_repo, lpg_ocid=acceptor_lpg.id)
 
         with helpers.wrap_with_log('connecting two LPGs'):
             req_repo.connect_lpg_to(
@@ -173,20 +220,781 @@ def create_lpg_inter_tenant(cmd: commands.CreateLPGInterTenant) -> None:
                 peer_cidr=lpg_material.requestor_cidr,
             )
 
+        _allow_peer_cidr(
+            repo=req_repo,
+            side='requestor',
+            nsgs=cmd.requestor_nsgs,
+            security_lists=cmd.requestor_security_lists,
+            peer_cidr=lpg_material.acceptor_cidr,
+        )
+        _allow_peer_cidr(
+            repo=act_repo,
+            side='acceptor',
+            nsgs=cmd.acceptor_nsgs,
+            security_lists=cmd.acceptor_security_lists,
+            peer_cidr=lpg_material.requestor_cidr,
+        )
+
+
+def _allow_peer_cidr(
+    repo: OCIRepository,
+    side: str,
+    nsgs: Sequence[str],
+    security_lists: Sequence[str],
+    peer_cidr: str,
+) -> None:
+    for nsg in nsgs:
+        with helpers.wrap_with_log(f'allowing ingress from peer CIDR on {side}\'s NSG {nsg}'):
+            repo.add_nsg_ingress_rules(nsg_ocid=nsg, source_cidrs=(peer_cidr,))
+    for security_list in security_lists:
+        with helpers.wrap_with_log(f'allowing ingress from peer CIDR on {side}\'s Security List {security_list}'):
+            repo.add_security_list_ingress_rules(security_list_ocid=security_list, source_cidrs=(peer_cidr,))
+
+
+def _list_all(
+    oci_configs: Mapping[str, config.OCI_CONFIG],
+    parallelism: int,
+    list_resources: Callable[[OCIRepository], Sequence[T]],
+) -> Sequence[tuple[str, T]]:
+    """
+    (tenancy name, resource) of every profile, listed concurrently and merged in order of profiles. Profiles of a
+    tenancy that is already listed are skipped. Tenancies that fail are logged and left out.
+    """
+    with ThreadPoolExecutor(max_workers=parallelism) as executor:
+        repos = {}
+        for profile, repo in helpers.build_repositories(oci_configs, executor).items():
+            if repo.compartment_id not in (r.compartment_id for r in repos.values()):
+                repos[profile] = repo
+
+        futures = {
+            profile: (executor.submit(repo.get_tenancy_name), executor.submit(list_resources, repo))
+            for profile, repo in repos.items()
+        }
+        ret = []
+        for profile, (tenancy_name, resources) in futures.items():
+            try:
+                ret.extend((tenancy_name.result(), resource) for resource in resources.result())
+            except (oci.exceptions.ServiceError, oci.exceptions.RequestException) as e:
+                _log.error(f'Failed to list resources of profile {profile}. {e.args[0]}')
+        return ret
+
 
 def list_vcns(cmd: commands.ListVCNs) -> None:
-    repo = OCIRepository(oci_config=cmd.oci_config)
-    for vcn in repo.list_vcns():
-        _log.info(f'VCN {vcn.display_name} - {vcn.id}')
+    for tenancy_name, vcn in _list_all(cmd.oci_configs, cmd.parallelism, OCIRepository.list_vcns):
+        _log.info(f'VCN {vcn.display_name} ({tenancy_name}) - {vcn.id}')
 
 
 def list_groups(cmd: commands.ListGroups) -> None:
-    repo = OCIRepository(oci_config=cmd.oci_config)
-    for group in repo.list_groups():
-        _log.info(f'Group {group.name} - {group.id}')
+    for tenancy_name, group in _list_all(cmd.oci_configs, cmd.parallelism, OCIRepository.list_groups):
+        _log.info(f'Group {group.name} ({tenancy_name}) - {group.id}')
 
 
 def list_route_tables(cmd: commands.ListRouteTables) -> None:
+    for tenancy_name, route_table in _list_all(
+        cmd.oci_configs,
+        cmd.parallelism,
+        partial(OCIRepository.list_route_tables, vcn_ocid=cmd.vcn_ocid),
+    ):
+        _log.info(f'Route Table {route_table.display_name} ({tenancy_name}) - {route_table.id}')
+
+
+def analyze_peering(cmd: commands.AnalyzePeering) -> None:
     repo = OCIRepository(oci_config=cmd.oci_config)
-    for route_table in repo.list_route_tables(vcn_ocid=cmd.vcn_ocid):
-        _log.info(f'Route Table {route_table}')
+    vcns = repo.list_vcns()
+    vcn_names = {vcn.id: vcn.display_name for vcn in vcns}
+
+    peering_graph = graph.PeeringGraph(vcns=vcns, lpgs=repo.list_lpgs(), route_tables=repo.list_route_tables())
+
+    for analysis in peering_graph.analyze():
+        source = vcn_names[analysis.source_vcn]
+        target = vcn_names[analysis.target_vcn]
+        if len(analysis.issues) == 0:
+            _log.info(f'VCN {source} -> {target}: reachable')
+        else:
+            issues = ', '.join(sorted(issue.value for issue in analysis.issues))
+            reachability = 'reachable' if analysis.reachable else 'unreachable'
+            _log.warning(f'VCN {source} -> {target}: {reachability} ({issues})')
+
+
+def _run_all(executor: Executor, calls: Mapping[Hashable, Callable[[], None]], msg: str) -> set[Hashable]:
+    """Runs every call concurrently and returns keys of failed calls. Failures are logged, not raised."""
+    futures = {key: executor.submit(call) for key, call in calls.items()}
+    failed = set()
+    for key, future in futures.items():
+        try:
+            future.result()
+        except oci.exceptions.ServiceError as e:
+            _log.warning(f'Failed {msg} ({key}). {e.args[0]}')
+            failed.add(key)
+    return failed
+
+
+def unpeer(cmd: commands.Unpeer) -> bool:
+    """Returns `False` if removing any Route Rule, LPG or Policy failed."""
+    repos = {profile: OCIRepository(oci_config=oci_config) for profile, oci_config in cmd.oci_configs.items()}
+
+    with ThreadPoolExecutor(max_workers=cmd.parallelism) as executor:
+        _log.info(f'Fetching inventory of {len(repos)} tenancies...')
+        inventories = helpers.load_inventories(repos, executor)
+
+        resources = tuple(
+            helpers.discover_peering_resources(
+                pair=pair,
+                requestor_inventory=inventories[pair.requestor_profile],
+                acceptor_inventory=inventories[pair.acceptor_profile],
+            )
+            for pair in cmd.pairs
+        )
+        for r in resources:
+            if len(r.requestor_lpgs) == 0 and len(r.acceptor_lpgs) == 0:
+                _log.warning(f'No LPGs are found between {r.pair.requestor_vcn} and {r.pair.acceptor_vcn}')
+
+        # (profile, Route Table OCID) -> LPGs. Rules of the same Route Table are removed by single update.
+        route_rules = defaultdict(set)
+        lpgs = set()
+        for r in resources:
+            for table_id, lpg_ids in r.requestor_route_rules.items():
+                route_rules[(r.pair.requestor_profile, table_id)].update(lpg_ids)
+            for table_id, lpg_ids in r.acceptor_route_rules.items():
+                route_rules[(r.pair.acceptor_profile, table_id)].update(lpg_ids)
+            lpgs.update((r.pair.requestor_profile, lpg_id) for lpg_id in r.requestor_lpgs)
+            lpgs.update((r.pair.acceptor_profile, lpg_id) for lpg_id in r.acceptor_lpgs)
+
+        _log.info(f'Removing LPG Route Rules from {len(route_rules)} Route Tables...')
+        failed_tables = _run_all(
+            executor,
+            {
+                (profile, table_id): partial(
+                    repos[profile].remove_route_rules,
+                    route_table_ocid=table_id,
+                    network_entity_ids=frozenset(lpg_ids),
+                )
+                for (profile, table_id), lpg_ids in route_rules.items()
+            },
+            'removing Route Rules',
+        )
+        # LPG that is still a target of Route Rule can not be deleted
+        lpgs_in_use = {
+            (profile, lpg_id) for profile, table_id in failed_tables for lpg_id in route_rules[(profile, table_id)]
+        }
+
+        _log.info(f'Deleting {len(lpgs - lpgs_in_use)} LPGs...')
+        failed_lpgs = _run_all(
+            executor,
+            {
+                (profile, lpg_id): partial(repos[profile].delete_lpg, lpg_ocid=lpg_id)
+                for profile, lpg_id in lpgs - lpgs_in_use
+            },
+            'deleting LPG',
+        )
+        deleted_lpgs = {lpg_id for _, lpg_id in lpgs - lpgs_in_use - failed_lpgs}
+
+        policies = _collect_unused_policies(resources, inventories, deleted_lpgs)
+        _log.info(f'Deleting {len(policies)} Policies...')
+        failed_policies = _run_all(
+            executor,
+            {
+                (profile, policy_id): partial(repos[profile].delete_policy, policy_ocid=policy_id)
+                for profile, policy_id in policies
+            },
+            'deleting Policy',
+        )
+
+    return not (failed_tables or failed_lpgs or failed_policies)
+
+
+def _collect_unused_policies(
+    resources: tuple[values.PeeringResources, ...],
+    inventories: Mapping[str, helpers.Inventory],
+    deleted_lpgs: set[str],
+) -> set[tuple[str, str]]:
+    """
+    Policies are shared by every peering between the same tenancies (inter tenant) or the same VCN (intra tenant),
+    so a Policy is deleted only when no remaining peering needs it.
+    """
+    lpg_owners = {
+        lpg_id: (profile, lpg.vcn_id) for profile, inv in inventories.items() for lpg_id, lpg in inv.lpgs.items()
+    }
+    remaining = set()
+    for lpg_id, (profile, vcn_id) in lpg_owners.items():
+        peer_id = inventories[profile].lpgs[lpg_id].peer_id
+        if lpg_id in deleted_lpgs or peer_id in deleted_lpgs or peer_id not in lpg_owners:
+            continue
+        remaining.add(((profile, vcn_id), lpg_owners[peer_id]))
+
+    ret = set()
+    for r in resources:
+        pair = r.pair
+        if pair.is_intra_tenant:
+            requestor_needed = any(pair.acceptor_vcn in (src[1], dst[1]) for src, dst in remaining)
+            acceptor_needed = any(pair.requestor_vcn in (src[1], dst[1]) for src, dst in remaining)
+        else:
+            tenancies = {pair.requestor_profile, pair.acceptor_profile}
+            requestor_needed = acceptor_needed = any({src[0], dst[0]} == tenancies for src, dst in remaining)
+
+        if not requestor_needed:
+            ret.update((pair.requestor_profile, policy_id) for policy_id in r.requestor_policies)
+        if not acceptor_needed:
+            ret.update((pair.acceptor_profile, policy_id) for policy_id in r.acceptor_policies)
+    return ret
+
+
+_TRANSIT_DRG_ROUTE_TABLE_NAME = 'peer_oracle_vcn_transit'
+
+
+def create_drg_transit(cmd: commands.CreateDRGTransit) -> None:
+    """
+    Connects VCNs through a hub DRG instead of LPG full mesh.
+
+    Every VCN attachment is bound to a DRG Route Table that imports routes of all VCN attachments, so the DRG learns
+    CIDR of a new VCN by itself. Together with a single Route Rule of covering CIDR on the VCN side, attaching a VCN
+    costs constant number of operations regardless of how many VCNs are already connected.
+    """
+    with OCIRepository(oci_config=cmd.oci_config) as repo:
+        if cmd.drg is None:
+            with helpers.wrap_with_log(f'creating DRG ({cmd.drg_name})'):
+                drg = repo.create_drg(drg_name=cmd.drg_name)
+        else:
+            drg = repo.get_drg(drg_ocid=cmd.drg)
+
+        _log.info('Waiting to DRG is available...')
+        drg = repo.wait_until_drg_is_available(drg_ocid=drg.id)
+
+        transit_table = next(
+            (t for t in repo.list_drg_route_tables(drg_ocid=drg.id) if t.display_name == _TRANSIT_DRG_ROUTE_TABLE_NAME),
+            None,
+        )
+        if transit_table is None:
+            with helpers.wrap_with_log('creating DRG Route Table for transit'):
+                distribution = repo.create_vcn_import_distribution(
+                    drg_ocid=drg.id,
+                    name=_TRANSIT_DRG_ROUTE_TABLE_NAME,
+                )
+                transit_table = repo.create_drg_route_table(
+                    drg_ocid=drg.id,
+                    name=_TRANSIT_DRG_ROUTE_TABLE_NAME,
+                    import_distribution_ocid=distribution.id,
+                )
+
+        attachments = {
+            attachment.network_details.id if attachment.network_details is not None else attachment.vcn_id: attachment
+            for attachment in repo.list_drg_attachments(drg_ocid=drg.id)
+            if attachment.lifecycle_state
+            in (DrgAttachment.LIFECYCLE_STATE_ATTACHING, DrgAttachment.LIFECYCLE_STATE_ATTACHED)
+        }
+
+        with ThreadPoolExecutor(max_workers=cmd.parallelism) as executor:
+            futures = tuple(
+                executor.submit(
+                    _attach_vcn_to_transit,
+                    repo=repo,
+                    drg=drg,
+                    transit_table=transit_table,
+                    vcn_ocid=vcn_ocid,
+                    destination_cidrs=cmd.destination_cidrs,
+                    attachment=attachments.get(vcn_ocid),
+                )
+                for vcn_ocid in dict.fromkeys(cmd.vcns)
+            )
+            for future in futures:
+                future.result()
+
+
+def _attach_vcn_to_transit(
+    repo: OCIRepository,
+    drg: Drg,
+    transit_table: DrgRouteTable,
+    vcn_ocid: str,
+    destination_cidrs: Sequence[str],
+    attachment: Optional[DrgAttachment],
+) -> None:
+    vcn = repo.get_vcn(vcn_ocid=vcn_ocid)
+
+    if attachment is None:
+        with helpers.wrap_with_log(f'attaching VCN ({vcn.display_name}) to DRG'):
+            attachment = repo.create_drg_attachment(
+                drg_ocid=drg.id,
+                vcn_ocid=vcn.id,
+                attachment_name=f'{vcn.display_name}_to_{drg.display_name}',
+                drg_route_table_ocid=transit_table.id,
+            )
+
+    _log.info(f'Waiting to DRG Attachment of VCN ({vcn.display_name}) is attached...')
+    attachment = repo.wait_until_drg_attachment_is_attached(drg_attachment_ocid=attachment.id)
+
+    # a VCN attached before keeps its DRG Route Table, which doesn't import routes of the other VCNs
+    if attachment.drg_route_table_id != transit_table.id:
+        with helpers.wrap_with_log(f'binding DRG Attachment of VCN ({vcn.display_name}) to transit Route Table'):
+            repo.update_drg_attachment(drg_attachment_ocid=attachment.id, drg_route_table_ocid=transit_table.id)
+
+    route_table = repo.get_route_table(route_table_ocid=vcn.default_route_table_id)
+    existing = {(rule.destination, rule.network_entity_id) for rule in route_table.route_rules}
+    for cidr in destination_cidrs:
+        if (cidr, drg.id) in existing:
+            continue
+        with helpers.wrap_with_log(f'adding DRG route rule of {cidr} to VCN ({vcn.display_name})\'s Route Table'):
+            repo.add_route_rule(route_table_ocid=route_table.id, network_entity_id=drg.id, destination=cidr)
+
+
+def check_status(cmd: commands.CheckStatus) -> bool:
+    """Returns `True` only if every LPG is healthy and every profile could be loaded and listed."""
+    with ThreadPoolExecutor(max_workers=cmd.parallelism) as executor:
+        repos = helpers.build_repositories(cmd.oci_configs, executor)
+        # every listing of every profile and compartment is in flight together
+        futures = {
+            (profile, compartment): (
+                executor.submit(repo.list_vcns, compartment_ocid=compartment),
+                executor.submit(repo.list_lpgs, compartment_ocid=compartment),
+                executor.submit(repo.list_route_tables, compartment_ocid=compartment),
+            )
+            for profile, repo in repos.items()
+            for compartment in (cmd.compartments.get(profile) or (None,))
+        }
+
+        vcns, route_tables = defaultdict(list), defaultdict(list)
+        lpgs = defaultdict(list)
+        failed_profiles = set()
+        for (profile, compartment), (vcn_future, lpg_future, route_table_future) in futures.items():
+            try:
+                vcns[profile].extend(vcn_future.result())
+                lpgs[profile].extend(lpg_future.result())
+                route_tables[profile].extend(route_table_future.result())
+            except (oci.exceptions.ServiceError, oci.exceptions.RequestException) as e:
+                _log.error(f'Failed to list compartment {compartment or "root"} of profile {profile}. {e}')
+                failed_profiles.add(profile)
+        # a partial inventory would report LPGs of the profile, and peers of other profiles, as unhealthy
+        for profile in failed_profiles:
+            for resources in (vcns, lpgs, route_tables):
+                resources.pop(profile, None)
+
+    peering_graph = graph.PeeringGraph(
+        vcns=(vcn for profile_vcns in vcns.values() for vcn in profile_vcns),
+        lpgs=(lpg for profile_lpgs in lpgs.values() for lpg in profile_lpgs),
+        route_tables=(table for profile_tables in route_tables.values() for table in profile_tables),
+    )
+    statuses = helpers.build_lpg_statuses(lpgs=lpgs, peering_graph=peering_graph)
+
+    if cmd.output == commands.StatusOutput.PROMETHEUS:
+        sys.stdout.write(helpers.format_prometheus(statuses))
+    else:
+        for status in statuses:
+            if status.is_healthy:
+                _log.info(f'LPG {status.display_name} ({status.profile}) - {status.lpg}: healthy')
+            else:
+                _log.warning(
+                    f'LPG {status.display_name} ({status.profile}) - {status.lpg}: ' + ', '.join(status.problems)
+                )
+        _log.info(f'{sum(s.is_healthy for s in statuses)} of {len(statuses)} LPGs are healthy')
+
+    return len(repos) == len(cmd.oci_configs) and not failed_profiles and all(s.is_healthy for s in statuses)
+
+
+def create_lpg_batch(cmd: commands.CreateLPGBatch) -> bool:
+    """
+    Peers every pair of the manifest. Returns `True` if every pair passed preflight (and was peered).
+
+    Pairs rejected by preflight are skipped before anything is created. The rest are peered in stages so that shared
+    resources are written once: Policies are created once per name, Route Rules are added with one update per Route
+    Table, and ingress rules of peer CIDRs are added in bulk per NSG and Security List. Any failure rolls back
+    everything created in this run.
+
+    With a shard or a progress database, the manifest is split into components that share no resource and peered
+    batch by batch (see `sharding`), so several workers can split it and a failure rolls back only its batch.
+    """
+    if cmd.shard_count is None and not cmd.claim and cmd.progress_db is None:
+        states = _peer_batch(
+            oci_configs=cmd.oci_configs,
+            pairs=cmd.pairs,
+            parallelism=cmd.parallelism,
+            tenancy_parallelism=cmd.tenancy_parallelism,
+            preflight_only=cmd.preflight_only,
+        )
+        return all(state in (values.PairState.FEASIBLE, values.PairState.SUCCEEDED) for state in states.values())
+
+    components = sharding.group_pairs(cmd.pairs)
+    if cmd.shard_count is not None:
+        components = sharding.shard(components, shard_index=cmd.shard_index, shard_count=cmd.shard_count)
+    _log.info(f'Worker {cmd.worker} has {len(components)} independent components of {sum(map(len, components))} pairs')
+
+    progress = None
+    if cmd.progress_db is not None:
+        progress = sharding.Progress(cmd.progress_db, lease_seconds=cmd.lease_seconds)
+    # preflight only reads the progress database to skip what is done, claiming or finishing a component would
+    # hide it from the workers that peer it
+    recording = progress is not None and not cmd.preflight_only
+    if recording:
+        progress.register(components)
+
+    def next_batches() -> Iterator[Sequence[sharding.Component]]:
+        if cmd.claim and recording:
+            while len(batch := progress.claim(cmd.worker, components, max_pairs=cmd.batch_size)) != 0:
+                yield batch
+        else:
+            pending = [c for c in components if progress is None or not progress.is_done(c)]
+            yield from sharding.batches(pending, max_pairs=cmd.batch_size)
+
+    all_peered = True
+    try:
+        for batch in next_batches():
+            with progress.lease(cmd.worker, batch) if recording else nullcontext((batch, None)) as (leased, lease_lost):
+                if len(leased) != len(batch):
+                    _log.warning(
+                        f'Skipping {len(batch) - len(leased)} components that are done or running by another worker'
+                    )
+                batch = leased
+                if len(batch) == 0:
+                    continue
+                pairs = tuple(pair for component in batch for pair in component.pairs)
+                try:
+                    states = _peer_batch(
+                        oci_configs=cmd.oci_configs,
+                        pairs=pairs,
+                        parallelism=cmd.parallelism,
+                        tenancy_parallelism=cmd.tenancy_parallelism,
+                        preflight_only=cmd.preflight_only,
+                        stop=lease_lost,
+                    )
+                except sharding.LeaseLost:
+                    # the worker that took the batch over peers it, so nothing is recorded
+                    _log.error(f'Rolled back batch of {len(pairs)} pairs taken over by another worker.')
+                    all_peered = False
+                    continue
+                except Exception as e:
+                    _log.error(f'Rolled back batch of {len(pairs)} pairs. Continuing with the next batch. {e}')
+                    states = {pair: values.PairState.FAILED for pair in pairs}
+            if recording:
+                try:
+                    progress.finish(cmd.worker, batch, states)
+                except sharding.LeaseLost as e:
+                    _log.error(f'{e}. Pairs of the batch may be peered by both workers.')
+                    all_peered = False
+                    continue
+            all_peered &= all(
+                state in (values.PairState.FEASIBLE, values.PairState.SUCCEEDED) for state in states.values()
+            )
+    finally:
+        if progress is not None:
+            progress.close()
+
+    return all_peered
+
+
+def report_batch(cmd: commands.ReportBatch) -> bool:
+    """Merged progress of every worker. Returns `True` if every pair is peered."""
+    progress = sharding.Progress(cmd.progress_db)
+    try:
+        report = progress.report()
+        running = progress.running()
+    finally:
+        progress.close()
+
+    for state in (values.PairState.REJECTED, values.PairState.FAILED):
+        for requestor_vcn, acceptor_vcn, worker in report.get(state.value, ()):
+            _log.warning(f'{requestor_vcn} -> {acceptor_vcn}: {state.value} by {worker}')
+    now = time.time()
+    for component, size, worker, lease_expires_at in running:
+        status = 'lease expired' if lease_expires_at < now else f'lease expires in {lease_expires_at - now:.0f}s'
+        _log.info(f'Component {component} of {size} pairs is running by {worker} ({status})')
+
+    total = sum(len(pairs) for pairs in report.values())
+    _log.info(f'{total} pairs: ' + ', '.join(f'{len(report.get(s.value, ()))} {s.value}' for s in values.PairState))
+    return len(report.get(values.PairState.SUCCEEDED.value, ())) == total
+
+
+def _peer_batch(
+    oci_configs: Mapping[str, config.OCI_CONFIG],
+    pairs: Sequence[values.PeeringPair],
+    parallelism: int,
+    tenancy_parallelism: Optional[int],
+    preflight_only: bool,
+    stop: Optional[threading.Event] = None,
+) -> Mapping[values.PeeringPair, values.PairState]:
+    """Peers `pairs`, rolling back everything on failure, or once `stop` is set by raising `sharding.LeaseLost`."""
+    repos = {profile: OCIRepository(oci_config=oci_config) for profile, oci_config in oci_configs.items()}
+    states = {}
+
+    with ExitStack() as stack:
+        for repo in repos.values():
+            stack.enter_context(repo)
+
+        with scheduler.FairScheduler(parallelism=parallelism, tenancy_parallelism=tenancy_parallelism) as executor:
+            material_futures = {
+                pair: executor.submit(
+                    helpers.build_lpg_materials,
+                    requestor_repo=repos[pair.requestor_profile],
+                    acceptor_repo=repos[pair.acceptor_profile],
+                    requestor_vcn=pair.requestor_vcn,
+                    acceptor_vcn=pair.acceptor_vcn,
+                    requestor_group=pair.requestor_group,
+                    requestor_route_table=pair.requestor_route_table,
+                    acceptor_route_table=pair.acceptor_route_table,
+                    requestor_cidr=pair.requestor_cidr,
+                    acceptor_cidr=pair.acceptor_cidr,
+                )
+                for pair in dict.fromkeys(pairs)
+            }
+            peerings = []
+            for pair, future in material_futures.items():
+                material = future.result()
+                if material is None:
+                    _log.error(f'Failed to resolve {pair.requestor_vcn} -> {pair.acceptor_vcn}. Skipping.')
+                    states[pair] = values.PairState.REJECTED
+                else:
+                    peerings.append((pair, material))
+
+            problems = preflight.check(
+                peerings=peerings,
+                repos=repos,
+                executor=executor,
+                reuse_existing_policies=True,
+            )
+            preflight.log_problems(problems)
+            feasible = tuple((pair, material) for pair, material in peerings if len(problems[pair]) == 0)
+            for pair, _ in peerings:
+                states[pair] = values.PairState.REJECTED
+            for pair, _ in feasible:
+                states[pair] = values.PairState.FEASIBLE
+            if preflight_only:
+                return states
+
+            _peer_all(repos=repos, peerings=feasible, executor=executor, stop=stop)
+            for pair, _ in feasible:
+                states[pair] = values.PairState.SUCCEEDED
+
+    return states
+
+
+def _peer_all(
+    repos: Mapping[str, OCIRepository],
+    peerings: Sequence[tuple[values.PeeringPair, values.LPGMaterial]],
+    executor: scheduler.FairScheduler,
+    stop: Optional[threading.Event] = None,
+) -> None:
+    """
+    Peers every pair as one graph of calls instead of stage by stage: LPGs of a pair are created once its Policies
+    exist, and each Route Table is updated once the LPGs of all its rules exist. Every call is labelled with its
+    tenancies and the shared resource it writes, so that `executor` keeps a busy tenancy from taking every worker and
+    starts the longest chains first.
+    """
+    profiles = {p for pair, _ in peerings for p in (pair.requestor_profile, pair.acceptor_profile)}
+    tenancy_names = {p: executor.submit_to(repos[p].get_tenancy_name, tenancies=(p,)) for p in profiles}
+    existing_policies = {p: executor.submit_to(repos[p].list_policies, tenancies=(p,)) for p in profiles}
+    vcn_futures = {}
+    for pair, material in peerings:
+        for profile, vcn_id in (
+            (pair.requestor_profile, material.requestor_vcn),
+            (pair.acceptor_profile, material.acceptor_vcn),
+        ):
+            if vcn_id not in vcn_futures:
+                vcn_futures[vcn_id] = executor.submit_to(repos[profile].get_vcn, vcn_ocid=vcn_id, tenancies=(profile,))
+    vcn_names = {vcn_id: future.result().display_name for vcn_id, future in vcn_futures.items()}
+    existing_policies = {p: {policy.name: policy for policy in f.result()} for p, f in existing_policies.items()}
+
+    # (profile, name) -> statements, kept in order as keys of a dict. Peerings between the same tenancies (or to the
+    # same VCN) share a Policy, which must allow the Group of each of them.
+    policies = defaultdict(dict)
+    # Policies that each pair needs
+    pair_policies = defaultdict(list)
+    for i, (pair, material) in enumerate(peerings):
+        req_repo, act_repo = repos[pair.requestor_profile], repos[pair.acceptor_profile]
+        if pair.is_intra_tenant:
+            req_name, act_name = helpers.build_intra_tenant_policy_names(
+                requestor_vcn_name=vcn_names[material.requestor_vcn],
+                acceptor_vcn_name=vcn_names[material.acceptor_vcn],
+            )
+            req_statements = helpers.build_intra_tenant_requestor_policy_statements(
+                compartment_id=req_repo.compartment_id,
+                requestor_group=material.requestor_group,
+            )
+            act_statements = helpers.build_intra_tenant_acceptor_policy_statements(
+                compartment_id=act_repo.compartment_id,
+                requestor_group=material.requestor_group,
+            )
+        else:
+            req_name, act_name = helpers.build_inter_tenant_policy_names(
+                requestor_tenancy_name=tenancy_names[pair.requestor_profile].result(),
+                acceptor_tenancy_name=tenancy_names[pair.acceptor_profile].result(),
+            )
+            req_statements = helpers.build_requestor_policy_statements(
+                requestor_compartment_id=req_repo.compartment_id,
+                acceptor_compartment_id=act_repo.compartment_id,
+                requestor_group=material.requestor_group,
+            )
+            act_statements = helpers.build_acceptor_policy_statements(
+                requestor_compartment_id=req_repo.compartment_id,
+                acceptor_compartment_id=act_repo.compartment_id,
+                requestor_group=material.requestor_group,
+            )
+        for profile, name, statements in (
+            (pair.requestor_profile, req_name, req_statements),
+            (pair.acceptor_profile, act_name, act_statements),
+        ):
+            policies[(profile, name)].update(dict.fromkeys(statements))
+            pair_policies[i].append((profile, name))
+
+    def add_route_rules(profile: str, table_id: str, rules: Sequence[tuple[Future, int, str]]) -> None:
+        # LPGs of every rule exist by now
+        repos[profile].add_route_rules(
+            route_table_ocid=table_id,
+            rules=tuple((lpg_future.result()[side], cidr) for lpg_future, side, cidr in rules),
+        )
+
+    def submit_policy(profile: str, name: str, statements: Sequence[str]) -> Optional[Future]:
+        existing = existing_policies[profile].get(name)
+        if existing is None:
+            return executor.submit_to(
+                repos[profile].create_policy,
+                name=name,
+                description=name,
+                statements=statements,
+                tenancies=(profile,),
+                resources=((profile, name),),
+            )
+        # e.g. made by an earlier batch between the same tenancies, possibly for another Group
+        missing = tuple(statement for statement in statements if statement not in (existing.statements or ()))
+        if len(missing) == 0:
+            return None
+        return executor.submit_to(
+            repos[profile].add_policy_statements,
+            policy_ocid=existing.id,
+            statements=missing,
+            tenancies=(profile,),
+            resources=((profile, name),),
+        )
+
+    with executor.holding():
+        policy_futures = {
+            key: future
+            for key, statements in policies.items()
+            if (future := submit_policy(*key, statements=tuple(statements))) is not None
+        }
+
+        lpg_futures = tuple(
+            executor.submit_to(
+                _create_and_connect_lpgs,
+                requestor_repo=repos[pair.requestor_profile],
+                acceptor_repo=repos[pair.acceptor_profile],
+                material=material,
+                requestor_vcn_name=vcn_names[material.requestor_vcn],
+                acceptor_vcn_name=vcn_names[material.acceptor_vcn],
+                tenancies=(pair.requestor_profile, pair.acceptor_profile),
+                after=tuple(policy_futures[key] for key in pair_policies[i] if key in policy_futures),
+            )
+            for i, (pair, material) in enumerate(peerings)
+        )
+
+        # (profile, Route Table OCID) -> Route Rules of (future of LPGs, side of the LPG, CIDR)
+        route_rules = defaultdict(list)
+        for (pair, material), lpg_future in zip(peerings, lpg_futures):
+            route_rules[(pair.requestor_profile, material.requestor_route_table)].append(
+                (lpg_future, 0, material.acceptor_cidr)
+            )
+            route_rules[(pair.acceptor_profile, material.acceptor_route_table)].append(
+                (lpg_future, 1, material.requestor_cidr)
+            )
+        route_rule_futures = tuple(
+            executor.submit_to(
+                add_route_rules,
+                profile,
+                table_id,
+                rules,
+                tenancies=(profile,),
+                resources=(table_id,),
+                after=tuple(dict.fromkeys(lpg_future for lpg_future, _, _ in rules)),
+            )
+            for (profile, table_id), rules in route_rules.items()
+        )
+
+        # (profile, NSG or Security List OCID) -> peer CIDRs to allow ingress from
+        nsg_rules = defaultdict(list)
+        security_list_rules = defaultdict(list)
+        for pair, material in peerings:
+            for profile, nsgs, security_lists, peer_cidr in (
+                (pair.requestor_profile, pair.requestor_nsgs, pair.requestor_security_lists, material.acceptor_cidr),
+                (pair.acceptor_profile, pair.acceptor_nsgs, pair.acceptor_security_lists, material.requestor_cidr),
+            ):
+                for nsg in nsgs:
+                    nsg_rules[(profile, nsg)].append(peer_cidr)
+                for security_list in security_lists:
+                    security_list_rules[(profile, security_list)].append(peer_cidr)
+        ingress_futures = (
+            *(
+                executor.submit_to(
+                    repos[profile].add_nsg_ingress_rules,
+                    nsg_ocid=nsg,
+                    source_cidrs=cidrs,
+                    tenancies=(profile,),
+                    resources=(nsg,),
+                )
+                for (profile, nsg), cidrs in nsg_rules.items()
+            ),
+            *(
+                executor.submit_to(
+                    repos[profile].add_security_list_ingress_rules,
+                    security_list_ocid=security_list,
+                    source_cidrs=cidrs,
+                    tenancies=(profile,),
+                    resources=(security_list,),
+                )
+                for (profile, security_list), cidrs in security_list_rules.items()
+            ),
+        )
+
+    with helpers.wrap_with_log(
+        f'peering {len(peerings)} pairs with {len(policy_futures)} new or extended Policies, '
+        f'{len(route_rules)} Route Tables, {len(nsg_rules)} NSGs and {len(security_list_rules)} Security Lists'
+    ):
+        try:
+            _wait_all(
+                executor,
+                (*policy_futures.values(), *lpg_futures, *route_rule_futures, *ingress_futures),
+                stop=stop,
+            )
+        finally:
+            executor.log_stats()
+
+
+def _wait_all(
+    executor: scheduler.FairScheduler,
+    futures: Sequence[Future],
+    stop: Optional[threading.Event] = None,
+) -> None:
+    """
+    Waits for every future and raises the first failure, or `sharding.LeaseLost` once `stop` is set. Calls that have
+    not started are cancelled then, but running ones are waited for, so that rollback doesn't race with them.
+    """
+    while True:
+        # `stop` is checked every second
+        done, not_done = wait(futures, timeout=None if stop is None else 1, return_when=FIRST_EXCEPTION)
+        failed = any(not f.cancelled() and f.exception() is not None for f in done)
+        stopped = stop is not None and stop.is_set()
+        if failed or stopped or len(not_done) == 0:
+            break
+    if failed or stopped:
+        executor.cancel_pending()
+        wait(futures)
+    for future in futures:
+        if not future.cancelled() and future.exception() is not None:
+            raise future.exception()
+    if stopped:
+        raise sharding.LeaseLost('Stopped peering, another worker took the batch over')
+
+
+def _create_and_connect_lpgs(
+    requestor_repo: OCIRepository,
+    acceptor_repo: OCIRepository,
+    material: values.LPGMaterial,
+    requestor_vcn_name: str,
+    acceptor_vcn_name: str,
+) -> tuple[str, str]:
+    requestor_lpg = requestor_repo.create_lpg(
+        vcn_ocid=material.requestor_vcn,
+        lpg_name=f'{requestor_vcn_name}_to_{acceptor_vcn_name}',
+    )
+    acceptor_lpg = acceptor_repo.create_lpg(
+        vcn_ocid=material.acceptor_vcn,
+        lpg_name=f'{acceptor_vcn_name}_to_{requestor_vcn_name}',
+    )
+    helpers.wait_until_lpg_is_accessible(repo=requestor_repo, lpg_ocid=acceptor_lpg.id)
+    requestor_repo.connect_lpg_to(requestor_lpg_ocid=requestor_lpg.id, acceptor_lpg_ocid=acceptor_lpg.id)
+    return requestor_lpg.id, acceptor_lpg.id
@@ -1,6 +1,11 @@
 from __future__ import annotations
 
-from pydantic import BaseModel
+from collections.abc import Mapping, Sequence
+from enum import Enum
+from typing import Optional
+
+from oci import config
+from pydantic import BaseModel, root_validator
 
 
 class LPGMaterial(BaseModel):
@@ -14,3 +19,82 @@ class LPGMaterial(BaseModel):
 
     class Config:
         frozen = True
+
+
+class PeeringPair(BaseModel):
+    """A pair of VCNs to be peered (or unpeered). Missing acceptor profile means intra tenant peering."""
+
+    requestor_profile: str = config.DEFAULT_PROFILE
+    acceptor_profile: Optional[str] = None
+    requestor_vcn: str
+    acceptor_vcn: str
+    requestor_group: Optional[str] = None
+    requestor_route_table: Optional[str] = None
+    acceptor_route_table: Optional[str] = None
+    requestor_cidr: Optional[str] = None
+    acceptor_cidr: Optional[str] = None
+    # NSGs and Security Lists of each side to allow ingress from the peer CIDR
+    requestor_nsgs: tuple[str, ...] = ()
+    acceptor_nsgs: tuple[str, ...] = ()
+    requestor_security_lists: tuple[str, ...] = ()
+    acceptor_security_lists: tuple[str, ...] = ()
+
+    class Config:
+        frozen = True
+
+    @root_validator(skip_on_failure=True)
+    def _default_acceptor_profile(cls, values: dict) -> dict:
+        if values.get('acceptor_profile') is None:
+            values['acceptor_profile'] = values['requestor_profile']
+        return values
+
+    @property
+    def is_intra_tenant(self) -> bool:
+        return self.requestor_profile == self.acceptor_profile
+
+
+class PairState(str, Enum):
+    PENDING = 'pending'
+    # passed preflight, on preflight only run
+    FEASIBLE = 'feasible'
+    # failed to resolve or rejected by preflight, nothing is created
+    REJECTED = 'rejected'
+    SUCCEEDED = 'succeeded'
+    # failed while peering, everything of the run is rolled back
+    FAILED = 'failed'
+
+
+class PeeringResources(BaseModel):
+    """Resources that connect a peered VCN pair, discovered from each side's inventory."""
+
+    pair: PeeringPair
+    requestor_lpgs: frozenset[str]
+    acceptor_lpgs: frozenset[str]
+    # Route Table OCID -> OCIDs of LPGs which are targets of Route Rules to remove
+    requestor_route_rules: Mapping[str, frozenset[str]]
+    acceptor_route_rules: Mapping[str, frozenset[str]]
+    requestor_policies: Sequence[str]
+    acceptor_policies: Sequence[str]
+
+    class Config:
+        frozen = True
+
+
+class LPGStatus(BaseModel):
+    profile: str
+    lpg: str
+    display_name: str
+    vcn: str
+    lifecycle_state: str
+    peering_status: str
+    route_tables: int
+    # `None` if peer LPG is not visible from any of the profiles
+    peer_route_tables: Optional[int]
+    problems: Sequence[str]
+
+    class Config:
+        frozen = True
+
+    @property
+    def is_healthy(self) -> bool:
+        return len(self.problems) == 0
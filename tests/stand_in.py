@@ -0,0 +1,877 @@
+"""
+Local HTTP stand-in of the OCI Networking, Identity and Limits REST endpoints that `OCIRepository` uses.
+
+Unlike an in-process fake, requests go through the genuine SDK stack (signing, serialization, retries and connection
+pooling), so end-to-end throughput can be measured without touching Oracle Cloud. Point the clients at it with
+`--service-endpoint http://127.0.0.1:<port>` (or `service_endpoint` in the OCI config profile).
+
+    python -m tests.stand_in --tenancy <tenancy_ocid> --vcns-per-tenancy 100 --latency 0.05 --rate-limit 10
+
+Signatures are not verified and every caller is allowed to do everything.
+"""
+from __future__ import annotations
+
+import argparse
+import configparser
+import copy
+import hashlib
+import itertools
+import json
+import logging
+import random
+import re
+import threading
+import time
+from collections.abc import Callable, Mapping, MutableMapping, Sequence
+from datetime import datetime, timezone
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+_log = logging.getLogger(__name__)
+
+_JSON = MutableMapping[str, Any]
+
+
+class _ServiceError(Exception):
+    def __init__(self, status: HTTPStatus, code: str, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+        self.code = code
+        self.message = message
+
+
+def _not_found(kind: str, ocid: str) -> _ServiceError:
+    return _ServiceError(HTTPStatus.NOT_FOUND, 'NotAuthorizedOrNotFound', f'{kind} {ocid} not found')
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+
+class _TokenBucket:
+    _lock: threading.Lock
+    _rate: float
+    _burst: float
+    _tokens: float
+    _updated_at: float
+
+    def __init__(self, rate: float, burst: float) -> None:
+        self._lock = threading.Lock()
+        self._rate = rate
+        self._burst = burst
+        self._tokens = burst
+        self._updated_at = time.monotonic()
+
+    def acquire(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._burst, self._tokens + (now - self._updated_at) * self._rate)
+            self._updated_at = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class StandInState:
+    """Resources of every tenancy, kept in the wire format (camelCase JSON objects)."""
+
+    _lock: threading.RLock
+    _ids: itertools.count
+    _etags: dict[str, int]
+    tenancies: dict[str, _JSON]
+    vcns: dict[str, _JSON]
+    lpgs: dict[str, _JSON]
+    route_tables: dict[str, _JSON]
+    drgs: dict[str, _JSON]
+    drg_attachments: dict[str, _JSON]
+    drg_route_tables: dict[str, _JSON]
+    drg_route_distributions: dict[str, _JSON]
+    security_lists: dict[str, _JSON]
+    nsgs: dict[str, _JSON]
+    nsg_rules: dict[str, list[_JSON]]
+    policies: dict[str, _JSON]
+    groups: dict[str, _JSON]
+    limits: dict[tuple[str, str], int]
+    # time a DRG Attachment takes to attach or detach
+    drg_attachment_seconds: float
+    # DRG Attachment -> (monotonic time, lifecycle state it moves to then)
+    _drg_attachment_transitions: dict[str, tuple[float, str]]
+
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self._ids = itertools.count(1)
+        self._etags = {}
+        self.tenancies = {}
+        self.vcns = {}
+        self.lpgs = {}
+        self.route_tables = {}
+        self.drgs = {}
+        self.drg_attachments = {}
+        self.drg_route_tables = {}
+        self.drg_route_distributions = {}
+        self.security_lists = {}
+        self.nsgs = {}
+        self.nsg_rules = {}
+        self.policies = {}
+        self.groups = {}
+        self.limits = {('vcn', 'lpg-count'): 10, ('identity', 'policies-count'): 100}
+        self.drg_attachment_seconds = 0
+        self._drg_attachment_transitions = {}
+
+    def new_id(self, kind: str) -> str:
+        n = next(self._ids)
+        return f'ocid1.{kind}.oc1..standin{hashlib.sha1(str(n).encode()).hexdigest()[:24]}{n}'
+
+    def etag(self, ocid: str) -> str:
+        return f'W/"{self._etags.get(ocid, 0)}"'
+
+    def touch(self, ocid: str) -> None:
+        self._etags[ocid] = self._etags.get(ocid, 0) + 1
+
+    def transition_drg_attachment(self, ocid: str, transient_state: str, state: str) -> None:
+        self.drg_attachments[ocid]['lifecycleState'] = transient_state
+        self._drg_attachment_transitions[ocid] = (time.monotonic() + self.drg_attachment_seconds, state)
+
+    def settle_drg_attachments(self) -> None:
+        """Moves DRG Attachments whose transition is over to their next lifecycle state."""
+        now = time.monotonic()
+        for ocid, (due, state) in tuple(self._drg_attachment_transitions.items()):
+            if due <= now:
+                del self._drg_attachment_transitions[ocid]
+                self.drg_attachments[ocid]['lifecycleState'] = state
+
+    def tenancy(self, tenancy_ocid: str) -> _JSON:
+        """Tenancies are created on first sight, since their OCIDs come from the user's OCI config."""
+        with self._lock:
+            if tenancy_ocid not in self.tenancies:
+                self.tenancies[tenancy_ocid] = {
+                    'id': tenancy_ocid,
+                    'name': f'tenancy{len(self.tenancies) + 1}',
+                    'description': 'stand-in tenancy',
+                    'homeRegionKey': 'ICN',
+                }
+            return self.tenancies[tenancy_ocid]
+
+    def seed(self, tenancy_ocid: str, vcns: int, group_name: str = 'peering') -> None:
+        """
+        Creates `vcns` VCNs with distinct /24 CIDRs, each with its default Route Table, default Security List and a NSG,
+        and the Group unless the tenancy already has it.
+        """
+        with self._lock:
+            tenancy = self.tenancy(tenancy_ocid)
+            base = len(self.vcns)
+            for i in range(base, base + vcns):
+                vcn_id = self.new_id('vcn')
+                route_table_id = self.new_id('routetable')
+                security_list_id = self.new_id('securitylist')
+                nsg_id = self.new_id('networksecuritygroup')
+                cidr = f'10.{i // 256 % 256}.{i % 256}.0/24'
+                self.vcns[vcn_id] = {
+                    'id': vcn_id,
+                    'compartmentId': tenancy_ocid,
+                    'displayName': f'{tenancy["name"]}_vcn{i - base + 1}',
+                    'cidrBlock': cidr,
+                    'cidrBlocks': [cidr],
+                    'defaultRouteTableId': route_table_id,
+                    'defaultSecurityListId': security_list_id,
+                    'lifecycleState': 'AVAILABLE',
+                    'timeCreated': _now(),
+                }
+                self.route_tables[route_table_id] = {
+                    'id': route_table_id,
+                    'compartmentId': tenancy_ocid,
+                    'vcnId': vcn_id,
+                    'displayName': f'Default Route Table for {tenancy["name"]}_vcn{i - base + 1}',
+                    'routeRules': [],
+                    'lifecycleState': 'AVAILABLE',
+                    'timeCreated': _now(),
+                }
+                self.security_lists[security_list_id] = {
+                    'id': security_list_id,
+                    'compartmentId': tenancy_ocid,
+                    'vcnId': vcn_id,
+                    'displayName': f'Default Security List for {tenancy["name"]}_vcn{i - base + 1}',
+                    'ingressSecurityRules': [
+                        {'protocol': '6', 'source': '0.0.0.0/0', 'sourceType': 'CIDR_BLOCK', 'isStateless': False}
+                    ],
+                    'egressSecurityRules': [
+                        {
+                            'protocol': 'all',
+                            'destination': '0.0.0.0/0',
+                            'destinationType': 'CIDR_BLOCK',
+                            'isStateless': False,
+                        }
+                    ],
+                    'lifecycleState': 'AVAILABLE',
+                    'timeCreated': _now(),
+                }
+                self.nsgs[nsg_id] = {
+                    'id': nsg_id,
+                    'compartmentId': tenancy_ocid,
+                    'vcnId': vcn_id,
+                    'displayName': f'{tenancy["name"]}_vcn{i - base + 1}_nsg',
+                    'lifecycleState': 'AVAILABLE',
+                    'timeCreated': _now(),
+                }
+                self.nsg_rules[nsg_id] = []
+            if any(g['compartmentId'] == tenancy_ocid and g['name'] == group_name for g in self.groups.values()):
+                return
+            group_id = self.new_id('group')
+            self.groups[group_id] = {
+                'id': group_id,
+                'compartmentId': tenancy_ocid,
+                'name': group_name,
+                'description': group_name,
+                'lifecycleState': 'ACTIVE',
+                'timeCreated': _now(),
+            }
+
+
+_Route = tuple[str, 're.Pattern[str]', Callable[..., Any]]
+
+
+class _API:
+    """Request handlers. Each returns a JSON-able body, `(body, headers)` or `None` for 204."""
+
+    state: StandInState
+    routes: Sequence[_Route]
+
+    def __init__(self, state: StandInState) -> None:
+        self.state = state
+        routes = (
+            ('GET', '/20160918/vcns', self.list_vcns),
+            ('GET', '/20160918/vcns/{id}', self.get_vcn),
+            ('GET', '/20160918/localPeeringGateways', self.list_lpgs),
+            ('POST', '/20160918/localPeeringGateways', self.create_lpg),
+            ('GET', '/20160918/localPeeringGateways/{id}', self.get_lpg),
+            ('DELETE', '/20160918/localPeeringGateways/{id}', self.delete_lpg),
+            ('POST', '/20160918/localPeeringGateways/{id}/actions/connect', self.connect_lpg),
+            ('GET', '/20160918/routeTables', self.list_route_tables),
+            ('GET', '/20160918/routeTables/{id}', self.get_route_table),
+            ('PUT', '/20160918/routeTables/{id}', self.update_route_table),
+            ('GET', '/20160918/securityLists', self.list_security_lists),
+            ('GET', '/20160918/securityLists/{id}', self.get_security_list),
+            ('PUT', '/20160918/securityLists/{id}', self.update_security_list),
+            ('GET', '/20160918/networkSecurityGroups', self.list_nsgs),
+            ('GET', '/20160918/networkSecurityGroups/{id}', self.get_nsg),
+            ('GET', '/20160918/networkSecurityGroups/{id}/securityRules', self.list_nsg_rules),
+            ('POST', '/20160918/networkSecurityGroups/{id}/actions/addSecurityRules', self.add_nsg_rules),
+            ('POST', '/20160918/networkSecurityGroups/{id}/actions/removeSecurityRules', self.remove_nsg_rules),
+            ('GET', '/20160918/drgs', self.list_drgs),
+            ('POST', '/20160918/drgs', self.create_drg),
+            ('GET', '/20160918/drgs/{id}', self.get_drg),
+            ('DELETE', '/20160918/drgs/{id}', self.delete_drg),
+            ('GET', '/20160918/drgAttachments', self.list_drg_attachments),
+            ('POST', '/20160918/drgAttachments', self.create_drg_attachment),
+            ('GET', '/20160918/drgAttachments/{id}', self.get_drg_attachment),
+            ('PUT', '/20160918/drgAttachments/{id}', self.update_drg_attachment),
+            ('DELETE', '/20160918/drgAttachments/{id}', self.delete_drg_attachment),
+            ('GET', '/20160918/drgRouteTables', self.list_drg_route_tables),
+            ('POST', '/20160918/drgRouteTables', self.create_drg_route_table),
+            ('DELETE', '/20160918/drgRouteTables/{id}', self.delete_drg_route_table),
+            ('POST', '/20160918/drgRouteDistributions', self.create_drg_route_distribution),
+            ('DELETE', '/20160918/drgRouteDistributions/{id}', self.delete_drg_route_distribution),
+            (
+                'POST',
+                '/20160918/drgRouteDistributions/{id}/actions/addDrgRouteDistributionStatements',
+                self.add_drg_route_distribution_statements,
+            ),
+            ('GET', '/20160918/tenancies/{id}', self.get_tenancy),
+            ('GET', '/20160918/policies', self.list_policies),
+            ('POST', '/20160918/policies', self.create_policy),
+            ('GET', '/20160918/policies/{id}', self.get_policy),
+            ('PUT', '/20160918/policies/{id}', self.update_policy),
+            ('DELETE', '/20160918/policies/{id}', self.delete_policy),
+            ('GET', '/20160918/groups', self.list_groups),
+            ('GET', '/20160918/groups/{id}', self.get_group),
+            ('GET', '/20160918/userGroupMemberships', self.list_user_group_memberships),
+            ('GET', '/20190729/limitValues', self.list_limit_values),
+        )
+        self.routes = tuple(
+            (method, re.compile('^' + path.replace('{id}', '(?P<id>[^/]+)') + '$'), handler)
+            for method, path, handler in routes
+        )
+
+    @staticmethod
+    def _get(resources: Mapping[str, _JSON], kind: str, ocid: str) -> _JSON:
+        try:
+            return resources[ocid]
+        except KeyError:
+            raise _not_found(kind, ocid)
+
+    @staticmethod
+    def _filter(resources: Mapping[str, _JSON], query: Mapping[str, str], **fields: str) -> list[_JSON]:
+        """Resources whose `field` equals to query parameter named `param` for every given `field=param`."""
+        return [
+            r
+            for r in resources.values()
+            if all(param not in query or r.get(field) == query[param] for field, param in fields.items())
+        ]
+
+    def _created(self, resources: MutableMapping[str, _JSON], kind: str, resource: _JSON) -> tuple[_JSON, dict]:
+        resource.setdefault('id', self.state.new_id(kind))
+        resource.setdefault('timeCreated', _now())
+        resources[resource['id']] = resource
+        self.state.touch(resource['id'])
+        return resource, {'etag': self.state.etag(resource['id'])}
+
+    # VCN
+    def list_vcns(self, query: Mapping[str, str], **_) -> list[_JSON]:
+        return self._filter(self.state.vcns, query, compartmentId='compartmentId')
+
+    def get_vcn(self, id: str, **_) -> _JSON:
+        return self._get(self.state.vcns, 'VCN', id)
+
+    # LPG
+    def list_lpgs(self, query: Mapping[str, str], **_) -> list[_JSON]:
+        return self._filter(self.state.lpgs, query, compartmentId='compartmentId', vcnId='vcnId')
+
+    def create_lpg(self, body: _JSON, **_) -> tuple[_JSON, dict]:
+        vcn = self._get(self.state.vcns, 'VCN', body['vcnId'])
+        limit = self.state.limits[('vcn', 'lpg-count')]
+        if sum(lpg['vcnId'] == vcn['id'] for lpg in self.state.lpgs.values()) >= limit:
+            raise _ServiceError(HTTPStatus.BAD_REQUEST, 'LimitExceeded', f'VCN {vcn["id"]} reached LPG limit')
+        return self._created(
+            self.state.lpgs,
+            'localpeeringgateway',
+            {
+                'compartmentId': body['compartmentId'],
+                'displayName': body.get('displayName'),
+                'vcnId': vcn['id'],
+                'lifecycleState': 'AVAILABLE',
+                'peeringStatus': 'NEW',
+                'isCrossTenancyPeering': False,
+            },
+        )
+
+    def get_lpg(self, id: str, **_) -> _JSON:
+        return self._get(self.state.lpgs, 'LPG', id)
+
+    def delete_lpg(self, id: str, **_) -> None:
+        lpg = self._get(self.state.lpgs, 'LPG', id)
+        for table in self.state.route_tables.values():
+            if any(rule.get('networkEntityId') == id for rule in table['routeRules']):
+                raise _ServiceError(
+                    HTTPStatus.CONFLICT, 'Conflict', f'LPG {id} is a target of Route Table {table["id"]}'
+                )
+        peer = self.state.lpgs.get(lpg.get('peerId'))
+        if peer is not None:
+            peer['peeringStatus'] = 'REVOKED'
+        del self.state.lpgs[id]
+
+    def connect_lpg(self, id: str, body: _JSON, **_) -> None:
+        requestor = self._get(self.state.lpgs, 'LPG', id)
+        acceptor = self._get(self.state.lpgs, 'LPG', body['peerId'])
+        if requestor['peeringStatus'] != 'NEW' or acceptor['peeringStatus'] != 'NEW':
+            raise _ServiceError(HTTPStatus.CONFLICT, 'Conflict', 'Both LPGs must be in NEW peering status')
+        cross_tenancy = requestor['compartmentId'] != acceptor['compartmentId']
+        for lpg, peer in ((requestor, acceptor), (acceptor, requestor)):
+            peer_vcn = self.state.vcns[peer['vcnId']]
+            lpg.update(
+                peerId=peer['id'],
+                peeringStatus='PEERED',
+                peeringStatusDetails='Connected to a peer.',
+                peerAdvertisedCidr=peer_vcn['cidrBlock'],
+                peerAdvertisedCidrDetails=peer_vcn['cidrBlocks'],
+                isCrossTenancyPeering=cross_tenancy,
+            )
+
+    # Route Table
+    def list_route_tables(self, query: Mapping[str, str], **_) -> list[_JSON]:
+        return self._filter(self.state.route_tables, query, compartmentId='compartmentId', vcnId='vcnId')
+
+    def get_route_table(self, id: str, **_) -> tuple[_JSON, dict]:
+        return self._get(self.state.route_tables, 'Route Table', id), {'etag': self.state.etag(id)}
+
+    def update_route_table(self, id: str, body: _JSON, headers: Mapping[str, str], **_) -> tuple[_JSON, dict]:
+        table = self._get(self.state.route_tables, 'Route Table', id)
+        if_match = headers.get('if-match')
+        if if_match is not None and if_match != self.state.etag(id):
+            raise _ServiceError(HTTPStatus.PRECONDITION_FAILED, 'NoEtagMatch', f'ETag of Route Table {id} mismatch')
+        if 'routeRules' in body:
+            if len(body['routeRules']) > 200:
+                raise _ServiceError(HTTPStatus.BAD_REQUEST, 'LimitExceeded', 'Too many Route Rules')
+            for rule in body['routeRules']:
+                rule.setdefault('destinationType', 'CIDR_BLOCK')
+                rule.setdefault('routeType', 'STATIC')
+                rule.setdefault('cidrBlock', rule.get('destination'))
+        table.update({k: v for k, v in body.items() if v is not None})
+        self.state.touch(id)
+        return table, {'etag': self.state.etag(id)}
+
+    # Security List
+    def list_security_lists(self, query: Mapping[str, str], **_) -> list[_JSON]:
+        return self._filter(self.state.security_lists, query, compartmentId='compartmentId', vcnId='vcnId')
+
+    def get_security_list(self, id: str, **_) -> tuple[_JSON, dict]:
+        return self._get(self.state.security_lists, 'Security List', id), {'etag': self.state.etag(id)}
+
+    def update_security_list(self, id: str, body: _JSON, headers: Mapping[str, str], **_) -> tuple[_JSON, dict]:
+        security_list = self._get(self.state.security_lists, 'Security List', id)
+        if_match = headers.get('if-match')
+        if if_match is not None and if_match != self.state.etag(id):
+            raise _ServiceError(HTTPStatus.PRECONDITION_FAILED, 'NoEtagMatch', f'ETag of Security List {id} mismatch')
+        for direction in ('ingressSecurityRules', 'egressSecurityRules'):
+            if body.get(direction) is not None and len(body[direction]) > 200:
+                raise _ServiceError(HTTPStatus.BAD_REQUEST, 'LimitExceeded', 'Too many Security Rules')
+        security_list.update({k: v for k, v in body.items() if v is not None})
+        self.state.touch(id)
+        return security_list, {'etag': self.state.etag(id)}
+
+    # NSG
+    def list_nsgs(self, query: Mapping[str, str], **_) -> list[_JSON]:
+        return self._filter(self.state.nsgs, query, compartmentId='compartmentId', vcnId='vcnId')
+
+    def get_nsg(self, id: str, **_) -> _JSON:
+        return self._get(self.state.nsgs, 'NSG', id)
+
+    def list_nsg_rules(self, id: str, query: Mapping[str, str], **_) -> list[_JSON]:
+        self._get(self.state.nsgs, 'NSG', id)
+        return [
+            rule for rule in self.state.nsg_rules[id] if query.get('direction', rule['direction']) == rule['direction']
+        ]
+
+    def add_nsg_rules(self, id: str, body: _JSON, **_) -> _JSON:
+        self._get(self.state.nsgs, 'NSG', id)
+        if len(body['securityRules']) > 25:
+            raise _ServiceError(HTTPStatus.BAD_REQUEST, 'InvalidParameter', 'At most 25 Security Rules per request')
+        if len(self.state.nsg_rules[id]) + len(body['securityRules']) > 120:
+            raise _ServiceError(HTTPStatus.BAD_REQUEST, 'LimitExceeded', f'NSG {id} reached limit of Security Rules')
+        rules = [
+            {**rule, 'id': f'{next(self.state._ids):06X}', 'isValid': True, 'timeCreated': _now()}
+            for rule in body['securityRules']
+        ]
+        self.state.nsg_rules[id].extend(rules)
+        return {'securityRules': rules}
+
+    def remove_nsg_rules(self, id: str, body: _JSON, **_) -> None:
+        self._get(self.state.nsgs, 'NSG', id)
+        removed = set(body['securityRuleIds'])
+        self.state.nsg_rules[id] = [rule for rule in self.state.nsg_rules[id] if rule['id'] not in removed]
+
+    # DRG
+    def list_drgs(self, query: Mapping[str, str], **_) -> list[_JSON]:
+        return self._filter(self.state.drgs, query, compartmentId='compartmentId')
+
+    def create_drg(self, body: _JSON, **_) -> tuple[_JSON, dict]:
+        drg_id = self.state.new_id('drg')
+        vcn_table, _ = self.create_drg_route_table({'drgId': drg_id, 'displayName': 'Autogenerated VCN Table'})
+        return self._created(
+            self.state.drgs,
+            'drg',
+            {
+                'id': drg_id,
+                'compartmentId': body['compartmentId'],
+                'displayName': body.get('displayName'),
+                'lifecycleState': 'AVAILABLE',
+                'defaultDrgRouteTables': {'vcn': vcn_table['id']},
+            },
+        )
+
+    def get_drg(self, id: str, **_) -> _JSON:
+        return self._get(self.state.drgs, 'DRG', id)
+
+    def delete_drg(self, id: str, **_) -> None:
+        self._get(self.state.drgs, 'DRG', id)
+        if self._drg_attachments_in_use(drgId=id):
+            raise _ServiceError(HTTPStatus.CONFLICT, 'Conflict', f'DRG {id} still has attachments')
+        del self.state.drgs[id]
+        # with what is left of the DRG, e.g. its autogenerated DRG Route Table
+        for resources in (self.state.drg_route_tables, self.state.drg_route_distributions, self.state.drg_attachments):
+            for ocid in [ocid for ocid, r in resources.items() if r['drgId'] == id]:
+                del resources[ocid]
+
+    def _drg_attachments_in_use(self, **fields: str) -> list[_JSON]:
+        self.state.settle_drg_attachments()
+        return [
+            a
+            for a in self.state.drg_attachments.values()
+            if a['lifecycleState'] != 'DETACHED' and all(a.get(k) == v for k, v in fields.items())
+        ]
+
+    def list_drg_attachments(self, query: Mapping[str, str], **_) -> list[_JSON]:
+        self.state.settle_drg_attachments()
+        return self._filter(self.state.drg_attachments, query, compartmentId='compartmentId', drgId='drgId')
+
+    def create_drg_attachment(self, body: _JSON, **_) -> tuple[_JSON, dict]:
+        drg = self._get(self.state.drgs, 'DRG', body['drgId'])
+        vcn_id = (body.get('networkDetails') or {}).get('id') or body.get('vcnId')
+        vcn = self._get(self.state.vcns, 'VCN', vcn_id)
+        attachment, headers = self._created(
+            self.state.drg_attachments,
+            'drgattachment',
+            {
+                'compartmentId': drg['compartmentId'],
+                'displayName': body.get('displayName'),
+                'drgId': drg['id'],
+                'vcnId': vcn['id'],
+                'networkDetails': {'type': 'VCN', 'id': vcn['id']},
+                'drgRouteTableId': body.get('drgRouteTableId') or drg['defaultDrgRouteTables']['vcn'],
+                'lifecycleState': 'ATTACHING',
+            },
+        )
+        self.state.transition_drg_attachment(attachment['id'], 'ATTACHING', 'ATTACHED')
+        return attachment, headers
+
+    def get_drg_attachment(self, id: str, **_) -> _JSON:
+        self.state.settle_drg_attachments()
+        return self._get(self.state.drg_attachments, 'DRG Attachment', id)
+
+    def update_drg_attachment(self, id: str, body: _JSON, **_) -> tuple[_JSON, dict]:
+        attachment = self.get_drg_attachment(id)
+        if attachment['lifecycleState'] != 'ATTACHED':
+            raise _ServiceError(
+                HTTPStatus.CONFLICT, 'Conflict', f'DRG Attachment {id} is {attachment["lifecycleState"]}'
+            )
+        if body.get('drgRouteTableId') is not None:
+            self._get(self.state.drg_route_tables, 'DRG Route Table', body['drgRouteTableId'])
+            attachment['drgRouteTableId'] = body['drgRouteTableId']
+        self.state.touch(id)
+        return attachment, {'etag': self.state.etag(id)}
+
+    def delete_drg_attachment(self, id: str, **_) -> None:
+        attachment = self.get_drg_attachment(id)
+        if attachment['lifecycleState'] in ('DETACHING', 'DETACHED'):
+            return
+        self.state.transition_drg_attachment(id, 'DETACHING', 'DETACHED')
+
+    def list_drg_route_tables(self, query: Mapping[str, str], **_) -> list[_JSON]:
+        return self._filter(self.state.drg_route_tables, query, drgId='drgId')
+
+    def create_drg_route_table(self, body: _JSON, **_) -> tuple[_JSON, dict]:
+        return self._created(
+            self.state.drg_route_tables,
+            'drgroutetable',
+            {
+                'drgId': body['drgId'],
+                'displayName': body.get('displayName'),
+                'importDrgRouteDistributionId': body.get('importDrgRouteDistributionId'),
+                'isEcmpEnabled': False,
+                'lifecycleState': 'AVAILABLE',
+            },
+        )
+
+    def delete_drg_route_table(self, id: str, **_) -> None:
+        self._get(self.state.drg_route_tables, 'DRG Route Table', id)
+        if self._drg_attachments_in_use(drgRouteTableId=id):
+            raise _ServiceError(HTTPStatus.CONFLICT, 'Conflict', f'DRG Route Table {id} is used by an attachment')
+        del self.state.drg_route_tables[id]
+
+    def create_drg_route_distribution(self, body: _JSON, **_) -> tuple[_JSON, dict]:
+        return self._created(
+            self.state.drg_route_distributions,
+            'drgroutedistribution',
+            {
+                'drgId': body['drgId'],
+                'displayName': body.get('displayName'),
+                'distributionType': body['distributionType'],
+                'statements': [],
+                'lifecycleState': 'AVAILABLE',
+            },
+        )
+
+    def delete_drg_route_distribution(self, id: str, **_) -> None:
+        self._get(self.state.drg_route_distributions, 'DRG Route Distribution', id)
+        if any(t.get('importDrgRouteDistributionId') == id for t in self.state.drg_route_tables.values()):
+            raise _ServiceError(HTTPStatus.CONFLICT, 'Conflict', f'DRG Route Distribution {id} is imported')
+        del self.state.drg_route_distributions[id]
+
+    def add_drg_route_distribution_statements(self, id: str, body: _JSON, **_) -> list[_JSON]:
+        distribution = self._get(self.state.drg_route_distributions, 'DRG Route Distribution', id)
+        statements = [{**s, 'id': self.state.new_id('drgroutedistributionstatement')} for s in body['statements']]
+        distribution['statements'].extend(statements)
+        return statements
+
+    # Identity
+    def get_tenancy(self, id: str, **_) -> _JSON:
+        return self.state.tenancy(id)
+
+    def list_policies(self, query: Mapping[str, str], **_) -> list[_JSON]:
+        return self._filter(self.state.policies, query, compartmentId='compartmentId', name='name')
+
+    def create_policy(self, body: _JSON, **_) -> tuple[_JSON, dict]:
+        if any(
+            p['name'] == body['name'] and p['compartmentId'] == body['compartmentId']
+            for p in self.state.policies.values()
+        ):
+            raise _ServiceError(HTTPStatus.CONFLICT, 'PolicyAlreadyExists', f'Policy {body["name"]} already exists')
+        limit = self.state.limits[('identity', 'policies-count')]
+        if sum(p['compartmentId'] == body['compartmentId'] for p in self.state.policies.values()) >= limit:
+            raise _ServiceError(HTTPStatus.BAD_REQUEST, 'LimitExceeded', 'Policy limit reached')
+        return self._created(
+            self.state.policies,
+            'policy',
+            {
+                'compartmentId': body['compartmentId'],
+                'name': body['name'],
+                'description': body.get('description'),
+                'statements': body['statements'],
+                'lifecycleState': 'ACTIVE',
+            },
+        )
+
+    def get_policy(self, id: str, **_) -> tuple[_JSON, dict]:
+        return self._get(self.state.policies, 'Policy', id), {'etag': self.state.etag(id)}
+
+    def update_policy(self, id: str, body: _JSON, headers: Mapping[str, str], **_) -> tuple[_JSON, dict]:
+        policy = self._get(self.state.policies, 'Policy', id)
+        if_match = headers.get('if-match')
+        if if_match is not None and if_match != self.state.etag(id):
+            raise _ServiceError(HTTPStatus.PRECONDITION_FAILED, 'NoEtagMatch', f'ETag of Policy {id} mismatch')
+        policy.update({k: v for k, v in body.items() if v is not None})
+        self.state.touch(id)
+        return policy, {'etag': self.state.etag(id)}
+
+    def delete_policy(self, id: str, **_) -> None:
+        self._get(self.state.policies, 'Policy', id)
+        del self.state.policies[id]
+
+    def list_groups(self, query: Mapping[str, str], **_) -> list[_JSON]:
+        return self._filter(self.state.groups, query, compartmentId='compartmentId')
+
+    def get_group(self, id: str, **_) -> _JSON:
+        return self._get(self.state.groups, 'Group', id)
+
+    def list_user_group_memberships(self, query: Mapping[str, str], **_) -> list[_JSON]:
+        # every user belongs to every group
+        group = self.state.groups.get(query.get('groupId'))
+        if group is None:
+            return []
+        return [
+            {
+                'id': f'ocid1.groupmembership.oc1..standin{group["id"][-8:]}',
+                'compartmentId': query['compartmentId'],
+                'groupId': group['id'],
+                'userId': query.get('userId'),
+                'lifecycleState': 'ACTIVE',
+                'timeCreated': group['timeCreated'],
+            }
+        ]
+
+    # Limits
+    def list_limit_values(self, query: Mapping[str, str], **_) -> list[_JSON]:
+        return [
+            {'name': name, 'scopeType': 'GLOBAL', 'value': value}
+            for (service, name), value in self.state.limits.items()
+            if service == query.get('serviceName') and query.get('name', name) == name
+        ]
+
+
+def _paginate(items: list[_JSON], query: Mapping[str, str]) -> tuple[list[_JSON], dict]:
+    start = int(query.get('page', 0))
+    limit = int(query.get('limit', 100))
+    end = start + limit
+    headers = {}
+    if end < len(items):
+        headers['opc-next-page'] = str(end)
+    return items[start:end], headers
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    state: StandInState
+    latency: float
+    latency_jitter: float
+    rate_limiter: Optional[_TokenBucket]
+    request_count: int
+    _request_count_lock: threading.Lock
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        state: Optional[StandInState] = None,
+        latency: float = 0,
+        latency_jitter: float = 0,
+        rate_limit: Optional[float] = None,
+        burst: Optional[float] = None,
+    ) -> None:
+        super().__init__(address, _Handler)
+        self.state = state or StandInState()
+        self.api = _API(self.state)
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.rate_limiter = None if rate_limit is None else _TokenBucket(rate_limit, burst or rate_limit)
+        self.request_count = 0
+        # handlers run on a thread per connection
+        self._request_count_lock = threading.Lock()
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: StandInServer
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format: str, *args: Any) -> None:
+        _log.debug(format % args)
+
+    def _respond(self, status: HTTPStatus, body: Any = None, headers: Optional[Mapping[str, str]] = None) -> None:
+        payload = b'' if body is None else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('opc-request-id', f'standin-{id(self):x}-{time.monotonic_ns()}')
+        if body is not None:
+            self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _handle(self) -> None:
+        url = urlsplit(self.path)
+        path = re.sub('/+', '/', url.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length)) if length else {}
+
+        with self.server._request_count_lock:
+            self.server.request_count += 1
+        if self.server.latency or self.server.latency_jitter:
+            time.sleep(max(0.0, self.server.latency + random.uniform(-1, 1) * self.server.latency_jitter))
+
+        if self.server.rate_limiter is not None and not self.server.rate_limiter.acquire():
+            self._respond(
+                HTTPStatus.TOO_MANY_REQUESTS,
+                {'code': 'TooManyRequests', 'message': 'Too many requests for the tenancy'},
+            )
+            return
+
+        for method, pattern, handler in self.server.api.routes:
+            match = pattern.match(path)
+            if method != self.command or match is None:
+                continue
+            try:
+                with self.server.state._lock:
+                    result = handler(
+                        query=query,
+                        body=body,
+                        headers={k.lower(): v for k, v in self.headers.items()},
+                        **match.groupdict(),
+                    )
+                    result, headers = result if isinstance(result, tuple) else (result, {})
+                    if isinstance(result, list):
+                        result, page_headers = _paginate(result, query)
+                        headers = {**headers, **page_headers}
+                    # serialize under the lock, the state keeps changing
+                    result = copy.deepcopy(result)
+            except _ServiceError as e:
+                self._respond(e.status, {'code': e.code, 'message': e.message})
+            except (KeyError, TypeError, ValueError) as e:
+                self._respond(HTTPStatus.BAD_REQUEST, {'code': 'InvalidParameter', 'message': repr(e)})
+            else:
+                status = HTTPStatus.NO_CONTENT if result is None else HTTPStatus.OK
+                self._respond(status, result, headers)
+            return
+
+        self._respond(HTTPStatus.NOT_FOUND, {'code': 'NotFound', 'message': f'{self.command} {path} is not emulated'})
+
+    do_GET = do_POST = do_PUT = do_DELETE = _handle
+
+
+def write_oci_config(
+    path: Path,
+    tenancies: Mapping[str, str],
+    service_endpoint: Optional[str] = None,
+) -> None:
+    """
+    Writes an OCI config file with a profile per tenancy (profile name -> tenancy OCID) and a fresh API signing key.
+
+    The stand-in does not verify signatures, but the SDK signs every request, so the key must be a real RSA key.
+    """
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    key_file = path.with_suffix('.pem')
+    key_file.write_bytes(
+        key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.TraditionalOpenSSL,
+            encryption_algorithm=serialization.NoEncryption(),
+        )
+    )
+    public_key = key.public_key().public_bytes(
+        encoding=serialization.Encoding.DER,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo,
+    )
+    fingerprint = ':'.join(f'{b:02x}' for b in hashlib.md5(public_key).digest())
+
+    cfg = configparser.ConfigParser(default_section='__none__')
+    for profile, tenancy in tenancies.items():
+        cfg[profile] = {
+            'user': f'ocid1.user.oc1..standin{profile.lower()}',
+            'fingerprint': fingerprint,
+            'key_file': str(key_file),
+            'tenancy': tenancy,
+            'region': 'ap-seoul-1',
+        }
+        if service_endpoint is not None:
+            cfg[profile]['service_endpoint'] = service_endpoint
+    with path.open('w') as f:
+        cfg.write(f)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog='python -m tests.stand_in', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument(
+        '--tenancy',
+        help='Tenancy OCID to seed. Can be used multiple times',
+        type=str,
+        action='append',
+        default=[],
+    )
+    parser.add_argument('--vcns-per-tenancy', type=int, default=2)
+    parser.add_argument('--latency', help='Seconds to delay every response', type=float, default=0)
+    parser.add_argument('--latency-jitter', help='Seconds of uniform jitter around `--latency`', type=float, default=0)
+    parser.add_argument('--rate-limit', help='Requests per second before returning 429', type=float, default=None)
+    parser.add_argument('--burst', help='Bucket size of `--rate-limit`', type=float, default=None)
+    parser.add_argument(
+        '--write-config',
+        help='Write an OCI config file with a profile per `--tenancy` (DEFAULT, TENANCY2, ...) to this path',
+        type=Path,
+        default=None,
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)-8s] %(message)s')
+
+    state = StandInState()
+    for tenancy in args.tenancy:
+        state.seed(tenancy_ocid=tenancy, vcns=args.vcns_per_tenancy)
+
+    server = StandInServer(
+        (args.host, args.port),
+        state=state,
+        latency=args.latency,
+        latency_jitter=args.latency_jitter,
+        rate_limit=args.rate_limit,
+        burst=args.burst,
+    )
+    if args.write_config is not None:
+        profiles = ('DEFAULT', *(f'TENANCY{i}' for i in range(2, len(args.tenancy) + 1)))
+        write_oci_config(
+            args.write_config,
+            tenancies=dict(zip(profiles, args.tenancy)),
+            service_endpoint=server.endpoint,
+        )
+        _log.info(f'Wrote OCI config to {args.write_config}')
+    _log.info(f'Serving OCI stand-in on {server.endpoint}')
+    for vcn in state.vcns.values():
+        _log.info(f'VCN {vcn["displayName"]} ({vcn["cidrBlock"]}) - {vcn["id"]}')
+    for group in state.groups.values():
+        _log.info(f'Group {group["name"]} - {group["id"]}')
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
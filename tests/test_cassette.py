@@ -0,0 +1,53 @@
+import gzip
+import threading
+
+from oci import config
+
+from peer_oracle_vcn import cassette, commands, usecases, values
+from tests import stand_in
+
+TENANCY = 'ocid1.tenancy.oc1..cassettetest'
+
+
+def _peer(oci_config, vcns):
+    hub, spoke1, spoke2 = vcns
+    return usecases.create_lpg_batch(
+        commands.CreateLPGBatch(
+            oci_configs={'DEFAULT': oci_config},
+            pairs=(
+                values.PeeringPair(requestor_vcn=hub, acceptor_vcn=spoke1),
+                values.PeeringPair(requestor_vcn=hub, acceptor_vcn=spoke2),
+            ),
+            parallelism=4,
+            preflight_only=False,
+        )
+    )
+
+
+class TestCassette:
+    def test_replay_without_server(self, tmp_path):
+        state = stand_in.StandInState()
+        state.seed(tenancy_ocid=TENANCY, vcns=3)
+        server = stand_in.StandInServer(('127.0.0.1', 0), state=state)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        stand_in.write_oci_config(tmp_path / 'config', tenancies={'DEFAULT': TENANCY}, service_endpoint=server.endpoint)
+        oci_config = config.from_file(file_location=str(tmp_path / 'config'))
+        path = tmp_path / 'cassette.jsonl.gz'
+
+        try:
+            assert _peer({**oci_config, cassette.RECORD_KEY: str(path)}, vcns=tuple(state.vcns))
+        finally:
+            server.shutdown()
+            server.server_close()
+        cassette.close_recorders()
+
+        with gzip.open(path) as f:
+            recorded = f.read().decode()
+        assert 'Signature' not in recorded
+        # OCIDs are pseudonymized everywhere, including the statements of Policies
+        ocids = (TENANCY, *state.vcns, *state.route_tables, *state.lpgs, *state.groups, *state.policies)
+        assert [ocid for ocid in ocids if ocid in recorded] == []
+        assert 'Allow group id ocid1.group.oc1..redacted' in recorded
+        assert all(vcn['displayName'] in recorded for vcn in state.vcns.values())
+        replayed = {**oci_config, cassette.REPLAY_KEY: str(path), cassette.LATENCY_SCALE_KEY: 0}
+        assert _peer(replayed, vcns=tuple(state.vcns))
@@ -1,6 +1,10 @@
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
 
-from peer_oracle_vcn import config
+from peer_oracle_vcn import config, helpers
+from tests import stand_in
 
 
 class TestConfig:
@@ -78,3 +82,71 @@ class TestConfig:
             assert expected is True
         else:
             assert expected is False
+
+    @pytest.mark.parametrize(
+        ('pair', 'expected'),
+        (
+            ('ocid1.vcn.oc1..a:ocid1.vcn.oc1..b', ('ocid1.vcn.oc1..a', 'ocid1.vcn.oc1..b')),
+            ('ocid1.vcn.oc1..a', None),
+            ('ocid1.vcn.oc1..a:', None),
+            (':ocid1.vcn.oc1..b', None),
+        ),
+    )
+    def test_pair_argument(self, pair, expected):
+        try:
+            actual = config._validate_pair(pair)
+        except argparse.ArgumentTypeError:
+            assert expected is None
+        else:
+            assert actual == expected
+
+    def test_all_profiles(self, tmp_path):
+        key_file = tmp_path / 'key.pem'
+        key_file.touch()
+        config_file = tmp_path / 'config'
+        config_file.write_text(
+            '\n'.join(
+                f'[{profile}]\nuser=ocid1.user.oc1..{profile}\nfingerprint=aa:bb\nkey_file={key_file}\n'
+                f'tenancy=ocid1.tenancy.oc1..{profile}\nregion=ap-seoul-1\n'
+                for profile in ('DEFAULT', 'profile1', 'profile2')
+            )
+        )
+        args = config._get_arg_parser().parse_args(
+            ('list_vcn', '--api-config-file', str(config_file), '--all-profiles')
+        )
+
+        parser = config._read_oci_config_file(args.api_config_file)
+        oci_configs = config._load_oci_configs(args, profiles=config._profiles_of(args, parser), parser=parser)
+
+        assert tuple(oci_configs) == ('DEFAULT', 'profile1', 'profile2')
+        assert oci_configs['profile2']['tenancy'] == 'ocid1.tenancy.oc1..profile2'
+
+    def test_config_file_falls_back_like_sdk(self, tmp_path, monkeypatch):
+        config_file = tmp_path / 'config'
+        config_file.write_text('[DEFAULT]\nregion=ap-seoul-1\n')
+        monkeypatch.setenv('HOME', str(tmp_path / 'home'))
+        monkeypatch.setenv('OCI_CONFIG_FILE', str(config_file))
+
+        args = config._get_arg_parser().parse_args(('list_vcn', '--all-profiles'))
+        parser = config._read_oci_config_file(args.api_config_file)
+
+        assert parser['DEFAULT']['region'] == 'ap-seoul-1'
+
+    def test_broken_profile_is_left_out(self, tmp_path, caplog):
+        config_file = tmp_path / 'config'
+        stand_in.write_oci_config(config_file, tenancies={'DEFAULT': 'ocid1.tenancy.oc1..test'})
+        with config_file.open('a') as f:
+            f.write(f'[broken]\nuser=ocid1.user.oc1..broken\nfingerprint=aa:bb\nkey_file={tmp_path / "missing.pem"}\n')
+            f.write('tenancy=ocid1.tenancy.oc1..test\nregion=us-ashburn-1\n')
+        args = config._get_arg_parser().parse_args(
+            ('list_vcn', '--api-config-file', str(config_file), '--all-profiles')
+        )
+
+        parser = config._read_oci_config_file(args.api_config_file)
+        oci_configs = config._load_oci_configs(args, profiles=config._profiles_of(args, parser), parser=parser)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            repos = helpers.build_repositories(oci_configs, executor)
+
+        assert tuple(oci_configs) == ('DEFAULT', 'broken')
+        assert tuple(repos) == ('DEFAULT',)
+        assert 'Failed to load profile broken' in caplog.text
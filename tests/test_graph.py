@@ -0,0 +1,96 @@
+from oci.core.models import LocalPeeringGateway, RouteRule, RouteTable, Vcn
+
+from peer_oracle_vcn import graph
+
+
+def _vcn(ocid, cidr):
+    return Vcn(id=ocid, cidr_blocks=[cidr])
+
+
+def _lpg(ocid, vcn, peer):
+    return LocalPeeringGateway(
+        id=ocid,
+        vcn_id=vcn,
+        peer_id=peer,
+        peering_status=LocalPeeringGateway.PEERING_STATUS_PEERED,
+    )
+
+
+def _route_table(ocid, vcn, *rules):
+    return RouteTable(
+        id=ocid,
+        vcn_id=vcn,
+        route_rules=[
+            RouteRule(
+                destination=cidr,
+                destination_type=RouteRule.DESTINATION_TYPE_CIDR_BLOCK,
+                network_entity_id=lpg,
+            )
+            for cidr, lpg in rules
+        ],
+    )
+
+
+VCNS = (_vcn('vcn_a', '10.0.0.0/16'), _vcn('vcn_b', '10.1.0.0/16'), _vcn('vcn_c', '10.2.0.0/16'))
+
+
+class TestPeeringGraph:
+    def test_symmetric_peering_is_reachable(self):
+        peering_graph = graph.PeeringGraph(
+            vcns=VCNS,
+            lpgs=(_lpg('lpg_ab', 'vcn_a', 'lpg_ba'), _lpg('lpg_ba', 'vcn_b', 'lpg_ab')),
+            route_tables=(
+                _route_table('rt_a', 'vcn_a', ('10.1.0.0/16', 'lpg_ab')),
+                _route_table('rt_b', 'vcn_b', ('10.0.0.0/16', 'lpg_ba')),
+            ),
+        )
+
+        analyses = {(a.source_vcn, a.target_vcn): a for a in peering_graph.analyze()}
+
+        assert set(analyses) == {('vcn_a', 'vcn_b'), ('vcn_b', 'vcn_a')}
+        assert all(a.reachable and not a.issues for a in analyses.values())
+        assert peering_graph.routes_of_lpg('lpg_ab') == ('rt_a',)
+
+    def test_missing_return_route(self):
+        peering_graph = graph.PeeringGraph(
+            vcns=VCNS,
+            lpgs=(_lpg('lpg_ab', 'vcn_a', 'lpg_ba'), _lpg('lpg_ba', 'vcn_b', 'lpg_ab')),
+            route_tables=(_route_table('rt_a', 'vcn_a', ('10.1.0.0/16', 'lpg_ab')),),
+        )
+
+        assert peering_graph.analyze_path('vcn_a', 'vcn_b').issues == {graph.PathIssue.MISSING_RETURN_ROUTE}
+        assert peering_graph.analyze_path('vcn_b', 'vcn_a').issues == {graph.PathIssue.MISSING_ROUTE}
+
+    def test_asymmetric_routing(self):
+        peering_graph = graph.PeeringGraph(
+            vcns=VCNS,
+            lpgs=(
+                _lpg('lpg_ab1', 'vcn_a', 'lpg_ba1'),
+                _lpg('lpg_ba1', 'vcn_b', 'lpg_ab1'),
+                _lpg('lpg_ab2', 'vcn_a', 'lpg_ba2'),
+                _lpg('lpg_ba2', 'vcn_b', 'lpg_ab2'),
+            ),
+            route_tables=(
+                _route_table('rt_a', 'vcn_a', ('10.1.0.0/16', 'lpg_ab1')),
+                _route_table('rt_b', 'vcn_b', ('10.0.0.0/16', 'lpg_ba2')),
+            ),
+        )
+
+        analysis = peering_graph.analyze_path('vcn_a', 'vcn_b')
+        assert analysis.reachable
+        assert analysis.issues == {graph.PathIssue.ASYMMETRIC_ROUTING}
+
+    def test_peering_is_not_transitive(self):
+        peering_graph = graph.PeeringGraph(
+            vcns=VCNS,
+            lpgs=(
+                _lpg('lpg_ab', 'vcn_a', 'lpg_ba'),
+                _lpg('lpg_ba', 'vcn_b', 'lpg_ab'),
+                _lpg('lpg_bc', 'vcn_b', 'lpg_cb'),
+                _lpg('lpg_cb', 'vcn_c', 'lpg_bc'),
+            ),
+            route_tables=(_route_table('rt_a', 'vcn_a', ('10.0.0.0/8', 'lpg_ab')),),
+        )
+
+        assert peering_graph.is_reachable('vcn_a', 'vcn_b')
+        assert not peering_graph.is_reachable('vcn_a', 'vcn_c')
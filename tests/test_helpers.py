@@ -0,0 +1,125 @@
+from oci.core.models import LocalPeeringGateway, RouteRule, RouteTable, Vcn
+from oci.identity.models import Policy
+
+from peer_oracle_vcn import graph, helpers, records, values
+
+
+def _lpg(
+    lpg,
+    vcn,
+    peer,
+    lifecycle_state=LocalPeeringGateway.LIFECYCLE_STATE_AVAILABLE,
+    peering_status='PEERED',
+    name=None,
+):
+    return records.LpgRecord(
+        id=lpg,
+        compartment_id='tenancy',
+        vcn_id=vcn,
+        display_name=name or f'{lpg}_name',
+        lifecycle_state=lifecycle_state,
+        peering_status=peering_status,
+        peer_id=peer,
+    )
+
+
+def _route_table(table, vcn, *lpgs):
+    return RouteTable(
+        id=table,
+        vcn_id=vcn,
+        route_rules=[RouteRule(destination='10.0.0.0/8', network_entity_id=lpg) for lpg in lpgs],
+    )
+
+
+class TestLpgStatuses:
+    def test_statuses(self):
+        lpgs = {
+            'profile1': [
+                _lpg('lpg_a', 'vcn_a', 'lpg_b'),
+                _lpg('lpg_c', 'vcn_a', None, peering_status=LocalPeeringGateway.PEERING_STATUS_REVOKED),
+                _lpg('lpg_d', 'vcn_a', None, lifecycle_state=LocalPeeringGateway.LIFECYCLE_STATE_TERMINATING),
+            ],
+            'profile2': [_lpg('lpg_b', 'vcn_b', 'lpg_a')],
+        }
+        peering_graph = graph.PeeringGraph(
+            vcns=[Vcn(id='vcn_a', cidr_blocks=['10.0.0.0/16']), Vcn(id='vcn_b', cidr_blocks=['10.1.0.0/16'])],
+            lpgs=(lpg for profile_lpgs in lpgs.values() for lpg in profile_lpgs),
+            route_tables=[_route_table('rt_a', 'vcn_a', 'lpg_a', 'lpg_d')],
+        )
+
+        statuses = {s.lpg: s for s in helpers.build_lpg_statuses(lpgs=lpgs, peering_graph=peering_graph)}
+
+        # LPGs being deleted, e.g. by `unpeer`, are not reported
+        assert set(statuses) == {'lpg_a', 'lpg_b', 'lpg_c'}
+        assert statuses['lpg_a'].problems == ('no Route Rule targets the peer LPG',)
+        assert (statuses['lpg_a'].route_tables, statuses['lpg_a'].peer_route_tables) == (1, 0)
+        assert statuses['lpg_b'].profile == 'profile2'
+        assert statuses['lpg_b'].problems == ('no Route Rule targets this LPG',)
+        assert statuses['lpg_c'].problems == ('peering status is REVOKED', 'no Route Rule targets this LPG')
+        assert statuses['lpg_c'].peer_route_tables is None
+
+    def test_prometheus(self):
+        lpgs = {'profile"1': [_lpg('lpg_a', 'vcn_a', None)]}
+        peering_graph = graph.PeeringGraph(
+            vcns=[Vcn(id='vcn_a', cidr_blocks=['10.0.0.0/16'])],
+            lpgs=lpgs['profile"1'],
+            route_tables=[_route_table('rt_a', 'vcn_a', 'lpg_a')],
+        )
+
+        text = helpers.format_prometheus(helpers.build_lpg_statuses(lpgs=lpgs, peering_graph=peering_graph))
+
+        labels = 'profile="profile\\"1",lpg="lpg_a",name="lpg_a_name",vcn="vcn_a"'
+        samples = [line for line in text.splitlines() if not line.startswith('#')]
+        assert samples == [
+            f'peer_oracle_vcn_lpg_info{{{labels},lifecycle_state="AVAILABLE",peering_status="PEERED"}} 1',
+            f'peer_oracle_vcn_lpg_peered{{{labels}}} 1',
+            f'peer_oracle_vcn_lpg_route_tables{{{labels}}} 1',
+            f'peer_oracle_vcn_lpg_healthy{{{labels}}} 1',
+        ]
+        assert '# TYPE peer_oracle_vcn_lpg_peer_route_tables gauge' in text
+        assert text.endswith('\n')
+
+
+class TestDiscoverPeeringResources:
+    def test_discovery(self):
+        vcns = [
+            records.VcnRecord.from_model(Vcn(id=f'vcn_{name}', display_name=name, cidr_blocks=[cidr]))
+            for name, cidr in (('hub', '10.0.0.0/16'), ('spoke', '10.1.0.0/16'), ('other', '10.2.0.0/16'))
+        ]
+        inventory = helpers.Inventory(
+            tenancy_name='tenancy',
+            vcns=vcns,
+            lpgs=[
+                _lpg('lpg_hub', 'vcn_hub', 'lpg_spoke', name='hub_to_spoke'),
+                _lpg('lpg_spoke', 'vcn_spoke', 'lpg_hub', name='spoke_to_hub'),
+                # half left by an interrupted `unpeer`
+                _lpg('lpg_orphan', 'vcn_spoke', 'lpg_deleted', peering_status='REVOKED', name='spoke_to_hub'),
+                # not peering of the pair, by name or by a live peer
+                _lpg('lpg_unpeered', 'vcn_spoke', None, peering_status='NEW', name='spoke_to_other'),
+                _lpg('lpg_to_other', 'vcn_spoke', 'lpg_other', name='spoke_to_hub'),
+                _lpg('lpg_other', 'vcn_other', 'lpg_to_other', name='other_to_spoke'),
+            ],
+            route_tables=[
+                records.RouteTableRecord.from_model(_route_table('rt_hub', 'vcn_hub', 'lpg_hub')),
+                records.RouteTableRecord.from_model(
+                    _route_table('rt_spoke', 'vcn_spoke', 'lpg_spoke', 'lpg_orphan', 'lpg_to_other')
+                ),
+            ],
+            policies=[
+                Policy(id=f'policy_{name}', name=name)
+                for name in ('request_lpg_to_vcn_spoke', 'accept_lpg_of_vcn_hub', 'request_lpg_to_vcn_other')
+            ],
+        )
+
+        resources = helpers.discover_peering_resources(
+            pair=values.PeeringPair(requestor_vcn='vcn_hub', acceptor_vcn='vcn_spoke'),
+            requestor_inventory=inventory,
+            acceptor_inventory=inventory,
+        )
+
+        assert resources.requestor_lpgs == {'lpg_hub'}
+        assert resources.acceptor_lpgs == {'lpg_spoke', 'lpg_orphan'}
+        assert resources.requestor_route_rules == {'rt_hub': {'lpg_hub'}}
+        assert resources.acceptor_route_rules == {'rt_spoke': {'lpg_spoke', 'lpg_orphan'}}
+        assert resources.requestor_policies == ('policy_request_lpg_to_vcn_spoke',)
+        assert resources.acceptor_policies == ('policy_accept_lpg_of_vcn_hub',)
@@ -0,0 +1,147 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import oci.exceptions
+from oci.core.models import LocalPeeringGateway, RouteRule, RouteTable, Vcn
+from oci.identity.models import Group, Policy
+
+from peer_oracle_vcn import preflight, records, values
+
+
+class _Repository:
+    compartment_id = 'tenancy'
+
+    def __init__(self, route_rules=0, lpgs=(), policies=(), limits=None, groups=('group',), tenancy_name='tenancy'):
+        self._route_rules = route_rules
+        self._lpgs = lpgs
+        self._policies = policies
+        self._limits = limits or {}
+        self._groups = groups
+        self._tenancy_name = tenancy_name
+
+    def get_tenancy_name(self):
+        return self._tenancy_name
+
+    def list_lpgs(self):
+        return self._lpgs
+
+    def list_policies(self):
+        return tuple(Policy(id=f'policy_{name}', name=name) for name in self._policies)
+
+    def get_limit(self, service_name, limit_name):
+        return self._limits.get((service_name, limit_name))
+
+    def get_route_table(self, route_table_ocid):
+        return RouteTable(id=route_table_ocid, route_rules=[RouteRule()] * self._route_rules)
+
+    def get_vcn(self, vcn_ocid):
+        return Vcn(id=vcn_ocid, display_name=vcn_ocid)
+
+    def get_group(self, group_ocid):
+        if group_ocid not in self._groups:
+            raise oci.exceptions.ServiceError(404, 'NotAuthorizedOrNotFound', {}, f'Group {group_ocid} is not found')
+        return Group(id=group_ocid)
+
+    def is_member_of(self, group_ocid):
+        return group_ocid in self._groups
+
+
+def _lpg(lpg, vcn, lifecycle_state=LocalPeeringGateway.LIFECYCLE_STATE_AVAILABLE):
+    return records.LpgRecord(
+        id=lpg,
+        compartment_id='tenancy',
+        vcn_id=vcn,
+        display_name=lpg,
+        lifecycle_state=lifecycle_state,
+        peering_status='PEERED',
+        peer_id=None,
+    )
+
+
+def _peering(requestor_vcn, acceptor_vcn, group='group', requestor_profile='DEFAULT', acceptor_profile=None):
+    material = values.LPGMaterial(
+        requestor_vcn=requestor_vcn,
+        acceptor_vcn=acceptor_vcn,
+        requestor_group=group,
+        requestor_route_table=f'rt_{requestor_vcn}',
+        acceptor_route_table=f'rt_{acceptor_vcn}',
+        requestor_cidr='10.0.0.0/16',
+        acceptor_cidr='10.1.0.0/16',
+    )
+    pair = values.PeeringPair(requestor_profile=requestor_profile, acceptor_profile=acceptor_profile, **material.dict())
+    return pair, material
+
+
+def _check(repos, peerings, **kwargs):
+    with ThreadPoolExecutor() as executor:
+        problems = preflight.check(peerings=peerings, repos=repos, executor=executor, **kwargs)
+    return [problems[pair] for pair, _ in peerings]
+
+
+class TestPreflight:
+    def test_pairs_claim_capacity_in_order(self):
+        repos = {'DEFAULT': _Repository(route_rules=preflight.MAX_ROUTE_RULES_PER_TABLE - 1)}
+        peerings = (_peering('hub', 'spoke1'), _peering('hub', 'spoke2'))
+
+        assert _check(repos, peerings) == [
+            (),
+            (f'Route Table rt_hub reached limit of Route Rules ({preflight.MAX_ROUTE_RULES_PER_TABLE})',),
+        ]
+
+    def test_rejected_pair_claims_nothing(self):
+        repos = {'DEFAULT': _Repository(lpgs=(_lpg('lpg', 'hub'),), limits={('vcn', 'lpg-count'): 2})}
+        peerings = (_peering('hub', 'spoke1', group='unknown'), _peering('hub', 'spoke2'))
+
+        # the second pair takes the last LPG of the hub that the rejected first pair would have used
+        assert _check(repos, peerings) == [('Group unknown is not found',), ()]
+
+    def test_lpg_limit(self):
+        lpgs = (_lpg('lpg', 'hub'), _lpg('deleted', 'hub', LocalPeeringGateway.LIFECYCLE_STATE_TERMINATED))
+        repos = {'DEFAULT': _Repository(lpgs=lpgs, limits={('vcn', 'lpg-count'): 2})}
+        peerings = (_peering('hub', 'spoke1'), _peering('spoke2', 'hub'))
+
+        # a deleted LPG doesn't count against the limit
+        assert _check(repos, peerings) == [(), ('VCN hub reached limit of LPGs (2)',)]
+
+    def test_lpg_limit_defaults(self):
+        lpgs = tuple(_lpg(f'lpg{i}', 'hub') for i in range(preflight.DEFAULT_LPGS_PER_VCN))
+        repos = {'DEFAULT': _Repository(lpgs=lpgs)}
+
+        assert _check(repos, (_peering('hub', 'spoke1'),)) == [
+            (f'VCN hub reached limit of LPGs ({preflight.DEFAULT_LPGS_PER_VCN})',)
+        ]
+
+    def test_policy_limit(self):
+        repos = {'DEFAULT': _Repository(policies=('other',), limits={('identity', 'policies-count'): 3})}
+        # the second pair shares the requestor Policy to the hub with the first, so it needs one Policy more
+        peerings = (_peering('spoke1', 'hub'), _peering('spoke2', 'hub'), _peering('spoke3', 'spoke4'))
+
+        assert _check(repos, peerings) == [
+            (),
+            ('Profile DEFAULT reached limit of Policies (3)',),
+            ('Profile DEFAULT reached limit of Policies (3)',),
+        ]
+
+    def test_existing_policy(self):
+        repos = {'DEFAULT': _Repository(policies=('request_lpg_to_vcn_hub',))}
+        peerings = (_peering('spoke1', 'hub'),)
+
+        assert _check(repos, peerings) == [('Policy request_lpg_to_vcn_hub already exists on profile DEFAULT',)]
+        assert _check(repos, peerings, reuse_existing_policies=True) == [()]
+
+    def test_group_and_membership(self):
+        repos = {
+            'DEFAULT': _Repository(),
+            'requestor': _Repository(groups=(), tenancy_name='requestor'),
+            'acceptor': _Repository(tenancy_name='acceptor'),
+        }
+        peerings = (
+            _peering('vcn1', 'vcn2', group='unknown'),
+            _peering('vcn3', 'vcn4', group='group', requestor_profile='requestor', acceptor_profile='acceptor'),
+            _peering('vcn5', 'vcn6', group='group', requestor_profile='acceptor', acceptor_profile='requestor'),
+        )
+
+        assert _check(repos, peerings) == [
+            ('Group unknown is not found',),
+            ('User of profile requestor is not a member of Group group, so it can not connect LPG across tenancies',),
+            (),
+        ]
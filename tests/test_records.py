@@ -0,0 +1,64 @@
+from oci.core.models import LocalPeeringGateway, RouteRule, RouteTable, Vcn
+
+from peer_oracle_vcn import graph, records
+
+
+def _rule(destination, lpg, destination_type=RouteRule.DESTINATION_TYPE_CIDR_BLOCK):
+    return RouteRule(destination=destination, destination_type=destination_type, network_entity_id=lpg)
+
+
+class TestRecords:
+    def test_route_rules_round_trip(self):
+        rules = [
+            _rule('10.1.0.0/16', 'lpg_a'),
+            _rule('2001:db8::/56', 'lpg_a'),
+            _rule('all-iad-services-in-oracle-services-network', 'sgw', RouteRule.DESTINATION_TYPE_SERVICE_CIDR_BLOCK),
+            RouteRule(cidr_block='10.2.0.0/16', network_entity_id='lpg_b'),
+        ]
+
+        route_rules = records.RouteRules(rules)
+
+        assert len(route_rules._others) == 2
+        assert [(r.destination, r.destination_type, r.network_entity_id) for r in route_rules] == [
+            ('10.1.0.0/16', RouteRule.DESTINATION_TYPE_CIDR_BLOCK, 'lpg_a'),
+            ('2001:db8::/56', RouteRule.DESTINATION_TYPE_CIDR_BLOCK, 'lpg_a'),
+            ('all-iad-services-in-oracle-services-network', RouteRule.DESTINATION_TYPE_SERVICE_CIDR_BLOCK, 'sgw'),
+            ('10.2.0.0/16', None, 'lpg_b'),
+        ]
+        assert route_rules[2].cidr_block is None
+        assert route_rules[3].cidr_block == '10.2.0.0/16'
+
+    def test_ocids_are_interned(self):
+        lpg_ocid = 'ocid1.localpeeringgateway.oc1..aaaa'
+        tables = [
+            records.RouteTableRecord.from_model(
+                RouteTable(id=f'rt_{i}', vcn_id='vcn_a', route_rules=[_rule('10.1.0.0/16', ''.join(lpg_ocid))])
+            )
+            for i in range(2)
+        ]
+
+        assert tables[0].route_rules[0].network_entity_id is tables[1].route_rules[0].network_entity_id
+        assert tables[0].vcn_id is tables[1].vcn_id
+
+    def test_graph_accepts_records(self):
+        vcns = [Vcn(id='vcn_a', cidr_blocks=['10.0.0.0/16']), Vcn(id='vcn_b', cidr_blocks=['10.1.0.0/16'])]
+        lpgs = [
+            LocalPeeringGateway(
+                id=lpg, vcn_id=vcn, peer_id=peer, peering_status=LocalPeeringGateway.PEERING_STATUS_PEERED
+            )
+            for lpg, vcn, peer in (('lpg_a', 'vcn_a', 'lpg_b'), ('lpg_b', 'vcn_b', 'lpg_a'))
+        ]
+        route_tables = [
+            RouteTable(id='rt_a', vcn_id='vcn_a', route_rules=[_rule('10.1.0.0/16', 'lpg_a')]),
+            RouteTable(id='rt_b', vcn_id='vcn_b', route_rules=[_rule('10.0.0.0/16', 'lpg_b')]),
+        ]
+
+        from_models = graph.PeeringGraph(vcns=vcns, lpgs=lpgs, route_tables=route_tables)
+        from_records = graph.PeeringGraph(
+            vcns=map(records.VcnRecord.from_model, vcns),
+            lpgs=map(records.LpgRecord.from_model, lpgs),
+            route_tables=map(records.RouteTableRecord.from_model, route_tables),
+        )
+
+        assert list(from_records.analyze()) == list(from_models.analyze())
+        assert from_records.is_reachable('vcn_a', 'vcn_b')
@@ -0,0 +1,133 @@
+import concurrent.futures
+import threading
+import time
+
+import pytest
+
+from peer_oracle_vcn.scheduler import FairScheduler
+
+
+class _Tracker:
+    """Records the order calls start in and the most calls of each label running at once."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = []
+        self._running = {}
+        self.max_running = {}
+
+    def call(self, name, labels=(), seconds=0.01):
+        with self._lock:
+            self.started.append(name)
+            for label in labels:
+                self._running[label] = self._running.get(label, 0) + 1
+                self.max_running[label] = max(self.max_running.get(label, 0), self._running[label])
+        time.sleep(seconds)
+        with self._lock:
+            for label in labels:
+                self._running[label] -= 1
+        return name
+
+
+class TestFairScheduler:
+    def test_caps_tenancy_and_resource(self):
+        tracker = _Tracker()
+        with FairScheduler(parallelism=6, tenancy_parallelism=2) as executor:
+            futures = [
+                executor.submit_to(tracker.call, f'hub{i}', labels=('hub',), tenancies=('hub',)) for i in range(8)
+            ]
+            futures += [
+                executor.submit_to(tracker.call, f'rt{i}', labels=('rt',), tenancies=(f'spoke{i}',), resources=('rt',))
+                for i in range(4)
+            ]
+            assert [f.result() for f in futures] == [*(f'hub{i}' for i in range(8)), *(f'rt{i}' for i in range(4))]
+
+        assert tracker.max_running == {'hub': 2, 'rt': 1}
+
+    def test_busy_tenancy_does_not_take_every_worker(self):
+        tracker = _Tracker()
+        with FairScheduler(parallelism=4) as executor:
+            with executor.holding():
+                hub = [executor.submit_to(tracker.call, 'hub', tenancies=('hub',), seconds=0.05) for _ in range(20)]
+                spokes = [executor.submit_to(tracker.call, f'spoke{i}', tenancies=(f'spoke{i}',)) for i in range(3)]
+            for future in (*hub, *spokes):
+                future.result()
+            stats = executor.stats()
+
+        # spokes start in the first round instead of after 20 hub calls
+        assert set(tracker.started[:4]) == {'hub', 'spoke0', 'spoke1', 'spoke2'}
+        assert stats['hub'].calls == 20 and stats['hub'].max_queue_depth == 20 and stats['hub'].queue_depth == 0
+        assert stats['spoke0'].max_wait < stats['hub'].max_wait
+
+    def test_longest_chain_first(self):
+        tracker = _Tracker()
+        with FairScheduler(parallelism=1) as executor:
+            with executor.holding():
+                short = [executor.submit_to(tracker.call, f'short{i}', tenancies=('a',)) for i in range(3)]
+                head = executor.submit_to(tracker.call, 'head', tenancies=('b',))
+                middle = executor.submit_to(tracker.call, 'middle', tenancies=('b',), after=(head,))
+                tail = executor.submit_to(tracker.call, 'tail', tenancies=('b',), after=(middle,))
+            for future in (*short, tail):
+                future.result()
+
+        assert tracker.started[0] == 'head'
+        assert tracker.started.index('middle') < tracker.started.index('tail')
+
+    def test_failure_propagates_to_dependents(self):
+        calls = []
+
+        def fail():
+            raise ValueError('failed')
+
+        with FairScheduler(parallelism=2) as executor:
+            failing = executor.submit_to(fail, tenancies=('a',))
+            dependent = executor.submit_to(calls.append, 'dependent', tenancies=('a',), after=(failing,))
+            with pytest.raises(ValueError):
+                dependent.result()
+
+        assert calls == []
+
+    def test_rejected_call_leaves_no_trace(self):
+        foreign = concurrent.futures.Future()
+        with FairScheduler(parallelism=1) as executor:
+            executor.submit_to(time.sleep, 0, tenancies=('a',)).result()
+            stats = executor.stats()
+
+            with pytest.raises(ValueError):
+                executor.submit_to(time.sleep, 0, tenancies=('a', 'b'), resources=('rt',), after=(foreign,))
+
+            assert executor.stats() == stats
+
+    @pytest.mark.parametrize(('wait', 'expected'), ((True, [False, False, False]), (False, [False, True, True])))
+    def test_shutdown_leaves_nothing_pending(self, wait, expected):
+        executor = FairScheduler(parallelism=1)
+        futures = [executor.submit(time.sleep, 0.05) for _ in range(3)]
+
+        executor.shutdown(wait=wait)
+        _, not_done = concurrent.futures.wait(futures, timeout=1)
+
+        assert not not_done
+        assert [f.cancelled() for f in futures] == expected
+
+    def test_done_callback_may_submit(self):
+        calls = []
+
+        def fail():
+            raise ValueError('failed')
+
+        with FairScheduler(parallelism=1) as executor:
+            succeeding = executor.submit(calls.append, 'succeeding')
+            failing = executor.submit(fail)
+            dependent = executor.submit_to(calls.append, 'dependent', after=(failing,))
+            submitted = []
+
+            def callback(_):
+                submitted.append(executor.submit(calls.append, 'callback'))
+
+            # resolving either one with the lock held deadlocks on the submit of its callback
+            for future in (succeeding, dependent):
+                future.add_done_callback(callback)
+            while len(submitted) < 2:
+                time.sleep(0.01)
+
+        assert calls == ['succeeding', 'callback', 'callback']
@@ -0,0 +1,102 @@
+import time
+
+import pytest
+
+from peer_oracle_vcn import sharding, values
+
+
+def _pair(requestor_vcn, acceptor_vcn, requestor_profile='DEFAULT', acceptor_profile=None):
+    return values.PeeringPair(
+        requestor_profile=requestor_profile,
+        acceptor_profile=acceptor_profile,
+        requestor_vcn=requestor_vcn,
+        acceptor_vcn=acceptor_vcn,
+    )
+
+
+class TestSharding:
+    def test_pairs_sharing_resources_are_grouped(self):
+        hub_spoke = (_pair('hub', 'spoke1'), _pair('hub', 'spoke2'), _pair('spoke2', 'spoke3'))
+        independent = (_pair('a', 'b'),)
+        inter_tenant = (_pair('c', 'd', 'profile1', 'profile2'), _pair('e', 'f', 'profile1', 'profile2'))
+
+        components = sharding.group_pairs((*independent, *inter_tenant, *hub_spoke))
+
+        assert [set(c.pairs) for c in components] == [set(hub_spoke), set(inter_tenant), set(independent)]
+
+    def test_shards_are_disjoint_and_balanced(self):
+        components = sharding.group_pairs(_pair(f'vcn{i}', f'vcn{i}_peer') for i in range(10))
+
+        shards = [sharding.shard(components, shard_index=i, shard_count=3) for i in range(3)]
+
+        assert sorted(c.id for s in shards for c in s) == sorted(c.id for c in components)
+        assert sorted(len(s) for s in shards) == [3, 3, 4]
+
+    def test_workers_claim_distinct_components(self, tmp_path):
+        components = sharding.group_pairs(_pair(f'vcn{i}', f'vcn{i}_peer') for i in range(3))
+        progress = sharding.Progress(tmp_path / 'progress.db', lease_seconds=0.5)
+        progress.register(components)
+
+        first = progress.claim('worker1', components, max_pairs=2)
+        second = progress.claim('worker2', components, max_pairs=2)
+        assert len(first) == 2 and len(second) == 1
+        assert progress.claim('worker3', components, max_pairs=2) == []
+
+        # lease of worker2 expires, so its work is taken over
+        progress.finish('worker1', first, {p: values.PairState.SUCCEEDED for c in first for p in c.pairs})
+        time.sleep(0.6)
+        assert [c.id for c in progress.claim('worker3', components, max_pairs=2)] == [second[0].id]
+
+        report = progress.report()
+        assert len(report[values.PairState.SUCCEEDED.value]) == 2
+        assert len(report[values.PairState.PENDING.value]) == 1
+        assert [worker for _, _, worker in report[values.PairState.SUCCEEDED.value]] == ['worker1'] * 2
+        progress.close()
+
+    def test_lease_taken_over_is_lost(self, tmp_path):
+        components = sharding.group_pairs((_pair('a', 'b'),))
+        progress = sharding.Progress(tmp_path / 'progress.db', lease_seconds=0.3)
+        progress.register(components)
+        claimed = progress.claim('worker1', components, max_pairs=1)
+
+        # worker1 stalls past its lease, e.g. paused, and worker2 takes the component over
+        time.sleep(0.4)
+        assert progress.claim('worker2', components, max_pairs=1) == claimed
+        with progress.lease('worker2', claimed) as (leased, lost):
+            assert leased == tuple(claimed)
+            assert not progress._renew(progress._conn, 'worker1', claimed)
+            with pytest.raises(sharding.LeaseLost):
+                progress.finish('worker1', claimed, {p: values.PairState.SUCCEEDED for p in claimed[0].pairs})
+            time.sleep(0.2)
+            assert not lost.is_set()
+            progress.finish('worker2', claimed, {p: values.PairState.SUCCEEDED for p in claimed[0].pairs})
+
+        assert [worker for _, _, worker in progress.report()[values.PairState.SUCCEEDED.value]] == ['worker2']
+        progress.close()
+
+    def test_renewal_notices_lost_lease(self, tmp_path):
+        components = sharding.group_pairs((_pair('a', 'b'),))
+        progress = sharding.Progress(tmp_path / 'progress.db', lease_seconds=0.3)
+        progress.register(components)
+
+        with progress.lease('worker1', components) as (_, lost):
+            progress._conn.execute("UPDATE components SET worker = 'worker2'")
+            assert lost.wait(timeout=1)
+        progress.close()
+
+    def test_lease_skips_components_of_other_workers(self, tmp_path):
+        components = sharding.group_pairs(_pair(f'vcn{i}', f'vcn{i}_peer') for i in range(3))
+        progress = sharding.Progress(tmp_path / 'progress.db', lease_seconds=10)
+        progress.register(components)
+        running, done, pending = components
+        progress.claim('worker1', (running, done), max_pairs=2)
+        progress.finish('worker1', (done,), {p: values.PairState.SUCCEEDED for p in done.pairs})
+
+        with progress.lease('worker2', components) as (leased, _):
+            assert leased == (pending,)
+            # the lease of worker1 is left as it is
+            assert {c: worker for c, _, worker, _ in progress.running()} == {
+                running.id: 'worker1',
+                pending.id: 'worker2',
+            }
+        progress.close()
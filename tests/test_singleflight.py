@@ -0,0 +1,71 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from peer_oracle_vcn.singleflight import SingleFlight
+
+
+class TestSingleFlight:
+    def test_concurrent_calls_share_one_call(self):
+        single_flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            started.set()
+            release.wait(timeout=5)
+            return object()
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            leader = executor.submit(single_flight.do, 'key', fetch)
+            started.wait(timeout=5)
+            followers = [executor.submit(single_flight.do, 'key', fetch) for _ in range(3)]
+            # give followers time to join the in-flight call
+            time.sleep(0.2)
+            assert not any(f.done() for f in followers)
+            release.set()
+
+            results = {id(f.result()) for f in (leader, *followers)}
+
+        assert len(calls) == 1
+        assert len(results) == 1
+
+    def test_error_is_propagated_to_every_caller(self):
+        single_flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            started.set()
+            release.wait(timeout=5)
+            raise ValueError('boom')
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            leader = executor.submit(single_flight.do, 'key', fetch)
+            started.wait(timeout=5)
+            follower = executor.submit(single_flight.do, 'key', fetch)
+            # give the follower time to join the in-flight call
+            time.sleep(0.2)
+            release.set()
+
+            for future in (leader, follower):
+                with pytest.raises(ValueError):
+                    future.result()
+
+        assert len(calls) == 1
+
+    def test_finished_call_is_not_cached(self):
+        single_flight = SingleFlight()
+        calls = []
+
+        single_flight.do('key', lambda: calls.append(1))
+        single_flight.do('key', lambda: calls.append(1))
+
+        assert len(calls) == 2
+        assert single_flight._in_flight == {}
@@ -0,0 +1,445 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import oci.exceptions
+import pytest
+from oci import config
+
+from peer_oracle_vcn import commands, repository, usecases, values
+from peer_oracle_vcn.repository import OCIRepository
+from tests import stand_in
+
+TENANCY = 'ocid1.tenancy.oc1..standintest'
+
+
+@pytest.fixture
+def server():
+    state = stand_in.StandInState()
+    state.seed(tenancy_ocid=TENANCY, vcns=3)
+    server = stand_in.StandInServer(('127.0.0.1', 0), state=state)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def oci_config(server, tmp_path):
+    stand_in.write_oci_config(tmp_path / 'config', tenancies={'DEFAULT': TENANCY}, service_endpoint=server.endpoint)
+    return config.from_file(file_location=str(tmp_path / 'config'))
+
+
+class TestStandIn:
+    def test_batch_peering_through_sdk(self, server, oci_config):
+        hub, spoke1, spoke2 = server.state.vcns
+
+        succeeded = usecases.create_lpg_batch(
+            commands.CreateLPGBatch(
+                oci_configs={'DEFAULT': oci_config},
+                pairs=(
+                    values.PeeringPair(requestor_vcn=hub, acceptor_vcn=spoke1),
+                    values.PeeringPair(requestor_vcn=hub, acceptor_vcn=spoke2),
+                ),
+                parallelism=4,
+                preflight_only=False,
+            )
+        )
+
+        assert succeeded
+        assert [lpg['peeringStatus'] for lpg in server.state.lpgs.values()] == ['PEERED'] * 4
+        hub_table = server.state.route_tables[server.state.vcns[hub]['defaultRouteTableId']]
+        assert len(hub_table['routeRules']) == 2
+
+    def test_shared_policy_allows_every_group(self, server, oci_config):
+        hub, spoke1, spoke2 = server.state.vcns
+        server.state.seed(tenancy_ocid=TENANCY, vcns=0, group_name='peering2')
+        group1, group2 = server.state.groups
+
+        assert usecases.create_lpg_batch(
+            commands.CreateLPGBatch(
+                oci_configs={'DEFAULT': oci_config},
+                pairs=(
+                    values.PeeringPair(requestor_vcn=spoke1, acceptor_vcn=hub, requestor_group=group1),
+                    values.PeeringPair(requestor_vcn=spoke2, acceptor_vcn=hub, requestor_group=group2),
+                ),
+                parallelism=4,
+                preflight_only=False,
+            )
+        )
+
+        # both spokes request to the hub under one Policy
+        name = f'request_lpg_to_vcn_{server.state.vcns[hub]["displayName"]}'
+        (policy,) = (p for p in server.state.policies.values() if p['name'] == name)
+        assert policy['statements'] == [
+            f'Allow group id {group} to manage local-peering-from in compartment id {TENANCY}'
+            for group in (group1, group2)
+        ]
+
+    @pytest.mark.parametrize('fails', (False, True))
+    def test_existing_policy_gets_statements_of_new_group(self, server, oci_config, monkeypatch, fails):
+        hub, spoke1, spoke2 = server.state.vcns
+        server.state.seed(tenancy_ocid=TENANCY, vcns=0, group_name='peering2')
+        group1, group2 = server.state.groups
+
+        def peer(spoke, group):
+            return usecases.create_lpg_batch(
+                commands.CreateLPGBatch(
+                    oci_configs={'DEFAULT': oci_config},
+                    pairs=(values.PeeringPair(requestor_vcn=spoke, acceptor_vcn=hub, requestor_group=group),),
+                    parallelism=4,
+                    preflight_only=False,
+                )
+            )
+
+        assert peer(spoke1, group1)
+        if fails:
+
+            def add_route_rules(self, route_table_ocid, rules):
+                raise oci.exceptions.ServiceError(500, 'InternalError', {}, 'Route Table is broken')
+
+            monkeypatch.setattr(OCIRepository, 'add_route_rules', add_route_rules)
+            with pytest.raises(oci.exceptions.ServiceError):
+                peer(spoke2, group2)
+        else:
+            assert peer(spoke2, group2)
+
+        name = f'request_lpg_to_vcn_{server.state.vcns[hub]["displayName"]}'
+        (policy,) = (p for p in server.state.policies.values() if p['name'] == name)
+        # statements added to the Policy made by the first batch are rolled back with the rest
+        assert policy['statements'] == [
+            f'Allow group id {group} to manage local-peering-from in compartment id {TENANCY}'
+            for group in ((group1,) if fails else (group1, group2))
+        ]
+
+    def test_unpeer_keeps_what_other_pairs_use(self, server, oci_config, monkeypatch):
+        hub, spoke1, spoke2 = server.state.vcns
+        assert usecases.create_lpg_batch(
+            commands.CreateLPGBatch(
+                oci_configs={'DEFAULT': oci_config},
+                pairs=(
+                    values.PeeringPair(requestor_vcn=hub, acceptor_vcn=spoke1),
+                    values.PeeringPair(requestor_vcn=hub, acceptor_vcn=spoke2),
+                ),
+                parallelism=4,
+                preflight_only=False,
+            )
+        )
+        names = {vcn_id: vcn['displayName'] for vcn_id, vcn in server.state.vcns.items()}
+        calls = []
+
+        def recording(method):
+            original = getattr(OCIRepository, method)
+
+            def record(self, *args, **kwargs):
+                calls.append(method)
+                return original(self, *args, **kwargs)
+
+            return record
+
+        for method in ('remove_route_rules', 'delete_lpg', 'delete_policy'):
+            monkeypatch.setattr(OCIRepository, method, recording(method))
+
+        assert usecases.unpeer(
+            commands.Unpeer(
+                oci_configs={'DEFAULT': oci_config},
+                pairs=(values.PeeringPair(requestor_vcn=hub, acceptor_vcn=spoke1),),
+                parallelism=4,
+            )
+        )
+
+        # an LPG can't be deleted while a Route Rule targets it
+        assert calls == ['remove_route_rules'] * 2 + ['delete_lpg'] * 2 + ['delete_policy']
+        assert {lpg['vcnId'] for lpg in server.state.lpgs.values()} == {hub, spoke2}
+        assert [lpg['peeringStatus'] for lpg in server.state.lpgs.values()] == ['PEERED'] * 2
+        spoke1_table = server.state.route_tables[server.state.vcns[spoke1]['defaultRouteTableId']]
+        assert spoke1_table['routeRules'] == []
+        # the Policy of the hub is still needed by the peering with spoke2
+        assert {policy['name'] for policy in server.state.policies.values()} == {
+            f'request_lpg_to_vcn_{names[spoke2]}',
+            f'accept_lpg_of_vcn_{names[hub]}',
+        }
+
+    def test_unpeer_finds_half_left_behind(self, server, oci_config):
+        hub, spoke, _ = server.state.vcns
+        assert usecases.create_lpg_batch(
+            commands.CreateLPGBatch(
+                oci_configs={'DEFAULT': oci_config},
+                pairs=(values.PeeringPair(requestor_vcn=hub, acceptor_vcn=spoke),),
+                parallelism=4,
+                preflight_only=False,
+            )
+        )
+        # an earlier `unpeer` deleted the acceptor's half, but failed to delete the requestor's
+        (acceptor_lpg,) = (lpg_id for lpg_id, lpg in server.state.lpgs.items() if lpg['vcnId'] == spoke)
+        server.state.route_tables[server.state.vcns[spoke]['defaultRouteTableId']]['routeRules'] = []
+        server.api.delete_lpg(acceptor_lpg)
+
+        assert usecases.unpeer(
+            commands.Unpeer(
+                oci_configs={'DEFAULT': oci_config},
+                pairs=(values.PeeringPair(requestor_vcn=hub, acceptor_vcn=spoke),),
+                parallelism=4,
+            )
+        )
+
+        assert server.state.lpgs == {}
+        assert server.state.route_tables[server.state.vcns[hub]['defaultRouteTableId']]['routeRules'] == []
+
+    def test_unpeer_reports_failure(self, server, oci_config, monkeypatch):
+        hub, spoke, _ = server.state.vcns
+        assert usecases.create_lpg_batch(
+            commands.CreateLPGBatch(
+                oci_configs={'DEFAULT': oci_config},
+                pairs=(values.PeeringPair(requestor_vcn=hub, acceptor_vcn=spoke),),
+                parallelism=4,
+                preflight_only=False,
+            )
+        )
+
+        def delete_policy(self, policy_ocid):
+            raise oci.exceptions.ServiceError(409, 'Conflict', {}, f'Policy {policy_ocid} is busy')
+
+        monkeypatch.setattr(OCIRepository, 'delete_policy', delete_policy)
+
+        assert not usecases.unpeer(
+            commands.Unpeer(
+                oci_configs={'DEFAULT': oci_config},
+                pairs=(values.PeeringPair(requestor_vcn=hub, acceptor_vcn=spoke),),
+                parallelism=4,
+            )
+        )
+        assert server.state.lpgs == {}
+
+    def test_listing_is_paginated(self, server, oci_config):
+        server.state.seed(tenancy_ocid=TENANCY, vcns=150)
+
+        assert len(OCIRepository(oci_config).list_vcns()) == 153
+
+    def test_throttled_request_is_rejected(self, server, oci_config):
+        server.rate_limiter = stand_in._TokenBucket(rate=0.001, burst=1)
+        repo = OCIRepository(oci_config)
+        repo.get_tenancy_name()
+
+        with pytest.raises(oci.exceptions.ServiceError) as e:
+            repo._identity_client.get_tenancy(TENANCY, retry_strategy=oci.retry.NoneRetryStrategy())
+
+        assert e.value.status == 429
+
+    def test_list_merges_tenancies(self, server, tmp_path, caplog):
+        server.state.seed(tenancy_ocid='ocid1.tenancy.oc1..standintest2', vcns=2)
+        stand_in.write_oci_config(
+            tmp_path / 'config',
+            tenancies={'DEFAULT': TENANCY, 'tenancy2': 'ocid1.tenancy.oc1..standintest2', 'duplicate': TENANCY},
+            service_endpoint=server.endpoint,
+        )
+        oci_configs = {
+            profile: config.from_file(file_location=str(tmp_path / 'config'), profile_name=profile)
+            for profile in ('DEFAULT', 'tenancy2', 'duplicate')
+        }
+
+        with caplog.at_level(logging.INFO):
+            usecases.list_vcns(commands.ListVCNs(oci_configs=oci_configs, parallelism=4))
+
+        vcn_lines = [r.getMessage() for r in caplog.records if r.getMessage().startswith('VCN ')]
+        assert len(vcn_lines) == 5
+        assert sum('(tenancy2)' in line for line in vcn_lines) == 2
+
+    def test_list_skips_unreachable_tenancy(self, server, tmp_path, caplog, monkeypatch):
+        server.state.seed(tenancy_ocid='ocid1.tenancy.oc1..standintest2', vcns=2)
+        stand_in.write_oci_config(
+            tmp_path / 'config',
+            tenancies={'DEFAULT': TENANCY, 'tenancy2': 'ocid1.tenancy.oc1..standintest2'},
+            service_endpoint=server.endpoint,
+        )
+        oci_configs = {
+            profile: config.from_file(file_location=str(tmp_path / 'config'), profile_name=profile)
+            for profile in ('DEFAULT', 'tenancy2')
+        }
+        list_vcns = OCIRepository.list_vcns
+
+        def unreachable(self, *args, **kwargs):
+            if self.compartment_id != TENANCY:
+                raise oci.exceptions.RequestException('Connection refused')
+            return list_vcns(self, *args, **kwargs)
+
+        monkeypatch.setattr(OCIRepository, 'list_vcns', unreachable)
+
+        with caplog.at_level(logging.INFO):
+            usecases.list_vcns(commands.ListVCNs(oci_configs=oci_configs, parallelism=4))
+
+        vcn_lines = [r.getMessage() for r in caplog.records if r.getMessage().startswith('VCN ')]
+        assert len(vcn_lines) == 3
+        assert 'Failed to list resources of profile tenancy2. Connection refused' in caplog.messages
+
+    def test_batch_peering_opens_peer_cidrs(self, server, oci_config):
+        hub, spoke1, spoke2 = (server.state.vcns[vcn_id] for vcn_id in server.state.vcns)
+        hub_nsg = next(nsg['id'] for nsg in server.state.nsgs.values() if nsg['vcnId'] == hub['id'])
+
+        succeeded = usecases.create_lpg_batch(
+            commands.CreateLPGBatch(
+                oci_configs={'DEFAULT': oci_config},
+                pairs=tuple(
+                    values.PeeringPair(
+                        requestor_vcn=hub['id'],
+                        acceptor_vcn=spoke['id'],
+                        requestor_nsgs=(hub_nsg,),
+                        acceptor_security_lists=(spoke['defaultSecurityListId'],),
+                    )
+                    for spoke in (spoke1, spoke2)
+                ),
+                parallelism=4,
+                preflight_only=False,
+            )
+        )
+
+        assert succeeded
+        assert {rule['source'] for rule in server.state.nsg_rules[hub_nsg]} == {
+            spoke1['cidrBlock'],
+            spoke2['cidrBlock'],
+        }
+        for spoke in (spoke1, spoke2):
+            ingress = server.state.security_lists[spoke['defaultSecurityListId']]['ingressSecurityRules']
+            assert [rule['source'] for rule in ingress if rule['protocol'] == 'all'] == [hub['cidrBlock']]
+
+    def test_concurrent_security_list_updates_are_not_lost(self, server, oci_config):
+        security_list = next(iter(server.state.security_lists))
+        cidrs = tuple(f'192.168.{i}.0/24' for i in range(repository.MAX_SECURITY_LIST_UPDATE_ATTEMPTS))
+        repos = tuple(OCIRepository(oci_config) for _ in cidrs)
+
+        with ThreadPoolExecutor(max_workers=len(cidrs)) as executor:
+            for future in tuple(
+                executor.submit(
+                    repo.add_security_list_ingress_rules, security_list_ocid=security_list, source_cidrs=(cidr,)
+                )
+                for repo, cidr in zip(repos, cidrs)
+            ):
+                future.result()
+
+        ingress = server.state.security_lists[security_list]['ingressSecurityRules']
+        assert {rule['source'] for rule in ingress if rule['protocol'] == 'all'} == set(cidrs)
+
+        for repo in repos:
+            repo.cleanup_security_rules()
+        ingress = server.state.security_lists[security_list]['ingressSecurityRules']
+        assert [rule for rule in ingress if rule['protocol'] == 'all'] == []
+
+    def test_concurrent_route_table_updates_are_not_lost(self, server, oci_config):
+        route_table = next(iter(server.state.route_tables))
+        cidrs = tuple(f'192.168.{i}.0/24' for i in range(repository.MAX_ROUTE_TABLE_UPDATE_ATTEMPTS))
+        repos = tuple(OCIRepository(oci_config) for _ in cidrs)
+
+        with ThreadPoolExecutor(max_workers=len(cidrs)) as executor:
+            for future in tuple(
+                executor.submit(
+                    repo.add_route_rule, route_table_ocid=route_table, network_entity_id=f'lpg{i}', destination=cidr
+                )
+                for i, (repo, cidr) in enumerate(zip(repos, cidrs))
+            ):
+                future.result()
+
+        rules = server.state.route_tables[route_table]['routeRules']
+        assert {rule['destination'] for rule in rules} == set(cidrs)
+
+        for repo in repos:
+            repo.cleanup_route_rules()
+        assert server.state.route_tables[route_table]['routeRules'] == []
+
+    def test_workers_split_manifest(self, server, oci_config, tmp_path):
+        server.state.seed(tenancy_ocid=TENANCY, vcns=5)
+        hub, *spokes = server.state.vcns
+        pairs = tuple(values.PeeringPair(requestor_vcn=a, acceptor_vcn=b) for a, b in zip(spokes[::2], spokes[1::2]))
+        pairs += (values.PeeringPair(requestor_vcn=hub, acceptor_vcn=spokes[-1]),)
+        progress_db = tmp_path / 'progress.db'
+
+        def work(worker):
+            return usecases.create_lpg_batch(
+                commands.CreateLPGBatch(
+                    oci_configs={'DEFAULT': oci_config},
+                    pairs=pairs,
+                    parallelism=2,
+                    preflight_only=False,
+                    claim=True,
+                    progress_db=progress_db,
+                    batch_size=1,
+                    worker=worker,
+                )
+            )
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            assert all(executor.map(work, ('worker1', 'worker2')))
+
+        assert usecases.report_batch(commands.ReportBatch(progress_db=progress_db))
+        assert len(server.state.lpgs) == 2 * len(pairs)
+
+    def test_preflight_leaves_progress_to_workers(self, server, oci_config, tmp_path):
+        hub, spoke1, spoke2 = server.state.vcns
+        pairs = (
+            values.PeeringPair(requestor_vcn=hub, acceptor_vcn=spoke1),
+            values.PeeringPair(requestor_vcn=spoke2, acceptor_vcn=spoke1),
+        )
+        progress_db = tmp_path / 'progress.db'
+
+        def run(preflight_only):
+            return usecases.create_lpg_batch(
+                commands.CreateLPGBatch(
+                    oci_configs={'DEFAULT': oci_config},
+                    pairs=pairs,
+                    parallelism=2,
+                    preflight_only=preflight_only,
+                    claim=True,
+                    progress_db=progress_db,
+                    worker='worker1',
+                )
+            )
+
+        assert run(preflight_only=True)
+        assert len(server.state.lpgs) == 0
+
+        assert run(preflight_only=False)
+        assert len(server.state.lpgs) == 2 * len(pairs)
+        assert usecases.report_batch(commands.ReportBatch(progress_db=progress_db))
+
+    def _transit(self, oci_config, vcns, drg=None):
+        usecases.create_drg_transit(
+            commands.CreateDRGTransit(
+                oci_config=oci_config,
+                drg=drg,
+                drg_name='transit',
+                vcns=vcns,
+                destination_cidrs=('10.0.0.0/8',),
+                parallelism=2,
+            )
+        )
+
+    def test_drg_transit_binds_every_attachment(self, server, oci_config):
+        server.state.drg_attachment_seconds = 0.2
+        vcn1, vcn2, vcn3 = server.state.vcns
+        repo = OCIRepository(oci_config)
+        drg = repo.create_drg(drg_name='transit')
+        # attached before, to the DRG Route Table of the DRG's default
+        repo.create_drg_attachment(drg_ocid=drg.id, vcn_ocid=vcn1, attachment_name='vcn1')
+
+        self._transit(oci_config, vcns=(vcn1, vcn2, vcn3), drg=drg.id)
+
+        transit_table = next(
+            t for t in server.state.drg_route_tables.values() if t['displayName'] != 'Autogenerated VCN Table'
+        )
+        attachments = list(server.state.drg_attachments.values())
+        assert sorted(a['vcnId'] for a in attachments) == sorted((vcn1, vcn2, vcn3))
+        assert {(a['lifecycleState'], a['drgRouteTableId']) for a in attachments} == {('ATTACHED', transit_table['id'])}
+        for vcn in (vcn1, vcn2, vcn3):
+            route_rules = server.state.route_tables[server.state.vcns[vcn]['defaultRouteTableId']]['routeRules']
+            assert [(r['destination'], r['networkEntityId']) for r in route_rules] == [('10.0.0.0/8', drg.id)]
+
+    def test_drg_transit_is_rolled_back(self, server, oci_config):
+        server.state.drg_attachment_seconds = 0.2
+        vcn1, vcn2, _ = server.state.vcns
+
+        with pytest.raises(oci.exceptions.ServiceError):
+            self._transit(oci_config, vcns=(vcn1, vcn2, 'ocid1.vcn.oc1..missing'))
+
+        # the DRG Route Table and the DRG can only go once the attachments are detached
+        assert server.state.drgs == {}
+        assert server.state.drg_route_tables == {}
+        assert server.state.drg_route_distributions == {}